@@ -0,0 +1,250 @@
+'''
+AHU -> zones -> VAV controllers as one incrementally evaluated graph
+(wasm_host/dep_graph.py), instead of main.py's %OA + min flow calc and
+the vav-box-pid-setpoints-calc controllers each rerun from scratch.
+
+    ahu_inputs (MAT, RAT, OAT, damper) -> percent_oa      per AHU
+    percent_oa of its AHU + people     -> min_flow        per zone, 62.1 Eq 6-1
+    min_flow + zone_temp + setpoint    -> vav             per zone, G36 PID logic
+
+percent_oa runs main.py's calculate_ahu_percent_oa, min_flow is the
+ZoneTable math from vav_min_flow.py on just the dirty zones, and vav
+runs the dirty zones as one VavFleetController batch (the ventilation
+min becomes the box's minimum airflow). A people count change reaches
+one zone's min flow and VAV node, and an AHU's MAT change reaches the
+zones on that AHU. Zones that are heating or cooling are re-run every
+scan, so their integrators keep moving. Satisfied zones have no PID
+state to move, so an incremental scan gives exactly what recomputing
+everything does (check_against_full checks that).
+
+$ python building_graph.py --zones 1000 10000 100000
+'''
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+import repo_path  # puts the repo root on sys.path for wasm_host
+sys.path.insert(0, os.path.join(HERE, "..", "vav-box-pid-setpoints-calc"))
+from wasm_host.dep_graph import DepGraph
+from main import calculate_ahu_percent_oa
+from vav_min_flow import synthetic_campus
+from py_fleet_sim import FLEET_PARAMS, MODE_SATISFIED, VavFleetController
+
+# PID state that has to be copied back after running a subset of zones
+FLEET_STATE = ("integral_heating", "prev_error_heating", "integral_cooling", "prev_error_cooling")
+AHU_INPUTS = ("mixed_air_temp", "return_air_temp", "outside_air_temp", "ahu_outside_air_damper_cmd")
+
+
+def _differs(new, old):
+    # nan == nan counts as no change
+    return ~((new == old) | (np.isnan(new) & np.isnan(old)))
+
+
+class BuildingGraph:
+    '''
+    One campus: a ZoneTable (zones, their AHU, 62.1 params) plus a
+    VavFleetController for the boxes. Inputs go in through the set_*
+    methods, which only mark what actually changed. scan() evaluates.
+    '''
+    def __init__(self, zones):
+        self.zones = zones
+        n, m = len(zones), len(zones.ahu_names)
+        self.ahu_inputs = np.tile([60.0, 72.0, 40.0, 20.0], (m, 1))
+        self.people = np.zeros(n)
+        self.zone_temp = np.full(n, 72.0)
+        self.percent_oa = np.full(m, np.nan)
+        self.min_flow = np.full(n, np.nan)
+        self.fleet = VavFleetController(n, heat_max_flow=zones.cfm_max, cool_max_flow=zones.cfm_max)
+        self.mode = np.full(n, MODE_SATISFIED, dtype=np.int8)
+        self.dat_setpoint = np.full(n, np.nan)
+        self.airflow_setpoint = np.full(n, np.nan)
+
+        graph = self.graph = DepGraph()
+        graph.add_layer("ahu_inputs", m)
+        graph.add_layer("people", n)
+        graph.add_layer("zone_temp", n)
+        graph.add_layer("zone_setpoint", n)
+        graph.add_layer("percent_oa", m, self._update_percent_oa)
+        graph.add_layer("min_flow", n, self._update_min_flow)
+        graph.add_layer("vav", n, self._update_vav)
+        graph.connect("ahu_inputs", "percent_oa")
+        graph.connect("percent_oa", "min_flow", zones.ahu, np.arange(n))
+        graph.connect("people", "min_flow")
+        for parent in ("min_flow", "zone_temp", "zone_setpoint"):
+            graph.connect(parent, "vav")
+        graph.mark_all()
+
+    # inputs, only the values that moved get marked
+
+    def set_ahu(self, ahu, **values):
+        '''set_ahu(i, mixed_air_temp=61.0, ...) with AHU_INPUTS names.'''
+        row = self.ahu_inputs[ahu]
+        new = row.copy()
+        for name, value in values.items():
+            new[AHU_INPUTS.index(name)] = value
+        if _differs(new, row).any():
+            row[:] = new
+            self.graph.mark("ahu_inputs", [ahu])
+
+    def _set(self, layer, values, idx, new):
+        idx = np.asarray(idx, dtype=np.intp)
+        new = np.broadcast_to(np.asarray(new, dtype=np.float64), idx.shape)
+        moved = _differs(new, values[idx])
+        values[idx[moved]] = new[moved]
+        self.graph.mark(layer, idx[moved])
+
+    def set_people(self, idx, counts):
+        self._set("people", self.people, idx, counts)
+
+    def set_zone_temps(self, idx, temps):
+        self._set("zone_temp", self.zone_temp, idx, temps)
+
+    def set_setpoints(self, idx, setpoints):
+        self._set("zone_setpoint", self.fleet.space_temp_setpoint, idx, setpoints)
+
+    # layer funcs, each gets every dirty index of its layer at once
+
+    def _update_percent_oa(self, idx):
+        new = np.array([
+            np.nan if (oa := calculate_ahu_percent_oa(*self.ahu_inputs[i].tolist())) is None else oa
+            for i in idx.tolist()
+        ])
+        changed = _differs(new, self.percent_oa[idx])
+        self.percent_oa[idx] = new
+        return idx[changed]
+
+    def _update_min_flow(self, idx):
+        z = self.zones
+        zone_oa = self.percent_oa[z.ahu[idx]]
+        vbz = z.people_cfm[idx] * self.people[idx] + z.area_cfm[idx]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            new = np.clip(vbz / zone_oa, z.cfm_min[idx], z.cfm_max[idx])
+        new[~(zone_oa > 0)] = np.nan
+        changed = _differs(new, self.min_flow[idx])
+        self.min_flow[idx] = new
+        return idx[changed]
+
+    def _update_vav(self, idx):
+        fleet = self.fleet
+        # no OA reading means no 62.1 number, fall back to the design min
+        box_min = np.where(np.isnan(self.min_flow[idx]), self.zones.cfm_min[idx], self.min_flow[idx])
+        for name in ("heat_min_flow", "cool_min_flow", "satisfied_airflow_setpoint"):
+            getattr(fleet, name)[idx] = box_min
+
+        if len(idx) == fleet.n_zones:
+            sub = fleet
+        else:
+            sub = VavFleetController.__new__(VavFleetController)
+            sub.n_zones = len(idx)
+            for name in FLEET_PARAMS:
+                setattr(sub, name, getattr(fleet, name)[idx])
+        mode, dat, airflow, _, _ = sub.control_logic(self.zone_temp[idx])
+        if sub is not fleet:
+            for name in FLEET_STATE:
+                getattr(fleet, name)[idx] = getattr(sub, name)
+
+        changed = (mode != self.mode[idx]) | _differs(dat, self.dat_setpoint[idx]) | _differs(airflow, self.airflow_setpoint[idx])
+        self.mode[idx] = mode
+        self.dat_setpoint[idx] = dat
+        self.airflow_setpoint[idx] = airflow
+        return idx[changed]
+
+    def scan(self, full=False):
+        '''
+        One evaluation. full=True recomputes every node (the old way).
+        Returns the DepGraph stats plus how many VAVs ran only because
+        they were active.
+        '''
+        if full:
+            self.graph.mark_all()
+        active = np.flatnonzero(self.mode != MODE_SATISFIED)
+        self.graph.mark("vav", active)
+        stats = self.graph.evaluate()
+        stats["active"] = len(active)
+        return stats
+
+
+def random_changes(rng, n_zones, n_ahus, scan, people=20, temps=100, ahu_every=5):
+    '''A scan's worth of field changes: a few people counts, some zone temps, now and then an AHU.'''
+    changes = {
+        "people": (rng.choice(n_zones, people, replace=False), rng.integers(0, 30, people)),
+        "temps": (rng.choice(n_zones, temps, replace=False), rng.normal(0.0, 0.4, temps)),
+    }
+    if scan % ahu_every == 0:
+        changes["ahu"] = (int(rng.integers(n_ahus)), float(rng.uniform(55.0, 65.0)))
+    return changes
+
+
+def apply_changes(building, changes):
+    building.set_people(*changes["people"])
+    idx, delta = changes["temps"]
+    building.set_zone_temps(idx, building.zone_temp[idx] + delta)
+    if "ahu" in changes:
+        ahu, mat = changes["ahu"]
+        building.set_ahu(ahu, mixed_air_temp=mat)
+
+
+def build(n_zones, seed=22):
+    zones = synthetic_campus(n_zones, n_ahus=max(n_zones // 250, 1), seed=seed)
+    building = BuildingGraph(zones)
+    rng = np.random.default_rng(seed)
+    building.set_people(np.arange(n_zones), rng.integers(0, 30, n_zones))
+    # most zones start in the deadband
+    building.set_zone_temps(np.arange(n_zones), rng.normal(72.0, 0.8, n_zones))
+    building.scan()
+    return building
+
+
+def check_against_full(n_zones=2000, scans=40, seed=3):
+    '''Incremental and full recompute fed the same changes must agree exactly.'''
+    incremental, full = build(n_zones), build(n_zones)
+    rng = np.random.default_rng(seed)
+    n_ahus = len(incremental.zones.ahu_names)
+    for scan in range(scans):
+        changes = random_changes(rng, n_zones, n_ahus, scan)
+        apply_changes(incremental, changes)
+        apply_changes(full, changes)
+        incremental.scan()
+        full.scan(full=True)
+    for name in ("mode", "dat_setpoint", "airflow_setpoint", "min_flow", "percent_oa"):
+        assert not _differs(getattr(incremental, name), getattr(full, name)).any(), name
+    for name in FLEET_STATE:
+        assert np.array_equal(getattr(incremental.fleet, name), getattr(full.fleet, name)), name
+    print(f"Py Info - incremental graph matches a full recompute over {scans} scans x {n_zones} zones")
+
+
+def benchmark(sizes=(1000, 10000, 100000), scans=50, seed=5):
+    print(f"{'zones':>8}  {'nodes':>8}  {'touched/scan':>13}  {'active':>7}  {'incremental':>12}  {'full':>10}")
+    for n_zones in sizes:
+        rng = np.random.default_rng(seed)
+        building = build(n_zones)
+        n_ahus = len(building.zones.ahu_names)
+        touched, active, inc_secs = [], [], 0.0
+        for scan in range(scans):
+            apply_changes(building, random_changes(rng, n_zones, n_ahus, scan))
+            start = time.perf_counter()
+            stats = building.scan()
+            inc_secs += time.perf_counter() - start
+            touched.append(stats["touched"])
+            active.append(stats["active"])
+
+        start = time.perf_counter()
+        for _ in range(5):
+            building.scan(full=True)
+        full_secs = (time.perf_counter() - start) / 5
+        print(f"{n_zones:>8,}  {building.graph.n_nodes:>8,}  {np.mean(touched):>13,.0f}  {np.mean(active):>7,.0f}  "
+              f"{inc_secs / scans * 1000:>9.2f} ms  {full_secs * 1000:>7.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--zones", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--scans", type=int, default=50)
+    args = parser.parse_args()
+    check_against_full()
+    benchmark(args.zones, args.scans)
@@ -1,4 +1,4 @@
-
+import time
 
 # Global configuration for HVAC system
 system_config = {
@@ -15,34 +15,46 @@ system_config = {
     }
 }
 
+# points calculate_ahu_percent_oa records when given a TrendRecorder
+AHU_TREND_POINTS = ('mixed_air_temp', 'return_air_temp', 'outside_air_temp', 'oa_damper_cmd', 'percent_oa_calc', 'percent_oa')
+
 # Function to calculate AHU % Outside Air based on sensor readings
-def calculate_ahu_percent_oa(mixed_air_temp, return_air_temp, outside_air_temp, ahu_outside_air_damper_cmd):
+def calculate_ahu_percent_oa(mixed_air_temp, return_air_temp, outside_air_temp, ahu_outside_air_damper_cmd, recorder=None,
+                             min_delta_t=None):
+    '''
+    recorder: optional wasm_host TrendRecorder with AHU_TREND_POINTS columns,
+    gets one row per call (percent_oa_calc is before the damper min)
+    min_delta_t: OAT and RAT closer than this (F) make the temperature
+    ratio meaningless, so only the damper command is used
+    '''
     if mixed_air_temp is None or return_air_temp is None or outside_air_temp is None:
         print("Invalid sensor data provided.")
         return None
-    if outside_air_temp != return_air_temp:
+    if min_delta_t is not None and abs(outside_air_temp - return_air_temp) < min_delta_t:
+        percent_oa = 0
+    elif outside_air_temp != return_air_temp:
         percent_oa = (mixed_air_temp - return_air_temp) / (outside_air_temp - return_air_temp)
     else:
         percent_oa = 0
+    percent_oa_calc = percent_oa
 
-    print(f" percent_oa calculated is: {percent_oa}")
-        
     ahu_oa_dpr_cmd_as_percent = ahu_outside_air_damper_cmd / 100
     if ahu_oa_dpr_cmd_as_percent > percent_oa:
-        print(f" ahu_oa_dpr_cmd_as_percent > percent_oa!")
         percent_oa = ahu_oa_dpr_cmd_as_percent
-        print(f" percent_oa is now {percent_oa}")
 
-    print(f"Calculated AHU % Outside Air: {percent_oa*100:.2f}%")
+    if recorder is not None:
+        recorder.record(time.time(), mixed_air_temp, return_air_temp, outside_air_temp,
+                        ahu_outside_air_damper_cmd, percent_oa_calc, percent_oa)
     return percent_oa
 
 # Function to calculate VAV box minimum air flow setpoints based on ASHRAE 62.1 Equation 6-1
-def calc_vav_flow_setpoints(Pz, percent_oa):
+def calc_vav_flow_setpoints(Pz, percent_oa, recorder=None):
     '''
     Vbz calculation that incorporates zone population (Pz) 
     and AHU percent OA and Zone Air Distribution Effectiveness (Ez).
     TODO see if Ez can be revised for dynamic calc?
     Vbz = (Rp * Pz + Ra * Az) / Ez / percent_oa
+    recorder: optional TrendRecorder with one column per zone name
     '''
     vav_flow_setpoints = {}
     for zone, occupancy in Pz.items():
@@ -54,11 +66,21 @@ def calc_vav_flow_setpoints(Pz, percent_oa):
             vav_flow_setpoints[zone] = setpoint
         else:
             vav_flow_setpoints[zone] = None
-        print(f"VAV setpoint for {zone}: {vav_flow_setpoints[zone]} CFM")
+    if recorder is not None:
+        recorder.record_row(time.time(), vav_flow_setpoints)
     return vav_flow_setpoints
 
 # Example usage
 if __name__ == "__main__":
+    import argparse
+
+    import repo_path  # puts the repo root on sys.path for wasm_host
+    from wasm_host.trend_recorder import ConsoleSink, TrendRecorder
+
+    parser = argparse.ArgumentParser(description="AHU %OA and 62.1 VAV min flow setpoints")
+    parser.add_argument("--debug", action="store_true", help="print every recorded point")
+    args = parser.parse_args()
+
     # Simulated sensor readings and conditions
     mixed_air_temp = 60.0  # degrees F
     return_air_temp = 72.1  # degrees F
@@ -68,9 +90,19 @@ if __name__ == "__main__":
     # Occupancy People Counts
     Pz = {'zone1': 12, 'zone2': 15, 'zone3': 8}
 
+    ahu_trend = TrendRecorder(AHU_TREND_POINTS, capacity=1024)
+    vav_trend = TrendRecorder(list(system_config['zones']), capacity=1024)
+    if args.debug:
+        ahu_trend.add_sink(ConsoleSink())
+        vav_trend.add_sink(ConsoleSink())
+
     # Calculate AHU % OA
-    percent_oa = calculate_ahu_percent_oa(mixed_air_temp, return_air_temp, outside_air_temp, ahu_outside_air_damper_cmd)
+    percent_oa = calculate_ahu_percent_oa(mixed_air_temp, return_air_temp, outside_air_temp, ahu_outside_air_damper_cmd, ahu_trend)
+    print(f"Calculated AHU % Outside Air: {percent_oa*100:.2f}%")
     
     # Calculate VAV box setpoints based on the AHU % OA
-    vav_setpoints = calc_vav_flow_setpoints(Pz, percent_oa)
+    vav_setpoints = calc_vav_flow_setpoints(Pz, percent_oa, vav_trend)
     print(f"VAV Box Setpoints: {vav_setpoints}")
+
+    ahu_trend.close()
+    vav_trend.close()
@@ -0,0 +1,14 @@
+'''
+Puts the repo root on sys.path so the scripts in this folder can import
+the shared host helpers in wasm_host/. Import it before wasm_host:
+
+    import repo_path  # puts the repo root on sys.path for wasm_host
+    from wasm_host.module_cache import load_module
+'''
+
+import os
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
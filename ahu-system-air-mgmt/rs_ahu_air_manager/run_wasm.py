@@ -1,13 +1,32 @@
+'''
+Binary API of rs_ahu_air_manager. Zones from main.py's system_config
+are registered once and get integer indexes. Each AHU scan is one call
+with the measured mixed/return/outside air temps and damper command
+that writes [percent_oa, zone 0, zone 1, ...] as packed f32 into a
+guest buffer, read back with one numpy.frombuffer over linear memory.
+
+compile with
+$ cargo build --target wasm32-wasi --release
+'''
+
+import os
+import sys
+import time
+
+import numpy as np
 import wasmtime
 
-# compile with
-# $ cargo build --target wasm32-wasi --release
+HERE = os.path.dirname(os.path.abspath(__file__))
+import repo_path  # puts the repo root on sys.path for wasm_host
+sys.path.insert(0, os.path.join(HERE, ".."))
+from wasm_host.bindings import FastFunc
+from wasm_host.module_cache import load_module
+from wasm_host.marshal import GuestMemory
 
-'''
-NOT WORKING YET
-'''
+MODULE_PATH = os.path.join(HERE, "target", "wasm32-wasi", "release", "rs_ahu_air_manager.wasm")
 
-def setup_environment():
+
+def setup_environment(module_path=MODULE_PATH):
     wasi_config = wasmtime.WasiConfig()
     wasi_config.inherit_stdout()
     wasi_config.inherit_stderr()
@@ -19,58 +38,95 @@ def setup_environment():
     linker = wasmtime.Linker(engine)
     linker.define_wasi()
 
-    module_path = './target/wasm32-wasi/release/rs_ahu_air_manager.wasm'
-    module = wasmtime.Module.from_file(engine, module_path)
+    module = load_module(engine, module_path)
     instance = linker.instantiate(store, module)
 
     return store, instance
 
-def create_default_system_config(store, instance):
-    """Retrieve the default HVAC system configuration from Rust"""
-    create_func = instance.exports(store)["create_default_system_config"]
-    result_ptr = create_func(store)
-    
-    if result_ptr == 0:
-        raise ValueError("Failed to retrieve system configuration")
-    
-    return result_ptr
-
-def read_string_from_memory(ptr, store, instance):
-    memory = instance.exports(store)["memory"]
-    data = []
-    offset = 0
-    memory_length = memory.data_len(store)  # Get the total length of the memory
-
-    while True:
-        # Check if the pointer+offset is within the memory bounds
-        if ptr + offset >= memory_length:
-            break
-        byte = memory.read(store, ptr + offset, 1)[0]
-        if byte == 0:
-            break
-        data.append(byte)
-        offset += 1
-
-    return bytes(data).decode('utf-8')
-
-
-def free_system_config(ptr, store, instance):
-    free_func = instance.exports(store)["free_system_config"]
-    free_func(store, ptr)
+
+class AhuAirManager:
+    '''
+    Zone table + output buffer for one AHU. Zones are registered in
+    names order, so setpoints[i] is names[i].
+    '''
+    def __init__(self, store, instance, zones):
+        self.store = store
+        self.instance = instance
+        exports = instance.exports(store)
+        self.guest = GuestMemory(instance, store)
+        self._register_zone = exports["register_zone"]
+        self._set_people_counts = exports["set_people_counts"]
+        calculate = exports["calculate_vav_flow_setpoints_into"]
+        # called every AHU scan, skip Func.__call__'s per call type checks
+        self._calculate = FastFunc(store, calculate, calculate.type(store))
+        exports["clear_zones"](store)
+
+        self.names = list(zones)
+        for i, name in enumerate(self.names):
+            zone = zones[name]
+            index = self._register_zone(store, int(zone["Az_sqft"]), float(zone["Ra_cfm_per_sqft"]),
+                                        float(zone["Rp_cfm_per_person"]), int(zone["cfm_min"]), int(zone["cfm_max"]))
+            if index != i:
+                raise RuntimeError(f"guest gave {name} index {index}, zones must be registered on a fresh table")
+
+        # guest buffers allocated once, reused every scan
+        self.out_len = len(self.names) + 1
+        self.out_ptr = self.guest.alloc(4 * self.out_len)
+        self.counts_ptr = self.guest.alloc(4 * max(len(self.names), 1))
+
+    def set_people_counts(self, counts):
+        '''counts: one people count per zone in names order (dict or sequence).'''
+        if isinstance(counts, dict):
+            counts = [counts.get(name, 0) for name in self.names]
+        data = np.ascontiguousarray(counts, dtype="<i4")
+        if len(data) != len(self.names):
+            raise ValueError(f"{len(data)} people counts for {len(self.names)} zones")
+        self.guest.view()[self.counts_ptr:self.counts_ptr + data.nbytes] = data.tobytes()
+        self._set_people_counts(self.store, self.counts_ptr, len(data))
+
+    def scan(self, mixed_air_temp, return_air_temp, outside_air_temp, ahu_outside_air_damper_cmd):
+        '''One AHU scan, returns (percent_oa, f32 setpoint per zone, nan when percent_oa <= 0).'''
+        n = self._calculate(mixed_air_temp, return_air_temp, outside_air_temp,
+                            ahu_outside_air_damper_cmd, self.out_ptr, self.out_len)
+        if n < 0:
+            raise RuntimeError("output buffer smaller than the zone table")
+        out = np.frombuffer(self.guest.view(), dtype="<f4", count=n + 1, offset=self.out_ptr).copy()
+        return float(out[0]), out[1:]
+
+    def setpoints_dict(self, setpoints):
+        '''Back to the main.py {zone: cfm or None} shape.'''
+        return {name: None if np.isnan(v) else v for name, v in zip(self.names, setpoints.tolist())}
+
+    def close(self):
+        self.guest.free(self.out_ptr, 4 * self.out_len)
+        self.guest.free(self.counts_ptr, 4 * max(len(self.names), 1))
+
+
+def benchmark(manager, scans=10000):
+    start = time.perf_counter()
+    for _ in range(scans):
+        manager.scan(60.0, 72.1, 40.2, 55.5)
+    secs = time.perf_counter() - start
+    print(f"{scans} AHU scans x {len(manager.names)} zones: {secs / scans * 1e6:.1f} us per scan")
+
 
 # Main execution
 if __name__ == "__main__":
+    from main import system_config
+
     store, instance = setup_environment()
-    config_ptr = create_default_system_config(store, instance)
-    config_str = read_string_from_memory(config_ptr, store, instance)
-    print("System Configuration Created:", config_str)
+    manager = AhuAirManager(store, instance, system_config["zones"])
+    manager.set_people_counts({"zone1": 12, "zone2": 15, "zone3": 8})
+
+    # measured values, straight from the AHU sensors
+    percent_oa, setpoints = manager.scan(60.0, 72.1, 40.2, 55.5)
+    print(f"Calculated AHU % Outside Air: {percent_oa * 100:.2f}%")
+    print("VAV Box Setpoints:", manager.setpoints_dict(setpoints))
 
     version_func = instance.exports(store)["version"]
     version_ptr = version_func(store)
-    version_str = read_string_from_memory(version_ptr, store, instance)
-    print("Version:", version_str)
+    print("Version:", manager.guest.read_c_string(version_ptr))
+    instance.exports(store)["free_string"](store, version_ptr)
 
-    # Free memory allocated for the system configuration and version string
-    free_system_config(config_ptr, store, instance)
-    free_func = instance.exports(store)["free_string"]
-    free_func(store, version_ptr)
+    benchmark(manager)
+    manager.close()
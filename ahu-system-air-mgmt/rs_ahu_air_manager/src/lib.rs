@@ -68,9 +68,7 @@ fn calculate_vav_flow_setpoints(percent_oa: f32) -> HashMap<String, Option<f32>>
     let config = SYSTEM_CONFIG.lock().unwrap();
     let mut vav_flow_setpoints = HashMap::new();
     for (zone_name, zone) in config.zones.iter() {
-        let vbz = (zone.rp_cfm_per_person * zone.people_count as f32
-            + zone.ra_cfm_per_sqft * zone.az_sqft as f32)
-            / config.ashrae_standards.ez;
+        let vbz = zone_vbz(zone, config.ashrae_standards.ez);
         let setpoint = vbz / percent_oa;
         vav_flow_setpoints.insert(zone_name.clone(), Some(setpoint));
     }
@@ -111,6 +109,114 @@ pub extern "C" fn calculate_vav_flow_setpoints_extern() -> *mut c_char {
         .into_raw()
 }
 
+// Indexed zone table for the binary API. Zones are registered once and get
+// an integer index, occupancy is updated by index and one call per AHU
+// scan writes every zone's setpoint into a packed f32 buffer the host
+// reads straight out of linear memory, no strings involved.
+lazy_static! {
+    static ref ZONE_TABLE: Mutex<Vec<Zone>> = Mutex::new(Vec::new());
+}
+
+// Register a zone (0 people), returns its index
+#[no_mangle]
+pub extern "C" fn register_zone(
+    az_sqft: i32,
+    ra_cfm_per_sqft: f32,
+    rp_cfm_per_person: f32,
+    cfm_min: i32,
+    cfm_max: i32,
+) -> i32 {
+    let mut table = ZONE_TABLE.lock().unwrap();
+    table.push(Zone {
+        az_sqft,
+        ra_cfm_per_sqft,
+        rp_cfm_per_person,
+        cfm_min,
+        cfm_max,
+        people_count: 0,
+    });
+    (table.len() - 1) as i32
+}
+
+#[no_mangle]
+pub extern "C" fn zone_count() -> i32 {
+    ZONE_TABLE.lock().unwrap().len() as i32
+}
+
+#[no_mangle]
+pub extern "C" fn clear_zones() {
+    ZONE_TABLE.lock().unwrap().clear();
+}
+
+// 0 on success, -1 for an unknown index
+#[no_mangle]
+pub extern "C" fn set_people_count(index: i32, count: i32) -> i32 {
+    let mut table = ZONE_TABLE.lock().unwrap();
+    match table.get_mut(index as usize) {
+        Some(zone) if index >= 0 => {
+            zone.people_count = count;
+            0
+        }
+        _ => -1,
+    }
+}
+
+// Occupancy for zones 0..n from an i32 array in guest memory, returns how
+// many zones were updated
+#[no_mangle]
+pub extern "C" fn set_people_counts(counts: *const i32, n: usize) -> i32 {
+    if counts.is_null() {
+        return -1;
+    }
+    let mut table = ZONE_TABLE.lock().unwrap();
+    let n = n.min(table.len());
+    let counts = unsafe { std::slice::from_raw_parts(counts, n) };
+    for (zone, count) in table.iter_mut().zip(counts) {
+        zone.people_count = *count;
+    }
+    n as i32
+}
+
+// AHU % OA from the measured temps, then every registered zone's VAV min
+// flow setpoint. out gets [percent_oa, zone 0, zone 1, ...] as f32, NaN
+// for every zone when percent_oa <= 0. Returns the zone count, or -1 if
+// out_len is shorter than zone_count() + 1.
+#[no_mangle]
+pub extern "C" fn calculate_vav_flow_setpoints_into(
+    mixed_air_temp: f32,
+    return_air_temp: f32,
+    outside_air_temp: f32,
+    ahu_outside_air_damper_cmd: f32,
+    out: *mut f32,
+    out_len: usize,
+) -> i32 {
+    let table = ZONE_TABLE.lock().unwrap();
+    if out.is_null() || out_len < table.len() + 1 {
+        return -1;
+    }
+    let ez = SYSTEM_CONFIG.lock().unwrap().ashrae_standards.ez;
+    let percent_oa = calculate_ahu_percent_oa(
+        mixed_air_temp,
+        return_air_temp,
+        outside_air_temp,
+        ahu_outside_air_damper_cmd,
+    );
+    let out = unsafe { std::slice::from_raw_parts_mut(out, table.len() + 1) };
+    out[0] = percent_oa;
+    for (slot, zone) in out[1..].iter_mut().zip(table.iter()) {
+        *slot = if percent_oa > 0.0 {
+            zone_vbz(zone, ez) / percent_oa
+        } else {
+            f32::NAN
+        };
+    }
+    table.len() as i32
+}
+
+fn zone_vbz(zone: &Zone, ez: f32) -> f32 {
+    (zone.rp_cfm_per_person * zone.people_count as f32 + zone.ra_cfm_per_sqft * zone.az_sqft as f32) / ez
+}
+
 #[no_mangle]
 pub extern "C" fn update_people_count(zone_name: *const c_char, new_count: i32) -> *mut c_char {
     // Convert C string to Rust string
@@ -163,6 +269,26 @@ pub extern "C" fn free_string(s: *mut c_char) {
     }
 }
 
+// Guest allocator for the host. Python asks for a buffer here instead of
+// writing at the top of linear memory, and hands it back with dealloc.
+#[no_mangle]
+pub extern "C" fn alloc(size: usize) -> *mut u8 {
+    let mut buf = Vec::<u8>::with_capacity(size);
+    let ptr = buf.as_mut_ptr();
+    std::mem::forget(buf);
+    ptr
+}
+
+#[no_mangle]
+pub extern "C" fn dealloc(ptr: *mut u8, size: usize) {
+    if ptr.is_null() {
+        return;
+    }
+    unsafe {
+        drop(Vec::from_raw_parts(ptr, 0, size));
+    }
+}
+
 #[cfg(test)]
 mod tests {
     use super::*;
@@ -257,6 +383,60 @@ mod tests {
         assert!(setpoints.get("zone1").unwrap().is_some());
     }
 
+    #[test]
+    fn test_alloc_dealloc() {
+        let ptr = alloc(64);
+        assert!(!ptr.is_null());
+        unsafe {
+            std::ptr::copy_nonoverlapping(b"zone1\0".as_ptr(), ptr, 6);
+            let name = CStr::from_ptr(ptr as *const c_char).to_str().unwrap();
+            assert_eq!(name, "zone1");
+        }
+        dealloc(ptr, 64);
+    }
+
+    #[test]
+    fn test_binary_setpoints() {
+        setup_default_system_config();
+        clear_zones();
+        // copies, the other tests change SYSTEM_CONFIG occupancy concurrently
+        let zones: Vec<Zone> = ["zone1", "zone2", "zone3"]
+            .iter()
+            .map(|name| SYSTEM_CONFIG.lock().unwrap().zones[*name].clone())
+            .collect();
+        let mut counts = Vec::new();
+        for zone in zones.iter() {
+            let index = register_zone(
+                zone.az_sqft,
+                zone.ra_cfm_per_sqft,
+                zone.rp_cfm_per_person,
+                zone.cfm_min,
+                zone.cfm_max,
+            );
+            assert_eq!(index as usize, counts.len());
+            counts.push(zone.people_count);
+        }
+        assert_eq!(zone_count(), 3);
+        assert_eq!(set_people_counts(counts.as_ptr(), counts.len()), 3);
+        assert_eq!(set_people_count(7, 1), -1);
+
+        let mut out = [0.0f32; 4];
+        assert_eq!(calculate_vav_flow_setpoints_into(60.0, 72.1, 40.2, 55.5, out.as_mut_ptr(), 3), -1);
+        assert_eq!(calculate_vav_flow_setpoints_into(60.0, 72.1, 40.2, 55.5, out.as_mut_ptr(), 4), 3);
+
+        let percent_oa = calculate_ahu_percent_oa(60.0, 72.1, 40.2, 55.5);
+        let ez = SYSTEM_CONFIG.lock().unwrap().ashrae_standards.ez;
+        assert_eq!(out[0], percent_oa);
+        for (i, zone) in zones.iter().enumerate() {
+            assert_eq!(out[i + 1], zone_vbz(zone, ez) / percent_oa);
+        }
+
+        // no outside air, main.py gives None
+        calculate_vav_flow_setpoints_into(72.0, 72.0, 72.0, 0.0, out.as_mut_ptr(), 4);
+        assert_eq!(out[0], 0.0);
+        assert!(out[1..].iter().all(|v| v.is_nan()));
+    }
+
     #[test]
     fn test_version() {
         let ptr = version();
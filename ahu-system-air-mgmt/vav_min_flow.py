@@ -0,0 +1,201 @@
+'''
+Vectorized version of calc_vav_flow_setpoints from main.py for campus
+size zone tables (10k+ zones over many AHUs).
+
+Zone params (Az, Ra, Rp, Ez, cfm_min, cfm_max, which AHU) are packed
+once into numpy columns and the constant parts of ASHRAE 62.1 Eq 6-1
+are precomputed, so an occupancy update is just
+
+    Vbz = Rp/Ez * Pz + Ra*Az/Ez
+    setpoint = clip(Vbz / percent_oa, cfm_min, cfm_max)
+
+over the whole table. Pz can be one count per zone or a time series
+(timesteps x zones) and percent_oa one value, one per AHU, or one per
+AHU per timestep. Zones whose AHU has percent_oa <= 0 get nan (main.py
+gives None).
+
+$ python vav_min_flow.py
+'''
+
+import time
+
+import numpy as np
+
+from main import calc_vav_flow_setpoints, system_config
+
+ZONE_COLUMNS = ("Az_sqft", "Ra_cfm_per_sqft", "Rp_cfm_per_person", "Ez", "cfm_min", "cfm_max")
+
+
+class ZoneTable:
+    '''
+    Columnar zone table. Every column is a float64 array with one slot
+    per zone, ahu is an int index into ahu_names.
+    '''
+    def __init__(self, names, Az_sqft, Ra_cfm_per_sqft, Rp_cfm_per_person, Ez, cfm_min, cfm_max,
+                 ahu=None, ahu_names=None):
+        self.names = list(names)
+        n = len(self.names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        columns = (Az_sqft, Ra_cfm_per_sqft, Rp_cfm_per_person, Ez, cfm_min, cfm_max)
+        for name, value in zip(ZONE_COLUMNS, columns):
+            setattr(self, name, np.array(np.broadcast_to(np.asarray(value, dtype=np.float64), (n,))))
+        self.ahu = np.zeros(n, dtype=np.intp) if ahu is None else np.asarray(ahu, dtype=np.intp)
+        self.ahu_names = list(ahu_names) if ahu_names is not None else ["ahu1"]
+        self.precompute()
+
+    def precompute(self):
+        '''Call again after editing any column.'''
+        self.people_cfm = self.Rp_cfm_per_person / self.Ez
+        self.area_cfm = self.Ra_cfm_per_sqft * self.Az_sqft / self.Ez
+
+    @classmethod
+    def from_config(cls, config=system_config, ahu_of_zone=None):
+        '''
+        Build from a main.py style system_config. ahu_of_zone maps zone
+        name to AHU name, everything goes on one AHU if not given. A zone
+        can set its own Ez, otherwise ashrae_standards Ez is used.
+        '''
+        zones = config["zones"]
+        names = list(zones)
+        default_ez = config["ashrae_standards"]["Ez"]
+        ahu_of_zone = ahu_of_zone or {}
+        ahu_names = sorted(set(ahu_of_zone.values())) or ["ahu1"]
+        ahu_index = {name: i for i, name in enumerate(ahu_names)}
+        return cls(
+            names,
+            Az_sqft=[zones[z]["Az_sqft"] for z in names],
+            Ra_cfm_per_sqft=[zones[z]["Ra_cfm_per_sqft"] for z in names],
+            Rp_cfm_per_person=[zones[z]["Rp_cfm_per_person"] for z in names],
+            Ez=[zones[z].get("Ez", default_ez) for z in names],
+            cfm_min=[zones[z]["cfm_min"] for z in names],
+            cfm_max=[zones[z]["cfm_max"] for z in names],
+            ahu=[ahu_index[ahu_of_zone.get(z, ahu_names[0])] for z in names],
+            ahu_names=ahu_names,
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def occupancy_array(self, Pz):
+        '''Pz dict (zone name -> people) to an array in table order, missing zones = 0.'''
+        counts = np.zeros(len(self))
+        for zone, occupancy in Pz.items():
+            counts[self.index[zone]] = occupancy
+        return counts
+
+    def _zone_percent_oa(self, percent_oa):
+        # scalar, per AHU (n_ahus,) or per timestep per AHU (T, n_ahus) -> per zone
+        percent_oa = np.asarray(percent_oa, dtype=np.float64)
+        if percent_oa.ndim == 0:
+            return percent_oa
+        if percent_oa.shape[-1] != len(self.ahu_names):
+            raise ValueError(f"percent_oa last axis is {percent_oa.shape[-1]}, "
+                             f"expected one per AHU ({len(self.ahu_names)})")
+        return percent_oa[..., self.ahu]
+
+    def vbz(self, Pz):
+        '''Breathing zone OA (cfm) for occupancy Pz, shape (zones,) or (T, zones).'''
+        return self.people_cfm * np.asarray(Pz, dtype=np.float64) + self.area_cfm
+
+    def flow_setpoints(self, Pz, percent_oa, clamp=True, out=None):
+        '''
+        VAV min flow setpoints for every zone (every timestep if Pz is
+        2-D). clamp=False gives the raw main.py numbers.
+        '''
+        zone_oa = self._zone_percent_oa(percent_oa)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            setpoints = np.divide(self.vbz(Pz), zone_oa, out=out)
+        if clamp:
+            np.clip(setpoints, self.cfm_min, self.cfm_max, out=setpoints)
+        setpoints[np.broadcast_to(zone_oa <= 0, setpoints.shape)] = np.nan
+        return setpoints
+
+    def to_dict(self, setpoints):
+        '''Array back to the main.py {zone: cfm or None} shape.'''
+        return {
+            zone: None if np.isnan(value) else value
+            for zone, value in zip(self.names, setpoints.tolist())
+        }
+
+
+def synthetic_campus(n_zones=10000, n_ahus=40, seed=10):
+    rng = np.random.default_rng(seed)
+    area = rng.uniform(200, 3000, n_zones).round()
+    cfm_min = (area * 0.2).round()
+    return ZoneTable(
+        [f"zone{i + 1}" for i in range(n_zones)],
+        Az_sqft=area,
+        Ra_cfm_per_sqft=rng.choice([0.06, 0.12, 1.0], n_zones),
+        Rp_cfm_per_person=rng.choice([5.0, 7.5], n_zones),
+        Ez=rng.choice([0.8, 1.0], n_zones),
+        cfm_min=cfm_min,
+        cfm_max=cfm_min * 2.5,
+        ahu=rng.integers(0, n_ahus, n_zones),
+        ahu_names=[f"ahu{i + 1}" for i in range(n_ahus)],
+    )
+
+
+def check_against_main():
+    '''Unclamped table numbers must equal calc_vav_flow_setpoints.'''
+    table = ZoneTable.from_config()
+    for Pz, percent_oa in (({"zone1": 12, "zone2": 15, "zone3": 8}, 0.555),
+                           ({"zone1": 0, "zone2": 40, "zone3": 3}, 0.2),
+                           ({"zone1": 5, "zone2": 5, "zone3": 5}, 0.0)):
+        expected = calc_vav_flow_setpoints(Pz, percent_oa)
+        got = table.to_dict(table.flow_setpoints(table.occupancy_array(Pz), percent_oa, clamp=False))
+        assert expected == got, f"{expected} != {got}"
+    print("Py Info - ZoneTable matches calc_vav_flow_setpoints")
+
+
+def benchmark(n_zones=10000, n_ahus=40, timesteps=288, seed=11):
+    table = synthetic_campus(n_zones, n_ahus)
+    rng = np.random.default_rng(seed)
+    Pz = rng.integers(0, 30, n_zones)
+    percent_oa = rng.uniform(0.15, 1.0, n_ahus)
+
+    # main.py loop, with system_config swapped for the campus table. main.py
+    # only has one global Ez so the per zone Ez gets folded into Rp and Ra
+    campus = {
+        "zones": {
+            name: {col: float(getattr(table, col)[i]) for col in ZONE_COLUMNS}
+            for i, name in enumerate(table.names)
+        },
+        "ashrae_standards": {"Ez": 1.0},
+    }
+    for name in campus["zones"]:
+        campus["zones"][name]["Rp_cfm_per_person"] /= campus["zones"][name]["Ez"]
+        campus["zones"][name]["Ra_cfm_per_sqft"] /= campus["zones"][name]["Ez"]
+    saved = dict(system_config)
+    system_config.update(campus)
+    Pz_dict = dict(zip(table.names, Pz.tolist()))
+    try:
+        start = time.perf_counter()
+        # one AHU %OA to keep the loop honest, it only takes a scalar
+        calc_vav_flow_setpoints(Pz_dict, float(percent_oa[0]))
+        loop_secs = time.perf_counter() - start
+    finally:
+        system_config.clear()
+        system_config.update(saved)
+
+    start = time.perf_counter()
+    table.flow_setpoints(Pz, percent_oa)
+    vec_secs = time.perf_counter() - start
+
+    series = rng.integers(0, 30, (timesteps, n_zones))
+    series_oa = rng.uniform(0.15, 1.0, (timesteps, n_ahus))
+    start = time.perf_counter()
+    result = table.flow_setpoints(series, series_oa)
+    series_secs = time.perf_counter() - start
+
+    print(f"\n{n_zones} zones on {n_ahus} AHUs")
+    print(f"main.py loop:            {loop_secs * 1e3:8.2f} ms per update")
+    print(f"ZoneTable.flow_setpoints {vec_secs * 1e3:8.2f} ms per update ({loop_secs / vec_secs:,.0f}x)")
+    print(f"{timesteps} timesteps at once:  {series_secs * 1e3:8.2f} ms -> {result.shape} array")
+
+
+if __name__ == "__main__":
+    check_against_main()
+    table = ZoneTable.from_config()
+    Pz = table.occupancy_array({"zone1": 12, "zone2": 15, "zone3": 8})
+    print(f"Clamped setpoints: {table.to_dict(table.flow_setpoints(Pz, 0.555))}")
+    benchmark()
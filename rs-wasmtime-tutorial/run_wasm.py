@@ -1,18 +1,38 @@
+import sys
+import time
+import weakref
+
+import numpy as np
 import wasmtime
 
+import repo_path  # puts the repo root on sys.path for wasm_host
+from wasm_host.module_cache import load_module
+from wasm_host.marshal import GuestMemory
+
+# one GuestMemory per instance so its memory and alloc/dealloc exports are looked up once
+_guests = weakref.WeakKeyDictionary()
+
+def guest_memory(instance, store):
+    guest = _guests.get(instance)
+    if guest is None:
+        guest = _guests[instance] = GuestMemory(instance, store)
+    return guest
+
 def write_c_string_to_memory(instance, store, string, context):
-    memory = instance.exports(store)["memory"]
-    string_bytes = string.encode('utf-8') + b'\x00'  # Null-terminate the string
-    memory_length = memory.data_len(store)
-    pointer = memory_length - len(string_bytes)  # Avoid any existing data
-    memory.write(store, string_bytes, start=pointer)
+    # buffer comes from the guest's alloc export, free with free_c_string_in_memory
+    pointer, size = guest_memory(instance, store).write_c_string(string)
     print(f"Py Info - Writing '{string}' to WASM memory at pointer {pointer} ({context})")
-    return pointer
+    return pointer, size
+
+def free_c_string_in_memory(instance, store, pointer, size):
+    guest_memory(instance, store).free(pointer, size)
 
 def add_account(instance, store, acct_num, name, address, balance):
-    name_ptr = write_c_string_to_memory(instance, store, name, "account name")
+    name_ptr, name_size = write_c_string_to_memory(instance, store, name, "account name")
     add_account_func = instance.exports(store)["add_account"]
     add_account_func(store, acct_num, name_ptr, address, balance)
+    # Rust copies the name into the Account so the buffer can go back
+    free_c_string_in_memory(instance, store, name_ptr, name_size)
     print(f"Py Info - Account {name} added with initial balance: {balance}")
 
 def modify_balance(instance, store, acct_num, amount, name):
@@ -30,17 +50,8 @@ def get_balance(instance, store, acct_num, name):
     free_string(instance, store, ptr)
 
 def read_c_string(instance, store, ptr):
-    memory = instance.exports(store)["memory"]
-    result_bytes = []
-    offset = 0
-    while True:
-        byte = memory.read(store, start=ptr + offset, stop=ptr + offset + 1)[0]
-        if byte == 0:
-            break
-        result_bytes.append(byte)
-        offset += 1
-    string = bytes(result_bytes).decode('utf-8')
-    return string
+    # one memchr for the NUL and one copy out, instead of a read per byte
+    return guest_memory(instance, store).read_c_string(ptr)
 
 def free_string(instance, store, ptr):
     free_func = instance.exports(store)["free_string"]
@@ -48,29 +59,97 @@ def free_string(instance, store, ptr):
     print(f"Py Info - Freed memory at pointer {ptr}")
 
 def custom_print_greet(instance, store, input_str, name):
-    memory = instance.exports(store)["memory"]
     greet_func = instance.exports(store)["custom_greet"]
-    input_bytes = input_str.encode('utf-8')
-    memory_length = memory.data_len(store)
-    input_ptr = memory_length - len(input_bytes) - 1
-    memory.write(store, input_bytes, start=input_ptr)
-    print(f"Py Info - Writing greeting to memory for {name}: {input_str} at pointer {input_ptr}")
-    ptr = greet_func(store, input_ptr)
+    with guest_memory(instance, store).c_string(input_str) as input_ptr:
+        print(f"Py Info - Writing greeting to memory for {name}: {input_str} at pointer {input_ptr}")
+        ptr = greet_func(store, input_ptr)
     result_str = read_c_string(instance, store, ptr)
     print(f"Py Info - Greeting received for {name}: {result_str}")
     free_string(instance, store, ptr)
 
+# Batched journal, see apply_journal in src/lib.rs. One record per operation
+# in, one per operation out, both 16 bytes packed little endian.
+OP_GET_BALANCE = 0
+OP_MODIFY_BALANCE = 1
+STATUS_NAMES = {0: "ok", 1: "account not found", 2: "unknown op"}
+JOURNAL_OP = np.dtype([("op", "<i4"), ("acct_num", "<i4"), ("amount", "<f8")])
+JOURNAL_RESULT = np.dtype([("status", "<i4"), ("acct_num", "<i4"), ("balance", "<f8")])
+
+def journal_ops(ops):
+    '''[(op, acct_num, amount), ...] -> packed JOURNAL_OP array.'''
+    return np.array(ops, dtype=JOURNAL_OP)
+
+def apply_journal(instance, store, ops):
+    '''
+    Apply a JOURNAL_OP array in order under one guest lock. Returns a
+    JOURNAL_RESULT array (status, acct_num, balance after the op).
+    '''
+    ops = np.ascontiguousarray(ops, dtype=JOURNAL_OP)
+    if len(ops) == 0:
+        return np.zeros(0, dtype=JOURNAL_RESULT)
+    exports = instance.exports(store)
+    guest = guest_memory(instance, store)
+    ops_ptr, ops_size = guest.write_bytes(ops.tobytes())
+    try:
+        results_ptr = exports["apply_journal"](store, ops_ptr, len(ops))
+    finally:
+        guest.free(ops_ptr, ops_size)
+    results = guest.read_array(results_ptr, JOURNAL_RESULT, len(ops))
+    exports["free_journal"](store, results_ptr, len(ops))
+    return results
+
+def setup_instance(inherit_stdout=True):
+    wasi_config = wasmtime.WasiConfig()
+    if inherit_stdout:
+        wasi_config.inherit_stdout()
+    store = wasmtime.Store(engine)
+    store.set_wasi(wasi_config)
+    linker = wasmtime.Linker(engine)
+    linker.define_wasi()
+    return store, linker.instantiate(store, module)
+
+def benchmark_journal(sizes=(10_000, 100_000, 1_000_000), n_accounts=1000):
+    '''
+    Per call modify_balance (lock, format, println, CString, read back,
+    free_string) vs one apply_journal call for the same operations. Runs
+    on its own instance with stdout dropped so the console doesn't skew
+    the per call numbers.
+    '''
+    store, instance = setup_instance(inherit_stdout=False)
+    exports = instance.exports(store)
+    guest = guest_memory(instance, store)
+    for acct_num in range(n_accounts):
+        with guest.c_string(f"acct-{acct_num}") as name_ptr:
+            exports["add_account"](store, acct_num, name_ptr, 1.0, 0.0)
+    modify = exports["modify_balance"]
+    free = exports["free_string"]
+    rng = np.random.default_rng(0)
+    print(f"{'ops':>10}  {'per call':>12}  {'journal':>12}  speedup")
+    for size in sizes:
+        ops = np.zeros(size, dtype=JOURNAL_OP)
+        ops["op"] = OP_MODIFY_BALANCE
+        ops["acct_num"] = rng.integers(0, n_accounts, size)
+        ops["amount"] = rng.uniform(-100.0, 100.0, size)
+
+        start = time.perf_counter()
+        for acct_num, amount in zip(ops["acct_num"].tolist(), ops["amount"].tolist()):
+            ptr = modify(store, acct_num, amount)
+            guest.read_c_string(ptr)
+            free(store, ptr)
+        per_call = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = apply_journal(instance, store, ops)
+        journal = time.perf_counter() - start
+        if (results["status"] != 0).any():
+            raise RuntimeError("journal benchmark hit a missing account")
+        print(f"{size:>10,}  {size / per_call:>9,.0f}/s  {size / journal:>9,.0f}/s  {per_call / journal:.0f}x")
+
 # WASM setup and configuration
-wasi_config = wasmtime.WasiConfig()
-wasi_config.inherit_stdout()
 engine = wasmtime.Engine()
-store = wasmtime.Store(engine)
-store.set_wasi(wasi_config)
 module_path = './target/wasm32-wasi/release/rs_wasmtime_tutorial.wasm'
-module = wasmtime.Module.from_file(engine, module_path)
-linker = wasmtime.Linker(engine)
-linker.define_wasi()
-instance = linker.instantiate(store, module)
+module = load_module(engine, module_path)
+store, instance = setup_instance()
 
 # Initialize some fake accounts
 accounts = [
@@ -99,3 +178,16 @@ print("Py Info - 5 + 3 =", result)
 minus_func = instance.exports(store)["minus"]
 result = minus_func(store, 10, 5)
 print("Py Info - 10 - 5 =", result)
+
+# Same kind of transactions as one journal: single lock, single free
+results = apply_journal(instance, store, journal_ops([
+    (OP_MODIFY_BALANCE, 103, 125.0),
+    (OP_MODIFY_BALANCE, 101, -50.0),
+    (OP_GET_BALANCE, 102, 0.0),
+    (OP_MODIFY_BALANCE, 999, 10.0),
+]))
+for status, acct_num, balance in results.tolist():
+    print(f"Py Info - Journal account {acct_num}: {STATUS_NAMES[status]}, balance {balance:.2f}")
+
+if "--bench" in sys.argv:
+    benchmark_journal()
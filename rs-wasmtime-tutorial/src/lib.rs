@@ -46,6 +46,26 @@ pub extern "C" fn minus(a: i32, b: i32) -> i32 {
     a - b
 }
 
+// Guest allocator for the host. Python asks for a buffer here instead of
+// writing at the top of linear memory, and hands it back with dealloc.
+#[no_mangle]
+pub extern "C" fn alloc(size: usize) -> *mut u8 {
+    let mut buf = Vec::<u8>::with_capacity(size);
+    let ptr = buf.as_mut_ptr();
+    std::mem::forget(buf);
+    ptr
+}
+
+#[no_mangle]
+pub extern "C" fn dealloc(ptr: *mut u8, size: usize) {
+    if ptr.is_null() {
+        return;
+    }
+    unsafe {
+        drop(Vec::from_raw_parts(ptr, 0, size));
+    }
+}
+
 struct Account {
     name: String,
     address: f64,
@@ -128,3 +148,77 @@ pub extern "C" fn get_balance(acct_num: i32) -> *mut c_char {
     );
     error_ptr
 }
+
+// Batched journal. The host packs N operations into one buffer, they are
+// applied in order under a single ACCOUNTS lock, and the results come back
+// as one packed array (freed with one free_journal call). No strings and no
+// println per operation.
+//
+// op record, 16 bytes little endian: op i32, acct_num i32, amount f64
+// result record, 16 bytes:           status i32, acct_num i32, balance f64
+pub const OP_GET_BALANCE: i32 = 0;
+pub const OP_MODIFY_BALANCE: i32 = 1;
+
+pub const STATUS_OK: i32 = 0;
+pub const STATUS_NOT_FOUND: i32 = 1;
+pub const STATUS_BAD_OP: i32 = 2;
+
+const JOURNAL_RECORD_SIZE: usize = 16;
+
+#[repr(C)]
+#[derive(Clone, Copy, Debug, PartialEq)]
+pub struct JournalResult {
+    pub status: i32,
+    pub acct_num: i32,
+    pub balance: f64,
+}
+
+fn apply_op(accounts: &mut HashMap<i32, Account>, record: &[u8]) -> JournalResult {
+    // host buffers only come with byte alignment, so decode instead of casting
+    let op = i32::from_le_bytes(record[0..4].try_into().unwrap());
+    let acct_num = i32::from_le_bytes(record[4..8].try_into().unwrap());
+    let amount = f64::from_le_bytes(record[8..16].try_into().unwrap());
+    let (status, balance) = match (op, accounts.get_mut(&acct_num)) {
+        (OP_GET_BALANCE, Some(account)) => (STATUS_OK, account.balance),
+        (OP_MODIFY_BALANCE, Some(account)) => {
+            account.balance += amount;
+            (STATUS_OK, account.balance)
+        }
+        (OP_GET_BALANCE, None) | (OP_MODIFY_BALANCE, None) => (STATUS_NOT_FOUND, f64::NAN),
+        _ => (STATUS_BAD_OP, f64::NAN),
+    };
+    JournalResult {
+        status,
+        acct_num,
+        balance,
+    }
+}
+
+#[no_mangle]
+pub extern "C" fn apply_journal(ops: *const u8, n: usize) -> *mut JournalResult {
+    if ops.is_null() || n == 0 {
+        return std::ptr::null_mut();
+    }
+    let records = unsafe { std::slice::from_raw_parts(ops, n * JOURNAL_RECORD_SIZE) };
+    let mut results = Vec::with_capacity(n);
+    {
+        let mut accounts = ACCOUNTS.lock().unwrap();
+        for record in records.chunks_exact(JOURNAL_RECORD_SIZE) {
+            results.push(apply_op(&mut accounts, record));
+        }
+    }
+    let mut results = results.into_boxed_slice();
+    let ptr = results.as_mut_ptr();
+    std::mem::forget(results);
+    ptr
+}
+
+#[no_mangle]
+pub extern "C" fn free_journal(results: *mut JournalResult, n: usize) {
+    if results.is_null() {
+        return;
+    }
+    unsafe {
+        drop(Box::from_raw(std::ptr::slice_from_raw_parts_mut(results, n)));
+    }
+}
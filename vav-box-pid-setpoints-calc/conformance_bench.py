@@ -0,0 +1,409 @@
+'''
+Conformance + latency suite for the three VAV controller builds:
+
+    python - VavBoxController in py_only_complete_sim.py
+    wat    - wat/complete_sim.wat
+    rust   - rs_vav_box_firmware (pkg/rs_vav_box_firmware_bg.wasm, one
+             zone through the ZoneState batch API)
+
+Every backend gets the same tuning (COMMON_PARAMS, pinned to what the
+WAT has baked in) and the same scenario set of zone temp sequences.
+Mode, DAT setpoint, airflow setpoint and both PID integrals are checked
+against the python reference scan by scan within a tolerance. Cooling
+integrals are compared with the python sign convention (positive when
+the zone is too warm), the WAT and Rust builds accumulate the raw error.
+
+Then each backend runs a long random scan sequence for per scan latency
+(p50/p90/p99/max and a log2 ns histogram), calls/sec and memory per
+instance. Everything lands in one JSON file. With --baseline an older
+JSON is compared and calls/sec drops beyond --max-slowdown are flagged.
+
+$ python conformance_bench.py --out bench.json
+$ python conformance_bench.py --baseline bench.json --strict
+'''
+
+import argparse
+import datetime
+import gc
+import importlib.metadata
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "wat"))
+sys.path.insert(0, os.path.join(HERE, "rs_vav_box_firmware"))
+
+from py_fleet_sim import MODE_CODES
+from py_only_complete_sim import VavBoxController
+
+BACKENDS = ("python", "wat", "rust")
+FIELDS = ("mode", "dat_setpoint", "airflow_setpoint", "integral_heating", "integral_cooling")
+
+# setpoint, deadband, gains and max DAT are constants inside complete_sim.wat
+COMMON_PARAMS = {
+    "setpoint": 72.0,
+    "deadband": 5.0,
+    "ahu_sat": 55.0,
+    "max_dat": 110.0,
+    "heat_min_flow": 100.0,
+    "heat_max_flow": 850.0,
+    "cool_min_flow": 100.0,
+    "cool_max_flow": 1000.0,
+    "satisfied_flow": 50.0,
+    "kp": 5.0,
+    "ki": 1.0,
+}
+
+
+def scenarios(steps=120, seed=12):
+    '''Named zone temp sequences, the same for every backend.'''
+    rng = np.random.default_rng(seed)
+    t = np.arange(steps, dtype=np.float64)
+    return {
+        "satisfied": np.full(steps, 72.0),
+        "steady_heating": np.full(steps, 68.0),
+        "steady_cooling": np.full(steps, 76.0),
+        "deadband_edges": np.where(t % 2 == 0, 69.49, 74.51),
+        "step_heat_to_cool": np.where(t < steps // 2, 66.0, 79.0),
+        "slow_ramp": np.linspace(64.0, 80.0, steps),
+        "sine": 72.0 + 6.0 * np.sin(2 * np.pi * t / 40.0),
+        "random_walk": np.clip(72.0 + np.cumsum(rng.normal(0, 0.6, steps)), 60.0, 84.0),
+    }
+
+
+class PythonBackend:
+    name = "python"
+
+    def __init__(self, params=COMMON_PARAMS):
+        self.params = params
+
+    def new(self):
+        p = self.params
+        return VavBoxController(
+            deadband=p["deadband"],
+            space_temp_setpoint=p["setpoint"],
+            heat_min_flow=p["heat_min_flow"],
+            heat_max_flow=p["heat_max_flow"],
+            cool_min_flow=p["cool_min_flow"],
+            cool_max_flow=p["cool_max_flow"],
+            satisfied_airflow_setpoint=p["satisfied_flow"],
+            ahu_sat=p["ahu_sat"],
+            max_dat=p["max_dat"],
+            Kp_heating=p["kp"],
+            Ki_heating=p["ki"],
+            Kp_cooling=p["kp"],
+            Ki_cooling=p["ki"],
+        )
+
+    def scan(self, vav, temp):
+        mode, dat, airflow, _, _ = vav.control_logic(space_temp=temp)
+        return MODE_CODES[mode], dat, airflow, vav.integral_heating, vav.integral_cooling
+
+    def timed_scan(self, vav, temp):
+        vav.control_logic(space_temp=temp)
+
+
+class WatBackend:
+    name = "wat"
+
+    def __init__(self, params=COMMON_PARAMS):
+        import wasmtime
+        from wat_instance_pool import COMPLETE_SIM_WAT, INPUT_DEFAULTS
+        from wasm_host.module_cache import load_module
+
+        self.engine = wasmtime.Engine()
+        self.module = load_module(self.engine, COMPLETE_SIM_WAT)
+        self.inputs = dict(INPUT_DEFAULTS)
+        self.inputs.update({
+            "ahu_supply_air_temp": params["ahu_sat"],
+            "clg_flow_min_air_flow_setpoint": params["cool_min_flow"],
+            "clg_flow_max_air_flow_setpoint": params["cool_max_flow"],
+            "satisfied_flow_min_air_flow_setpoint": params["satisfied_flow"],
+            "htg_flow_min_air_flow_setpoint": params["heat_min_flow"],
+            "htg_flow_max_air_flow_setpoint": params["heat_max_flow"],
+        })
+
+    def new(self):
+        from wat_instance_pool import WatController
+        ctl = WatController(self.engine, self.module, self.inputs)
+        ctl.temp = ctl.inputs["zone_air_temp"]
+        ctl.fields = [ctl.outputs[name] for name in (
+            "mode", "discharge_air_temp_setpoint", "discharge_air_flow_setpoint",
+            "integral_heating", "integral_cooling",
+        )]
+        return ctl
+
+    def scan(self, ctl, temp):
+        ctl.temp.set(temp)
+        ctl.scan()
+        mode, dat, airflow, integral_heating, integral_cooling = (g.get() for g in ctl.fields)
+        return mode, dat, airflow, integral_heating, -integral_cooling
+
+    def timed_scan(self, ctl, temp):
+        ctl.temp.set(temp)
+        ctl.scan()
+
+
+class RustBackend:
+    name = "rust"
+
+    def __init__(self, params=COMMON_PARAMS):
+        from run_wasm_batch import FIRMWARE_WASM
+        if not os.path.exists(FIRMWARE_WASM):
+            raise FileNotFoundError(
+                f"{os.path.relpath(FIRMWARE_WASM, HERE)} not built, run wasm-pack build "
+                "--target no-modules --release in rs_vav_box_firmware"
+            )
+        import wasmtime
+        self.engine = wasmtime.Engine()
+        self.path = FIRMWARE_WASM
+        self.params = params
+
+    def new(self):
+        from run_wasm_batch import VavFirmwareBatch
+        firmware = VavFirmwareBatch(self.path, self.engine)
+        zone = firmware.default_zones(1).copy()
+        p = self.params
+        zone["zone_air_temp_setpoint"] = p["setpoint"]
+        zone["zone_air_temp_deadband"] = p["deadband"]
+        zone["ahu_supply_air_temp"] = p["ahu_sat"]
+        zone["max_discharge_air_temp"] = p["max_dat"]
+        zone["htg_flow_min_air_flow_setpoint"] = p["heat_min_flow"]
+        zone["htg_flow_max_air_flow_setpoint"] = p["heat_max_flow"]
+        zone["clg_flow_min_air_flow_setpoint"] = p["cool_min_flow"]
+        zone["clg_flow_max_air_flow_setpoint"] = p["cool_max_flow"]
+        zone["satisfied_flow_min_air_flow_setpoint"] = p["satisfied_flow"]
+        for gain in ("kp_heating", "kp_cooling"):
+            zone[gain] = p["kp"]
+        for gain in ("ki_heating", "ki_cooling"):
+            zone[gain] = p["ki"]
+        firmware.zone = zone
+        return firmware
+
+    def scan(self, firmware, temp):
+        firmware.zone["zone_air_temp"] = temp
+        firmware.zone = firmware.step(firmware.zone).copy()
+        z = firmware.zone[0]
+        return (z["mode"], z["discharge_air_temp_setpoint"], z["discharge_air_flow_setpoint"],
+                z["integral_heating"], -z["integral_cooling"])
+
+    def timed_scan(self, firmware, temp):
+        firmware.zone["zone_air_temp"] = temp
+        # step() hands back a read only view of the bytes read out
+        firmware.zone = firmware.step(firmware.zone).copy()
+
+
+BACKEND_CLASSES = {"python": PythonBackend, "wat": WatBackend, "rust": RustBackend}
+
+
+def run_scenarios(backend, scenario_set):
+    '''{scenario: array of steps x FIELDS} from a fresh instance per scenario.'''
+    results = {}
+    for name, temps in scenario_set.items():
+        instance = backend.new()
+        results[name] = np.array([backend.scan(instance, float(t)) for t in temps], dtype=np.float64)
+    return results
+
+
+def compare(reference, candidate, scenario_set, tol=1e-6):
+    '''Per field agreement of candidate vs the reference results.'''
+    report = {"tolerance": tol, "fields": {}, "scenarios": {}, "first_mismatch": None}
+    totals = {f: [0, 0.0] for f in FIELDS}
+    total_steps = 0
+    for name in scenario_set:
+        ref, got = reference[name], candidate[name]
+        diff = np.abs(ref - got)
+        ok = diff <= tol
+        total_steps += len(ref)
+        report["scenarios"][name] = {f: float(ok[:, j].mean()) for j, f in enumerate(FIELDS)}
+        for j, f in enumerate(FIELDS):
+            totals[f][0] += int(ok[:, j].sum())
+            totals[f][1] = max(totals[f][1], float(diff[:, j].max()))
+        bad = np.argwhere(~ok)
+        if len(bad) and report["first_mismatch"] is None:
+            step, j = bad[0]
+            report["first_mismatch"] = {
+                "scenario": name,
+                "step": int(step),
+                "field": FIELDS[j],
+                "reference": float(ref[step, j]),
+                "got": float(got[step, j]),
+            }
+    for f, (ok_count, max_diff) in totals.items():
+        report["fields"][f] = {"agree": ok_count / total_steps, "max_abs_diff": max_diff}
+    report["pass"] = all(v["agree"] == 1.0 for v in report["fields"].values())
+    return report
+
+
+def latency(backend, scans=20000, seed=13):
+    '''Per scan timings on one instance over random zone temps.'''
+    temps = np.random.default_rng(seed).uniform(62, 82, scans).tolist()
+    instance = backend.new()
+    timed_scan = backend.timed_scan
+    for t in temps[:200]:
+        timed_scan(instance, t)
+
+    clock = time.perf_counter_ns
+    samples = np.empty(scans, dtype=np.int64)
+    gc.disable()
+    try:
+        for i, t in enumerate(temps):
+            start = clock()
+            timed_scan(instance, t)
+            samples[i] = clock() - start
+    finally:
+        gc.enable()
+
+    us = samples / 1000.0
+    # log2 buckets of ns, key is the bucket upper bound
+    buckets = np.bincount(np.ceil(np.log2(np.maximum(samples, 1))).astype(int))
+    return {
+        "scans": scans,
+        "us_mean": float(us.mean()),
+        "us_p50": float(np.percentile(us, 50)),
+        "us_p90": float(np.percentile(us, 90)),
+        "us_p99": float(np.percentile(us, 99)),
+        "us_max": float(us.max()),
+        "calls_per_sec": float(scans / (samples.sum() / 1e9)),
+        "histogram_ns": {str(2 ** b): int(c) for b, c in enumerate(buckets) if c},
+    }
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def memory_per_instance(backend, count=200):
+    '''
+    Python heap (tracemalloc) and RSS growth per live instance. RSS is
+    what counts for the wasm stores since their memory is native.
+    '''
+    gc.collect()
+    rss_before = _rss_bytes()
+    tracemalloc.start()
+    instances = [backend.new() for _ in range(count)]
+    heap, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = _rss_bytes()
+    result = {"instances": count, "py_heap_bytes": heap / count}
+    result["rss_bytes"] = (rss_after - rss_before) / count if rss_before is not None else None
+    del instances
+    return result
+
+
+def compare_baseline(report, baseline, max_slowdown):
+    '''calls/sec regressions against an older report.'''
+    regressions = []
+    for name, result in report["backends"].items():
+        old = baseline.get("backends", {}).get(name, {})
+        if result.get("status") != "ok" or old.get("status") != "ok":
+            continue
+        new_rate = result["latency"]["calls_per_sec"]
+        old_rate = old["latency"]["calls_per_sec"]
+        change = new_rate / old_rate - 1.0
+        result["latency"]["baseline_calls_per_sec"] = old_rate
+        result["latency"]["change"] = change
+        if change < -max_slowdown:
+            regressions.append({"backend": name, "calls_per_sec": new_rate,
+                                "baseline_calls_per_sec": old_rate, "change": change})
+    return regressions
+
+
+def run_suite(backends=BACKENDS, steps=120, scans=20000, tol=1e-6, memory_count=200):
+    scenario_set = scenarios(steps)
+    report = {
+        "meta": {
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "params": COMMON_PARAMS,
+        "scenarios": {name: len(temps) for name, temps in scenario_set.items()},
+        "backends": {},
+    }
+    try:
+        report["meta"]["wasmtime"] = importlib.metadata.version("wasmtime")
+    except importlib.metadata.PackageNotFoundError:
+        report["meta"]["wasmtime"] = None
+
+    reference = run_scenarios(PythonBackend(), scenario_set)
+    for name in backends:
+        try:
+            backend = BACKEND_CLASSES[name]()
+        except (FileNotFoundError, ImportError) as e:
+            report["backends"][name] = {"status": "skipped", "reason": str(e)}
+            continue
+        results = reference if name == "python" else run_scenarios(backend, scenario_set)
+        report["backends"][name] = {
+            "status": "ok",
+            "conformance": compare(reference, results, scenario_set, tol),
+            "latency": latency(backend, scans),
+            "memory": memory_per_instance(backend, memory_count),
+        }
+    return report
+
+
+def print_summary(report):
+    for name, result in report["backends"].items():
+        if result["status"] != "ok":
+            print(f"{name:>7}: skipped - {result['reason']}")
+            continue
+        conf, lat, mem = result["conformance"], result["latency"], result["memory"]
+        agree = ", ".join(f"{f} {v['agree']:.0%}" for f, v in conf["fields"].items())
+        rss = f"{mem['rss_bytes'] / 1024:.1f} KB rss" if mem["rss_bytes"] is not None else "rss n/a"
+        print(f"{name:>7}: {'PASS' if conf['pass'] else 'DIFF'} ({agree})")
+        print(f"         p50 {lat['us_p50']:.2f} us, p99 {lat['us_p99']:.2f} us, "
+              f"{lat['calls_per_sec']:,.0f} calls/sec, {mem['py_heap_bytes'] / 1024:.1f} KB heap / {rss} per instance")
+        if conf["first_mismatch"]:
+            m = conf["first_mismatch"]
+            print(f"         first diff: {m['scenario']} step {m['step']} {m['field']} "
+                  f"python {m['reference']:.4f} vs {m['got']:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default="bench.json")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--steps", type=int, default=120, help="scans per conformance scenario")
+    parser.add_argument("--scans", type=int, default=20000, help="scans for the latency run")
+    parser.add_argument("--tol", type=float, default=1e-6)
+    parser.add_argument("--baseline", help="older JSON report to check calls/sec against")
+    parser.add_argument("--max-slowdown", type=float, default=0.2)
+    parser.add_argument("--strict", action="store_true", help="exit 1 on any conformance diff or regression")
+    args = parser.parse_args()
+
+    report = run_suite(args.backends, args.steps, args.scans, args.tol)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_baseline(report, json.load(f), args.max_slowdown)
+        report["regressions"] = regressions
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print_summary(report)
+    for r in regressions:
+        print(f"REGRESSION {r['backend']}: {r['calls_per_sec']:,.0f} calls/sec vs "
+              f"{r['baseline_calls_per_sec']:,.0f} ({r['change']:+.0%})")
+    print(f"Py Info - report written to {args.out}")
+
+    failed = any(
+        r["status"] == "ok" and not r["conformance"]["pass"] for r in report["backends"].values()
+    )
+    if args.strict and (failed or regressions):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
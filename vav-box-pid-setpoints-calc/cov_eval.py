@@ -0,0 +1,291 @@
+'''
+Change of value (COV) evaluation for big buildings. Most zones sit in
+the deadband most of the day, but control_logic recomputes every zone
+every scan. Here a zone's logic only re-runs when one of its inputs
+moved by at least its significance threshold, when max_interval seconds
+passed since it last ran, or (by default) when it is actively heating
+or cooling. Everything else gets its outputs from the cache.
+
+Integrators stay right: satisfied zones don't touch their PID state so
+skipping them is free, and with skip_active=True a skipped heating or
+cooling zone is re-run with dt = the time since it last ran, so the
+integral catches up on the scans it missed.
+
+The COV check itself is one vectorized pass over every zone (CovGate),
+so a skipped zone costs no Python at all:
+
+    CovZones - one controller object per zone (VavBoxController, a
+               complete_sim.wat WatController, ...), only the due zones
+               are looped over
+    CovFleet - a VavFleetController, the due zones are gathered out and
+               run in one vectorized call
+
+$ python cov_eval.py
+'''
+
+import time
+
+import numpy as np
+
+from py_fleet_sim import FLEET_PARAMS, MODE_CODES, MODE_SATISFIED, VavFleetController
+from py_only_complete_sim import VavBoxController
+
+# smallest move that counts as a change, F for temps
+DEFAULT_THRESHOLDS = {"space_temp": 0.1, "space_temp_setpoint": 0.01, "ahu_sat": 0.25}
+# so a 0.1 F sensor step still counts against a 0.1 threshold
+THRESHOLD_EPS = 1e-9
+# PID state that has to be copied back after evaluating a subset
+FLEET_STATE = ("integral_heating", "prev_error_heating", "integral_cooling", "prev_error_cooling")
+OUTPUT_FIELDS = ("mode", "dat_setpoint", "airflow_setpoint", "heating_demand", "cooling_demand")
+
+
+class CovGate:
+    '''Per zone last evaluated inputs, time since last run and idle flag.'''
+    def __init__(self, n_zones, input_names, thresholds=None, max_interval=300.0, skip_active=False):
+        thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.n_zones = n_zones
+        self.input_names = tuple(input_names)
+        self.thresholds = {name: thresholds[name] - THRESHOLD_EPS for name in self.input_names}
+        self.max_interval = max_interval
+        self.skip_active = skip_active
+        self.last_inputs = {name: np.full(n_zones, np.nan) for name in self.input_names}
+        self.since_eval = np.zeros(n_zones)
+        self.idle = np.ones(n_zones, dtype=bool)
+        self.scans = 0
+        self.evaluated = 0
+        self.skipped = 0
+
+    def due(self, inputs, dt):
+        '''
+        Indexes of the zones that have to run this scan and the dt to run
+        each of them with.
+        '''
+        self.since_eval += dt
+        mask = self.since_eval >= self.max_interval
+        for name in self.input_names:
+            # nan last value = never evaluated, always runs
+            mask |= ~(np.abs(inputs[name] - self.last_inputs[name]) < self.thresholds[name])
+        if not self.skip_active:
+            mask |= ~self.idle
+        idx = np.flatnonzero(mask)
+        self.scans += 1
+        self.evaluated += len(idx)
+        self.skipped += self.n_zones - len(idx)
+        # satisfied zones had no PID running while skipped, active ones
+        # catch up on the time they missed
+        eval_dt = np.where(self.idle[idx], dt, self.since_eval[idx])
+        return idx, eval_dt
+
+    def ran(self, idx, inputs, idle):
+        for name in self.input_names:
+            self.last_inputs[name][idx] = inputs[name][idx]
+        self.since_eval[idx] = 0.0
+        self.idle[idx] = idle
+
+    def stats(self):
+        total = self.evaluated + self.skipped
+        return {
+            "scans": self.scans,
+            "evaluated": self.evaluated,
+            "skipped": self.skipped,
+            "skip_rate": self.skipped / total if total else 0.0,
+        }
+
+
+class CovZones:
+    '''
+    COV front end for a list of per zone controllers.
+
+    evaluate(controller, values, dt) runs one zone and returns a tuple of
+    OUTPUT_FIELDS numbers (mode as a code), values being that zone's
+    inputs in input_names order. Use supports_dt=False for controllers
+    that integrate once per call whatever dt is (complete_sim.wat), then
+    active zones always run.
+    '''
+    def __init__(self, controllers, evaluate, input_names=("space_temp",), thresholds=None,
+                 max_interval=300.0, skip_active=False, supports_dt=True):
+        self.controllers = list(controllers)
+        self.evaluate = evaluate
+        self.gate = CovGate(len(self.controllers), input_names, thresholds, max_interval,
+                            skip_active and supports_dt)
+        self.outputs = np.zeros((len(self.controllers), len(OUTPUT_FIELDS)))
+
+    @classmethod
+    def for_vav(cls, controllers, **kwargs):
+        '''VavBoxController objects, input is space_temp.'''
+        def evaluate(vav, values, dt):
+            mode, dat, airflow, heating, cooling = vav.control_logic(space_temp=values[0], dt=dt)
+            return MODE_CODES[mode], dat, airflow, heating, cooling
+        return cls(controllers, evaluate, **kwargs)
+
+    @classmethod
+    def for_wat(cls, controllers, **kwargs):
+        '''wat_instance_pool.WatController objects, input is space_temp.'''
+        def evaluate(ctl, values, dt):
+            ctl.inputs["zone_air_temp"].set(values[0])
+            ctl.scan()
+            out = ctl.outputs
+            return (out["mode"].get(), out["discharge_air_temp_setpoint"].get(),
+                    out["discharge_air_flow_setpoint"].get(), out["pid_output_heating"].get(),
+                    out["pid_output_cooling"].get())
+        return cls(controllers, evaluate, supports_dt=False, **kwargs)
+
+    def scan(self, dt=1, **inputs):
+        '''inputs are arrays of one value per zone, keyed by input name.'''
+        inputs = {name: np.asarray(inputs[name], dtype=np.float64) for name in self.gate.input_names}
+        idx, eval_dt = self.gate.due(inputs, dt)
+        if len(idx):
+            rows = np.column_stack([inputs[name][idx] for name in self.gate.input_names]).tolist()
+            controllers, evaluate, outputs = self.controllers, self.evaluate, self.outputs
+            for i, values, zone_dt in zip(idx.tolist(), rows, eval_dt.tolist()):
+                outputs[i] = evaluate(controllers[i], values, zone_dt)
+            self.gate.ran(idx, inputs, outputs[idx, 0] == MODE_SATISFIED)
+        return self.outputs
+
+    def stats(self):
+        return self.gate.stats()
+
+
+class CovFleet:
+    '''
+    COV front end for a VavFleetController. scan() takes the zone temp
+    array (plus optional setpoint / ahu_sat arrays) and returns the
+    cached output arrays, refreshed for the zones that were evaluated.
+    '''
+    def __init__(self, fleet, thresholds=None, max_interval=300.0, skip_active=False):
+        self.fleet = fleet
+        self.gate = CovGate(fleet.n_zones, ("space_temp", "space_temp_setpoint", "ahu_sat"),
+                            thresholds, max_interval, skip_active)
+        n = fleet.n_zones
+        self.mode = np.full(n, MODE_SATISFIED, dtype=np.int8)
+        self.dat_setpoint = np.zeros(n)
+        self.airflow_setpoint = np.zeros(n)
+        self.heating_demand = np.zeros(n)
+        self.cooling_demand = np.zeros(n)
+
+    def _subset(self, idx):
+        '''A VavFleetController over just the zones in idx (params copied out).'''
+        sub = VavFleetController.__new__(VavFleetController)
+        sub.n_zones = len(idx)
+        for name in FLEET_PARAMS:
+            setattr(sub, name, getattr(self.fleet, name)[idx])
+        return sub
+
+    def scan(self, space_temp, dt=1, space_temp_setpoint=None, ahu_sat=None):
+        n = self.fleet.n_zones
+        if space_temp_setpoint is not None:
+            self.fleet.space_temp_setpoint[:] = space_temp_setpoint
+        if ahu_sat is not None:
+            self.fleet.ahu_sat[:] = ahu_sat
+        inputs = {
+            "space_temp": np.broadcast_to(np.asarray(space_temp, dtype=np.float64), (n,)),
+            "space_temp_setpoint": self.fleet.space_temp_setpoint,
+            "ahu_sat": self.fleet.ahu_sat,
+        }
+
+        idx, eval_dt = self.gate.due(inputs, dt)
+        if not len(idx):
+            return self.outputs()
+        if len(idx) == n:
+            results = self.fleet.control_logic(inputs["space_temp"], eval_dt)
+        else:
+            sub = self._subset(idx)
+            results = sub.control_logic(inputs["space_temp"][idx], eval_dt)
+            for name in FLEET_STATE:
+                getattr(self.fleet, name)[idx] = getattr(sub, name)
+
+        mode, dat, airflow, heating_demand, cooling_demand = results
+        self.mode[idx] = mode
+        self.dat_setpoint[idx] = dat
+        self.airflow_setpoint[idx] = airflow
+        self.heating_demand[idx] = heating_demand
+        self.cooling_demand[idx] = cooling_demand
+        self.gate.ran(idx, inputs, mode == MODE_SATISFIED)
+        return self.outputs()
+
+    def outputs(self):
+        return self.mode, self.dat_setpoint, self.airflow_setpoint, self.heating_demand, self.cooling_demand
+
+    def stats(self):
+        return self.gate.stats()
+
+
+def building_temps(n_zones, steps, seed=14):
+    '''
+    Zone temps like a BAS reports them: 0.1 F resolution, slow drift,
+    most zones parked inside the deadband and a few wandering out.
+    '''
+    rng = np.random.default_rng(seed)
+    base = np.where(rng.random(n_zones) < 0.9, rng.uniform(70.5, 73.5, n_zones), rng.uniform(64, 80, n_zones))
+    drift = np.cumsum(rng.normal(0, 0.01, (steps, n_zones)), axis=0)
+    return np.round(base + drift, 1)
+
+
+def _report(label, full_secs, cov_secs, stats, max_diff):
+    print(f"{label}")
+    print(f"  every zone every scan: {full_secs:.2f} s")
+    print(f"  COV:                   {cov_secs:.2f} s ({full_secs / cov_secs:.1f}x), "
+          f"skip rate {stats['skip_rate']:.1%}, max output diff {max_diff:.3g}")
+
+
+def benchmark(n_zones=10000, steps=300, wat_zones=1000):
+    temps = building_temps(n_zones, steps)
+
+    # one object per zone, where COV pays off the most
+    vavs = [VavBoxController() for _ in range(n_zones)]
+    exact = np.zeros((n_zones, len(OUTPUT_FIELDS)))
+    start = time.perf_counter()
+    for k in range(steps):
+        row = temps[k].tolist()
+        for i, vav in enumerate(vavs):
+            mode, *rest = vav.control_logic(space_temp=row[i])
+            exact[i] = (MODE_CODES[mode], *rest)
+    full_secs = time.perf_counter() - start
+
+    cov = CovZones.for_vav([VavBoxController() for _ in range(n_zones)])
+    start = time.perf_counter()
+    for k in range(steps):
+        got = cov.scan(space_temp=temps[k])
+    cov_secs = time.perf_counter() - start
+    _report(f"\n{n_zones} zones x {steps} scans, VavBoxController per zone",
+            full_secs, cov_secs, cov.stats(), float(np.max(np.abs(exact - got))))
+
+    # complete_sim.wat instances
+    import os
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "wat"))
+    from wat_instance_pool import WatControllerPool
+    pool = WatControllerPool(size=2 * wat_zones)
+    plain = [pool.checkout() for _ in range(wat_zones)]
+    cov = CovZones.for_wat([pool.checkout() for _ in range(wat_zones)])
+    exact = np.zeros((wat_zones, len(OUTPUT_FIELDS)))
+    start = time.perf_counter()
+    for k in range(steps):
+        row = temps[k, :wat_zones].tolist()
+        for i, ctl in enumerate(plain):
+            exact[i] = cov.evaluate(ctl, (row[i],), 1)
+    full_secs = time.perf_counter() - start
+    start = time.perf_counter()
+    for k in range(steps):
+        got = cov.scan(space_temp=temps[k, :wat_zones])
+    cov_secs = time.perf_counter() - start
+    _report(f"{wat_zones} zones x {steps} scans, complete_sim.wat instance per zone",
+            full_secs, cov_secs, cov.stats(), float(np.max(np.abs(exact - got))))
+
+    # already vectorized, COV only trims the per element work
+    full = VavFleetController(n_zones)
+    start = time.perf_counter()
+    for k in range(steps):
+        exact = full.control_logic(temps[k])
+    full_secs = time.perf_counter() - start
+    cov = CovFleet(VavFleetController(n_zones))
+    start = time.perf_counter()
+    for k in range(steps):
+        got = cov.scan(temps[k])
+    cov_secs = time.perf_counter() - start
+    max_diff = max(float(np.max(np.abs(np.asarray(a, dtype=float) - b))) for a, b in zip(exact, got))
+    _report(f"{n_zones} zones x {steps} scans, VavFleetController", full_secs, cov_secs, cov.stats(), max_diff)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,136 @@
+'''
+Hot swap demo. A zone sits in heating on complete_sim.wat, and partway
+through a retuned build (different Kp_heating) is deployed two ways:
+
+    restart  - new Store + instance, integral_heating and mode start over
+    hot swap - wasm_host/hot_swap.py, compiled in the background and
+               switched at a scan boundary with the PID state carried over
+
+and the heating output around the deploy is printed for both, along
+with how long the scans took while the new build was compiling.
+
+If the Rust firmware is built (rs_vav_box_firmware/pkg) the batch
+firmware gets swapped for itself too. Its zone table is host side, so
+nothing has to move and the swap is just the new instance.
+
+$ python hot_swap_sim.py
+'''
+
+import os
+import sys
+import tempfile
+import time
+
+import wasmtime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+import repo_path  # puts the repo root on sys.path for wasm_host
+sys.path.insert(0, os.path.join(HERE, "rs_vav_box_firmware"))
+from wasm_host.bindings import bind
+from wasm_host.hot_swap import HotSwap
+from wasm_host.module_cache import load_module
+
+COMPLETE_SIM = os.path.join(HERE, "wat", "complete_sim.wat")
+IMPORTS = {
+    "zone_air_temp": 68.0,
+    "ahu_supply_air_temp": 55.0,
+    "clg_flow_min_air_flow_setpoint": 50.0,
+    "clg_flow_max_air_flow_setpoint": 1000.0,
+    "satisfied_flow_min_air_flow_setpoint": 50.0,
+    "htg_flow_min_air_flow_setpoint": 100.0,
+    "htg_flow_max_air_flow_setpoint": 850.0,
+}
+
+
+def write_retuned_build(folder, kp_heating=4.0):
+    '''complete_sim.wat with a new Kp_heating, standing in for a new release.'''
+    with open(COMPLETE_SIM) as f:
+        wat = f.read()
+    old = "(global $Kp_heating f64 (f64.const 5.0))"
+    if old not in wat:
+        raise RuntimeError("complete_sim.wat no longer declares Kp_heating the way this demo expects")
+    path = os.path.join(folder, "complete_sim_v2.wat")
+    with open(path, "w") as f:
+        f.write(wat.replace(old, f"(global $Kp_heating f64 (f64.const {kp_heating}))"))
+    return path
+
+
+def control_scan(sim):
+    sim.control_logic()
+    return sim.mode, sim.integral_heating, sim.pid_output_heating
+
+
+def run_restart(engine, new_build, scans, deploy_at):
+    sim = bind(engine, load_module(engine, COMPLETE_SIM), imports=IMPORTS)
+    trace = []
+    for scan in range(scans):
+        if scan == deploy_at:
+            # the old way, fresh store and instance
+            sim = bind(engine, load_module(engine, new_build), imports=IMPORTS)
+        trace.append(control_scan(sim))
+    return trace
+
+
+def run_hot_swap(engine, new_build, scans, deploy_at, scan_period=0.002):
+    swap = HotSwap.for_binding(engine, COMPLETE_SIM, imports=IMPORTS, name="zone-1")
+    trace = []
+    scan_ms = []
+    swapped_at = None
+    for scan in range(scans):
+        if scan == deploy_at:
+            swap.stage(new_build)
+        start = time.perf_counter()
+        trace.append(swap.scan(control_scan))
+        scan_ms.append((time.perf_counter() - start) * 1000)
+        if swapped_at is None and swap.generation:
+            swapped_at = scan
+        time.sleep(scan_period)
+    return trace, scan_ms, swapped_at
+
+
+def firmware_swap():
+    try:
+        from run_wasm_batch import FIRMWARE_WASM, VavFirmwareBatch
+    except ImportError as e:
+        print(f"Py Info - skipping firmware swap: {e}")
+        return
+    if not os.path.exists(FIRMWARE_WASM):
+        print(f"Py Info - skipping firmware swap, build {FIRMWARE_WASM} with wasm-pack first")
+        return
+    engine = wasmtime.Engine()
+    swap = HotSwap(lambda path: VavFirmwareBatch(path, engine), lambda fw: {}, lambda fw, state: None,
+                   FIRMWARE_WASM, name="firmware")
+    zones = swap.current.default_zones(100)
+    zones["zone_air_temp"] = 68.0
+    for scan in range(20):
+        if scan == 10:
+            swap.stage(FIRMWARE_WASM, wait=True)
+        zones = swap.scan(lambda fw: fw.step(zones))
+    print(f"Py Info - firmware integral_heating after swap: {zones['integral_heating'][0]:.2f}")
+
+
+def main(scans=30, deploy_at=12):
+    engine = wasmtime.Engine()
+    with tempfile.TemporaryDirectory() as tmp:
+        new_build = write_retuned_build(tmp)
+        restart = run_restart(engine, new_build, scans, deploy_at)
+        hot, scan_ms, swapped_at = run_hot_swap(engine, new_build, scans, deploy_at)
+
+    print(f"\nheating output around the deploy at scan {deploy_at}")
+    print(f"{'scan':>4}  {'restart int / out':>20}  {'hot swap int / out':>20}")
+    for scan in range(deploy_at - 3, min(scans, deploy_at + 5)):
+        _, r_int, r_out = restart[scan]
+        _, h_int, h_out = hot[scan]
+        print(f"{scan:>4}  {r_int:>9.2f} / {r_out:>8.2f}  {h_int:>9.2f} / {h_out:>8.2f}")
+
+    print(f"\nscan time from deploy on: max {max(scan_ms[deploy_at:]):.3f} ms "
+          f"(before deploy max {max(scan_ms[:deploy_at]):.3f} ms), {len(hot)} of {scans} scans ran")
+    if swapped_at is None:
+        print("Py Info - new build never became ready")
+    else:
+        print(f"Py Info - hot swap deployed at scan {deploy_at}, new build live from scan {swapped_at}")
+    firmware_swap()
+
+
+if __name__ == "__main__":
+    main()
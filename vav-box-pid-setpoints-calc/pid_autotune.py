@@ -0,0 +1,332 @@
+'''
+PID gain autotuning for a whole building, on top of VavFleetController
+and the ZonePlant model.
+
+Every candidate gain set for every zone is one slot of a fleet, so
+thousands of closed loop runs go through one vectorized control_logic
++ plant.step per scan. The heating and cooling loops are tuned on their
+own episodes (the other loop's gains don't move during them):
+
+    heating - zone starts cold on a cold day, recover to setpoint, then
+              a heat loss step
+    cooling - zone starts warm on a hot day with high internal gains,
+              then those gains jump
+
+Each run is scored on (COST_WEIGHTS):
+    settle    - fraction of the episode before the zone is within
+                SETTLE_TOLERANCE of the deadband for good (the G36
+                logic parks a zone on the deadband edge, so it never
+                sits strictly inside)
+    error     - mean F outside the deadband over the episode
+    overshoot - F past the setpoint on the far side
+    windup    - how far the integral term alone got past the 100% cap
+                (VavBoxController has no anti-windup)
+    hunting   - heating <-> cooling mode flips
+    saturation - fraction of the episode the loop's output sits on the
+                100% cap
+    effort    - mean step to step output change, as a fraction of full
+                scale (actuator travel, on/off chatter)
+    recovery  - mean F outside the deadband after the load step
+
+Without saturation and effort the search drifts to the top of
+GAIN_RANGES, i.e. on/off control, which recovers fastest on the plant
+model but slams the reheat valve / damper between 0 and 100% on the real
+box. Without the load step (internal gains jump at LOAD_STEP_AT of the
+episode: heat loss for heating, a crowd / solar gain for cooling) it
+drifts to P only, Ki on the floor: the start transient alone never needs
+more than Kp gets from the deadband edge, so integral action only shows
+up as windup and chatter. Ki still tunes low, the integral only
+integrates outside the deadband and never unwinds in it.
+
+Search is successive halving: lots of log-uniform (Kp, Ki) candidates
+on a short episode, the best 1/eta go on to an eta times longer one,
+and so on. The survivors then get a local refinement round (log normal
+perturbations around each, full episode). The current defaults are
+always in the pool, so a zone never ends up worse off than the hand
+tuned gains. Zones are split over worker processes.
+
+$ python pid_autotune.py --zones 200 --out tuned_gains.csv
+'''
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from py_fleet_sim import MODE_COOLING, MODE_HEATING, VavFleetController
+from py_only_complete_sim import VavBoxController
+from zone_plant import ZonePlant
+
+LOOPS = ("heating", "cooling")
+# plant + box params that can differ per zone
+ZONE_PARAMS = ("C_air", "C_mass", "R_out", "R_mass", "q_internal", "space_temp_setpoint",
+               "heat_max_flow", "cool_max_flow")
+EPISODES = {
+    # start offset from setpoint (F), outdoor temp, internal gain multiplier,
+    # and the load step: internal gain multiplier from LOAD_STEP_AT on
+    "heating": {"offset": -6.0, "outdoor_temp": 20.0, "q_scale": 0.3, "step_q_scale": -2.0},
+    "cooling": {"offset": 6.0, "outdoor_temp": 95.0, "q_scale": 1.5, "step_q_scale": 3.5},
+}
+# fraction of the episode before the load step
+LOAD_STEP_AT = 0.6
+COST_WEIGHTS = {"settle": 1.0, "error": 1.0, "overshoot": 0.5, "windup": 0.5, "hunting": 0.2,
+                "saturation": 1.0, "effort": 2.0, "recovery": 2.0}
+SETTLE_TOLERANCE = 0.5
+GAIN_RANGES = {"Kp": (0.2, 100.0), "Ki": (0.005, 5.0)}
+# tuned gains within this fraction of a GAIN_RANGES span, in log space,
+# of an end count as on the bound (0.1 is a factor of 2 for Ki)
+BOUND_LOG_MARGIN = 0.1
+_box = VavBoxController()
+DEFAULT_GAINS = {loop: (getattr(_box, f"Kp_{loop}"), getattr(_box, f"Ki_{loop}")) for loop in LOOPS}
+
+
+def synthetic_building(n_zones, seed=19):
+    '''Zone params for a made up building, small perimeter offices to big open areas.'''
+    rng = np.random.default_rng(seed)
+    size = rng.uniform(0.5, 3.0, n_zones)
+    return {
+        "C_air": 500.0 * size,
+        "C_mass": 8000.0 * size * rng.uniform(0.5, 2.0, n_zones),
+        "R_out": 0.01 / size * rng.uniform(0.5, 2.0, n_zones),
+        "R_mass": 0.0005 / size,
+        "q_internal": 3000.0 * size * rng.uniform(0.5, 1.5, n_zones),
+        "space_temp_setpoint": rng.choice([70.0, 72.0, 74.0], n_zones),
+        "heat_max_flow": 850.0 * size,
+        "cool_max_flow": 1000.0 * size,
+    }
+
+
+def simulate_loop(loop, zone_params, kp, ki, steps, dt=60.0):
+    '''
+    Closed loop episode for one loop. kp / ki are (zones, candidates)
+    arrays, zone_params arrays of zones. Returns the cost terms, each
+    (zones, candidates).
+    '''
+    n_zones, n_cand = kp.shape
+    n = n_zones * n_cand
+    per = {name: np.repeat(np.asarray(zone_params[name], dtype=np.float64), n_cand) for name in ZONE_PARAMS}
+    episode = EPISODES[loop]
+    gains = {f"Kp_{loop}": kp.ravel(), f"Ki_{loop}": ki.ravel()}
+    fleet = VavFleetController(
+        n,
+        space_temp_setpoint=per["space_temp_setpoint"],
+        heat_max_flow=per["heat_max_flow"],
+        cool_max_flow=per["cool_max_flow"],
+        **gains,
+    )
+    setpoint = fleet.space_temp_setpoint
+    start = setpoint + episode["offset"]
+    plant = ZonePlant(
+        n, zone_temp=start, C_air=per["C_air"], C_mass=per["C_mass"], R_out=per["R_out"],
+        R_mass=per["R_mass"], q_internal=per["q_internal"] * episode["q_scale"],
+    )
+    band = fleet.deadband / 2
+    # +1 heating wants the temp to go up
+    direction = 1.0 if loop == "heating" else -1.0
+    ki_flat = gains[f"Ki_{loop}"]
+    integral = fleet.integral_heating if loop == "heating" else fleet.integral_cooling
+
+    step_at = int(steps * LOAD_STEP_AT)
+    q_step = per["q_internal"] * episode["step_q_scale"]
+    overshoot = np.zeros(n)
+    outside = np.zeros(n)
+    after_step = np.zeros(n)
+    windup = np.zeros(n)
+    last_out = np.zeros(n)
+    hunting = np.zeros(n)
+    saturated = np.zeros(n)
+    effort = np.zeros(n)
+    prev_output = np.zeros(n)
+    prev_mode = np.zeros(n, dtype=np.int8)
+    for k in range(steps):
+        mode, dat, airflow, heating_demand, cooling_demand = fleet.control_logic(plant.zone_temp)
+        output = heating_demand if loop == "heating" else cooling_demand
+        saturated += output >= 100.0
+        effort += np.abs(output - prev_output)
+        prev_output = output
+        temps = plant.step(dat, airflow, dt, episode["outdoor_temp"], q_step if k >= step_at else None)
+        err = (temps - setpoint) * direction
+        np.maximum(overshoot, err, out=overshoot)
+        np.maximum(windup, ki_flat * np.abs(integral) - 100.0, out=windup)
+        off = np.abs(temps - setpoint) - band
+        outside += np.maximum(off, 0.0)
+        if k >= step_at:
+            after_step += np.maximum(off, 0.0)
+        last_out[off > SETTLE_TOLERANCE] = k + 1
+        flips = ((prev_mode == MODE_HEATING) & (mode == MODE_COOLING)) | ((prev_mode == MODE_COOLING) & (mode == MODE_HEATING))
+        hunting += flips
+        active = mode != 0
+        prev_mode = np.where(active, mode, prev_mode)
+
+    shape = (n_zones, n_cand)
+    return {
+        "settle": (last_out / steps).reshape(shape),
+        "error": (outside / steps).reshape(shape),
+        "overshoot": overshoot.reshape(shape),
+        "windup": (windup / 100.0).reshape(shape),
+        "hunting": hunting.reshape(shape),
+        "saturation": (saturated / steps).reshape(shape),
+        "effort": (effort / steps / 100.0).reshape(shape),
+        "recovery": (after_step / (steps - step_at)).reshape(shape),
+    }
+
+
+def cost(terms):
+    return sum(COST_WEIGHTS[name] * terms[name] for name in COST_WEIGHTS)
+
+
+def _log_uniform(rng, bounds, shape):
+    lo, hi = np.log(bounds[0]), np.log(bounds[1])
+    return np.exp(rng.uniform(lo, hi, shape))
+
+
+def _take(values, idx):
+    return np.take_along_axis(values, idx, axis=1)
+
+
+def tune_loop(loop, zone_params, n_candidates=243, eta=3, base_steps=20, max_steps=180,
+              refine=16, dt=60.0, seed=0):
+    '''
+    Successive halving + refinement for one loop on every zone given.
+    Returns best Kp, Ki, cost and the default gains' cost per zone,
+    plus the number of zone-steps simulated.
+    '''
+    rng = np.random.default_rng(seed)
+    n_zones = len(zone_params["C_air"])
+    kp = _log_uniform(rng, GAIN_RANGES["Kp"], (n_zones, n_candidates))
+    ki = _log_uniform(rng, GAIN_RANGES["Ki"], (n_zones, n_candidates))
+    kp[:, 0], ki[:, 0] = DEFAULT_GAINS[loop]
+    work = 0
+
+    steps = base_steps
+    while kp.shape[1] > max(refine // 4, 1) and steps < max_steps:
+        scores = cost(simulate_loop(loop, zone_params, kp, ki, steps, dt))
+        work += kp.size * steps
+        keep = max(kp.shape[1] // eta, 1)
+        order = np.argsort(scores, axis=1, kind="stable")[:, :keep]
+        kp, ki = _take(kp, order), _take(ki, order)
+        steps = min(steps * eta, max_steps)
+
+    # refinement around the survivors on the full episode, defaults ride along
+    survivors = kp.shape[1]
+    per = max(refine // survivors, 1)
+    spread = np.exp(rng.normal(0.0, 0.25, (n_zones, survivors, per)))
+    kp_ref = np.clip((kp[:, :, None] * spread).reshape(n_zones, -1), *GAIN_RANGES["Kp"])
+    spread = np.exp(rng.normal(0.0, 0.25, (n_zones, survivors, per)))
+    ki_ref = np.clip((ki[:, :, None] * spread).reshape(n_zones, -1), *GAIN_RANGES["Ki"])
+    default = np.array(DEFAULT_GAINS[loop])
+    kp = np.concatenate([kp, kp_ref, np.full((n_zones, 1), default[0])], axis=1)
+    ki = np.concatenate([ki, ki_ref, np.full((n_zones, 1), default[1])], axis=1)
+    terms = simulate_loop(loop, zone_params, kp, ki, max_steps, dt)
+    scores = cost(terms)
+    work += kp.size * max_steps
+
+    best = np.argmin(scores, axis=1)[:, None]
+    return {
+        "Kp": _take(kp, best)[:, 0],
+        "Ki": _take(ki, best)[:, 0],
+        "cost": _take(scores, best)[:, 0],
+        "default_cost": scores[:, -1],
+        "terms": {name: _take(values, best)[:, 0] for name, values in terms.items()},
+        "work": work,
+    }
+
+
+def _tune_chunk(zone_params, settings):
+    return {loop: tune_loop(loop, zone_params, **settings) for loop in LOOPS}
+
+
+def tune_building(zone_params, workers=None, **settings):
+    '''Both loops for every zone, zones split over worker processes.'''
+    n_zones = len(zone_params["C_air"])
+    workers = workers or os.cpu_count() or 1
+    chunks = [idx for idx in np.array_split(np.arange(n_zones), workers) if len(idx)]
+    parts = [{name: np.asarray(values)[idx] for name, values in zone_params.items()} for idx in chunks]
+    if len(parts) == 1:
+        results = [_tune_chunk(parts[0], settings)]
+    else:
+        with ProcessPoolExecutor(max_workers=len(parts)) as pool:
+            results = list(pool.map(_tune_chunk, parts, [settings] * len(parts)))
+
+    merged = {}
+    for loop in LOOPS:
+        merged[loop] = {
+            key: np.concatenate([r[loop][key] for r in results])
+            for key in ("Kp", "Ki", "cost", "default_cost")
+        }
+        merged[loop]["terms"] = {
+            name: np.concatenate([r[loop]["terms"][name] for r in results]) for name in COST_WEIGHTS
+        }
+        merged[loop]["work"] = sum(r[loop]["work"] for r in results)
+    return merged
+
+
+def bound_hits(result):
+    '''
+    {(loop, gain, "low"/"high"): fraction of zones} for gains that ended
+    up near a GAIN_RANGES end, measured in log space like the search
+    samples. Lots of zones there means the best gains are probably
+    outside the range (widen it) or the cost is rewarding an extreme
+    (e.g. Ki at the bottom: the loop does better as P only).
+    '''
+    hits = {}
+    for loop in LOOPS:
+        for gain, (lo, hi) in GAIN_RANGES.items():
+            # 0 at the low end, 1 at the high end
+            where = np.log(result[loop][gain] / lo) / np.log(hi / lo)
+            for end, on in (("low", where <= BOUND_LOG_MARGIN), ("high", where >= 1.0 - BOUND_LOG_MARGIN)):
+                if on.any():
+                    hits[(loop, gain, end)] = float(on.mean())
+    return hits
+
+
+def write_gains(path, result):
+    '''CSV of zone index plus the VavBoxController gain kwargs.'''
+    n = len(result["heating"]["Kp"])
+    with open(path, "w") as f:
+        f.write("zone,Kp_heating,Ki_heating,Kp_cooling,Ki_cooling,heating_cost,cooling_cost\n")
+        for i in range(n):
+            h, c = result["heating"], result["cooling"]
+            f.write(f"{i},{h['Kp'][i]:.4g},{h['Ki'][i]:.4g},{c['Kp'][i]:.4g},{c['Ki'][i]:.4g},"
+                    f"{h['cost'][i]:.4f},{c['cost'][i]:.4f}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--zones", type=int, default=200)
+    parser.add_argument("--candidates", type=int, default=243, help="starting candidates per zone per loop")
+    parser.add_argument("--workers", type=int, default=None, help="default: every CPU")
+    parser.add_argument("--out", default=None, help="write the tuned gains as CSV")
+    args = parser.parse_args()
+
+    zones = synthetic_building(args.zones)
+    start = time.perf_counter()
+    result = tune_building(zones, workers=args.workers, n_candidates=args.candidates)
+    secs = time.perf_counter() - start
+
+    work = sum(result[loop]["work"] for loop in LOOPS)
+    print(f"Py Info - tuned {args.zones} zones x 2 loops in {secs:.1f} s "
+          f"({work:,} closed loop zone-steps, {work / secs:,.0f}/sec)")
+    for loop in LOOPS:
+        r = result[loop]
+        better = np.mean(r["cost"] < r["default_cost"] - 1e-9)
+        print(f"  {loop}: cost {r['default_cost'].mean():.3f} with Kp/Ki {DEFAULT_GAINS[loop]} -> "
+              f"{r['cost'].mean():.3f} tuned, improved {better:.0%} of zones")
+        print(f"    tuned Kp median {np.median(r['Kp']):.2f} ({r['Kp'].min():.2f}-{r['Kp'].max():.2f}), "
+              f"Ki median {np.median(r['Ki']):.3f} ({r['Ki'].min():.3f}-{r['Ki'].max():.3f})")
+        print("    " + ", ".join(f"{name} {r['terms'][name].mean():.3f}" for name in COST_WEIGHTS))
+    for (loop, gain, end), share in bound_hits(result).items():
+        if share >= 0.1:
+            lo, hi = GAIN_RANGES[gain]
+            print(f"Py Info - warning: {loop} {gain} of {share:.0%} of zones is at the {end} end of "
+                  f"GAIN_RANGES[{gain!r}] = ({lo:g}, {hi:g}), widen the range or check what the cost "
+                  "rewards there before trusting those gains")
+    if args.out:
+        write_gains(args.out, result)
+        print(f"Py Info - gains written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
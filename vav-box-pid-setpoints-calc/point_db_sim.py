@@ -0,0 +1,141 @@
+'''
+Controllers fed from a shared memory point table (wasm_host/point_db.py)
+instead of hand set globals and kwargs.
+
+A SyntheticPoller process stands in for the field bus poller and writes
+every zone air temp plus the AHU temps / damper into inputs.points.
+This process maps the same file and every scan runs:
+
+    VavFleetController   - every zone, its zone_air_temp block copied out
+                           in one memcpy (the PID state moves, so a
+                           lapped read has to be safe to redo)
+    complete_sim.wat     - zone 0, globals set straight off the bank
+    calculate_ahu_percent_oa from ahu-system-air-mgmt/main.py, pure so
+                           it runs in place on the bank
+
+The outputs (mode / DAT / airflow per zone, %OA) are published into
+outputs.points, which a supervisor or BAS gateway maps read only.
+
+$ python point_db_sim.py --zones 2000 --scans 50
+'''
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import wasmtime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+import repo_path  # puts the repo root on sys.path for wasm_host
+from wasm_host.ahu import load_ahu_main
+from wasm_host.bindings import bind
+from wasm_host.module_cache import load_module
+from wasm_host.point_db import PointTable, SyntheticPoller, point_names
+from py_fleet_sim import VavFleetController
+
+COMPLETE_SIM = os.path.join(HERE, "wat", "complete_sim.wat")
+AHU_POINTS = ("mixed_air_temp", "return_air_temp", "outside_air_temp", "ahu_outside_air_damper_cmd")
+# what the poller's sine + noise is centered on
+POLLER_BASE = {
+    "zone_air_temp": 72.0,
+    "ahu_supply_air_temp": 55.0,
+    "mixed_air_temp": 60.0,
+    "return_air_temp": 72.0,
+    "outside_air_temp": 40.0,
+    "ahu_outside_air_damper_cmd": 20.0,
+}
+WAT_IMPORTS = {
+    "zone_air_temp": 72.0,
+    "ahu_supply_air_temp": 55.0,
+    "clg_flow_min_air_flow_setpoint": 50.0,
+    "clg_flow_max_air_flow_setpoint": 1000.0,
+    "satisfied_flow_min_air_flow_setpoint": 50.0,
+    "htg_flow_min_air_flow_setpoint": 100.0,
+    "htg_flow_max_air_flow_setpoint": 850.0,
+}
+
+
+def create_tables(folder, n_zones):
+    inputs = PointTable.create(
+        os.path.join(folder, "inputs.points"),
+        point_names(zone_air_temp=n_zones, ahu_supply_air_temp=1, **{name: 1 for name in AHU_POINTS}),
+    )
+    outputs = PointTable.create(
+        os.path.join(folder, "outputs.points"),
+        point_names(mode=n_zones, dat_setpoint=n_zones, airflow_setpoint=n_zones, percent_oa=1,
+                    wat_mode=1, wat_dat_setpoint=1, wat_airflow_setpoint=1),
+    )
+    return inputs, outputs
+
+
+def run(n_zones=2000, scans=50, scan_period=0.1, poll_hz=20.0, folder=None):
+    ahu = load_ahu_main()
+    engine = wasmtime.Engine()
+    wat = bind(engine, load_module(engine, COMPLETE_SIM), imports=WAT_IMPORTS)
+    fleet = VavFleetController(n_zones)
+
+    with tempfile.TemporaryDirectory(dir=folder) as tmp:
+        writer_inputs, outputs = create_tables(tmp, n_zones)
+        poller = SyntheticPoller(writer_inputs.path, base=POLLER_BASE, spread=4.0, rate_hz=poll_hz).start()
+        # controller side maps the inputs read only, like a separate process would
+        inputs = PointTable.open(writer_inputs.path)
+        zones = inputs.block("zone_air_temp")
+        sat = inputs.index["ahu_supply_air_temp"]
+        ahu_idx = inputs.indexes(AHU_POINTS)
+        wat_idx = inputs.indexes(["zone_air_temp[0]", "ahu_supply_air_temp"])
+        out_mode, out_dat, out_flow = outputs.block("mode"), outputs.block("dat_setpoint"), outputs.block("airflow_setpoint")
+        space_temp = np.empty(n_zones)
+
+        def fleet_inputs(bank):
+            np.copyto(space_temp, bank[zones])
+            fleet.ahu_sat[:] = bank[sat]
+
+        while inputs.publishes == 0:
+            time.sleep(0.001)
+        scan_secs = []
+        try:
+            for _ in range(scans):
+                start = time.perf_counter()
+                inputs.read(fleet_inputs)
+                mode, dat, airflow, _, _ = fleet.control_logic(space_temp)
+                inputs.read(lambda bank: wat.set_row(bank[wat_idx], names=["zone_air_temp", "ahu_supply_air_temp"]))
+                wat.control_logic()
+                percent_oa = inputs.read(lambda bank: ahu.calculate_ahu_percent_oa(*bank[ahu_idx].tolist()))
+
+                with outputs.write(copy_live=False) as bank:
+                    bank[out_mode] = mode
+                    bank[out_dat] = dat
+                    bank[out_flow] = airflow
+                    bank[outputs.index["percent_oa"]] = percent_oa
+                    bank[outputs.index["wat_mode"]] = wat.mode
+                    bank[outputs.index["wat_dat_setpoint"]] = wat.discharge_air_temp_setpoint
+                    bank[outputs.index["wat_airflow_setpoint"]] = wat.discharge_air_flow_setpoint
+                scan_secs.append(time.perf_counter() - start)
+                time.sleep(max(scan_period - scan_secs[-1], 0.0))
+        finally:
+            poller.stop()
+
+        supervisor = PointTable.open(outputs.path)
+        latest = supervisor.snapshot()
+        modes = supervisor.read(lambda bank: np.bincount(bank[supervisor.block("mode")].astype(np.int64), minlength=3))
+        print(f"Py Info - {scans} scans x {n_zones} zones off {inputs.n_points} shared points, "
+              f"poller published {inputs.publishes} times, {inputs.laps} reads re-run after a lap")
+        print(f"  scan: median {np.median(scan_secs) * 1000:.2f} ms, max {max(scan_secs) * 1000:.2f} ms "
+              f"(fleet + wat + AHU, outputs published)")
+        print(f"  supervisor view: {modes[0]} satisfied / {modes[1]} heating / {modes[2]} cooling, "
+              f"%OA {latest['percent_oa'] * 100:.1f}, wat zone 0 mode {latest['wat_mode']:.0f} "
+              f"DAT {latest['wat_dat_setpoint']:.1f} airflow {latest['wat_airflow_setpoint']:.0f}")
+        for table in (supervisor, inputs, writer_inputs, outputs):
+            table.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--zones", type=int, default=2000)
+    parser.add_argument("--scans", type=int, default=50)
+    parser.add_argument("--scan-period", type=float, default=0.1)
+    parser.add_argument("--poll-hz", type=float, default=20.0, help="0 publishes flat out")
+    args = parser.parse_args()
+    run(args.zones, args.scans, args.scan_period, args.poll_hz)
@@ -0,0 +1,215 @@
+import time
+import random
+
+import numpy as np
+
+from py_only_complete_sim import VavBoxController
+
+# mode codes match the complete_sim.wat $mode global
+MODE_SATISFIED = 0
+MODE_HEATING = 1
+MODE_COOLING = 2
+MODE_NAMES = np.array(["Satisfied", "Heating", "Cooling"])
+# VavBoxController mode string -> code
+MODE_CODES = {str(name): code for code, name in enumerate(MODE_NAMES)}
+
+# every per zone setting and PID state var on VavBoxController
+FLEET_PARAMS = (
+    "deadband",
+    "space_temp_setpoint",
+    "heat_min_flow",
+    "heat_max_flow",
+    "cool_min_flow",
+    "cool_max_flow",
+    "satisfied_airflow_setpoint",
+    "ahu_sat",
+    "max_dat",
+    "Kp_heating",
+    "Ki_heating",
+    "Kd_heating",
+    "integral_heating",
+    "prev_error_heating",
+    "Kp_cooling",
+    "Ki_cooling",
+    "Kd_cooling",
+    "integral_cooling",
+    "prev_error_cooling",
+)
+
+
+class VavFleetController:
+    '''
+    Struct of arrays version of VavBoxController for a whole fleet
+    of VAV boxes. Each attribute of the scalar class is a float64
+    numpy array with one slot per zone, so zones can have their own
+    setpoints, flow limits and PID gains. One call to control_logic
+    runs the G36 logic for every zone with masks instead of if/else
+    and gives the exact same numbers as looping VavBoxController.
+    '''
+    def __init__(self, n_zones, **params):
+        unknown = set(params) - set(FLEET_PARAMS)
+        if unknown:
+            raise TypeError(f"Unknown VAV fleet params: {sorted(unknown)}")
+
+        # defaults come straight off the scalar class so the two never drift
+        defaults = VavBoxController()
+        self.n_zones = n_zones
+        for name in FLEET_PARAMS:
+            value = params.get(name, getattr(defaults, name))
+            setattr(self, name, np.array(np.broadcast_to(np.asarray(value, dtype=np.float64), (n_zones,))))
+
+    @classmethod
+    def from_controllers(cls, controllers):
+        '''Pack a list of VavBoxController objects into one fleet.'''
+        params = {
+            name: [getattr(vav, name) for vav in controllers]
+            for name in FLEET_PARAMS
+        }
+        return cls(len(controllers), **params)
+
+    def update_setpoint(self, space_temp_setpoint):
+        self.space_temp_setpoint[:] = space_temp_setpoint
+
+    def calc_cooling_pid(self, error, mask, dt=1):
+        integral = self.integral_cooling + error * dt
+        derivative = (error - self.prev_error_cooling) / dt
+        output = (self.Kp_cooling * error) + (self.Ki_cooling * integral) + (self.Kd_cooling * derivative)
+        np.copyto(self.integral_cooling, integral, where=mask)
+        np.copyto(self.prev_error_cooling, error, where=mask)
+        return output
+
+    def calc_heating_pid(self, error, mask, dt=1):
+        integral = self.integral_heating + error * dt
+        derivative = (error - self.prev_error_heating) / dt
+        output = (self.Kp_heating * error) + (self.Ki_heating * integral) + (self.Kd_heating * derivative)
+        np.copyto(self.integral_heating, integral, where=mask)
+        np.copyto(self.prev_error_heating, error, where=mask)
+        return output
+
+    def control_logic(self, space_temp, dt=1):
+        '''
+        Run one scan for every zone. space_temp and dt can be scalars
+        or arrays of n_zones. Returns mode codes (see MODE_NAMES), DAT
+        setpoint, airflow setpoint, heating demand and cooling demand
+        as arrays.
+        '''
+        space_temp = np.asarray(space_temp, dtype=np.float64)
+
+        # Calculate the error or deviation from setpoint
+        error = self.space_temp_setpoint - space_temp
+
+        active = np.abs(error) > self.deadband / 2
+        heating = active & (error > 0)
+        cooling = active & ~(error > 0)
+
+        mode = np.full(self.n_zones, MODE_SATISFIED, dtype=np.int8)
+        mode[heating] = MODE_HEATING
+        mode[cooling] = MODE_COOLING
+
+        # PID state only moves for the zones in that mode
+        heating_demand = np.where(heating, self.calc_heating_pid(error, heating, dt), 0.0)
+        cooling_demand = np.where(cooling, self.calc_cooling_pid(-error, cooling, dt), 0.0)
+
+        # Limit the demands to a maximum of 100%
+        heating_demand = np.maximum(np.minimum(heating_demand, 100), 0)
+        cooling_demand = np.maximum(np.minimum(cooling_demand, 100), 0)
+
+        # Heating: reset DAT up to max_dat over 0-50% then airflow over 50-100%
+        low_heat = heating_demand <= 50
+        heat_dat = np.where(
+            low_heat,
+            self.ahu_sat + ((heating_demand / 50) * (self.max_dat - self.ahu_sat)),
+            self.max_dat,
+        )
+        heat_airflow = np.where(
+            low_heat,
+            self.heat_min_flow,
+            self.heat_min_flow + (((heating_demand - 50) / 50) * (self.heat_max_flow - self.heat_min_flow)),
+        )
+
+        # Cooling: DAT stays at AHU SAT and airflow resets min to max
+        cool_airflow = self.cool_min_flow + (cooling_demand * (self.cool_max_flow - self.cool_min_flow) / 100)
+
+        dat_setpoint = np.where(heating, heat_dat, self.ahu_sat)
+        airflow_setpoint = np.where(heating, heat_airflow, cool_airflow)
+
+        # Ensure the airflow and DAT setpoints are within bounds
+        airflow_setpoint = np.maximum(np.minimum(airflow_setpoint, self.heat_max_flow), self.heat_min_flow)
+        dat_setpoint = np.maximum(np.minimum(dat_setpoint, self.max_dat), self.ahu_sat)
+
+        # Satisfied zones skip the bounds check just like the scalar class
+        airflow_setpoint = np.where(active, airflow_setpoint, self.satisfied_airflow_setpoint)
+        dat_setpoint = np.where(active, dat_setpoint, self.ahu_sat)
+
+        return mode, dat_setpoint, airflow_setpoint, heating_demand, cooling_demand
+
+
+def check_against_scalar(n_zones=500, steps=50, seed=1):
+    '''
+    Run the same random zone temps through a fleet and a list of
+    VavBoxController objects and make sure every output and every
+    PID state var is identical.
+    '''
+    rng = random.Random(seed)
+    controllers = [
+        VavBoxController(
+            space_temp_setpoint=rng.choice([70, 71, 72, 73, 74]),
+            deadband=rng.choice([2, 4, 5]),
+            Kp_heating=rng.uniform(1, 8),
+            Ki_heating=rng.uniform(0.1, 2),
+            Kd_heating=rng.choice([0, 0.5]),
+            Kp_cooling=rng.uniform(1, 8),
+            Ki_cooling=rng.uniform(0.1, 2),
+            Kd_cooling=rng.choice([0, 0.5]),
+        )
+        for _ in range(n_zones)
+    ]
+    fleet = VavFleetController.from_controllers(controllers)
+
+    for _ in range(steps):
+        temps = [rng.uniform(62, 82) for _ in range(n_zones)]
+        mode, dat, airflow, heating_demand, cooling_demand = fleet.control_logic(temps)
+        for i, vav in enumerate(controllers):
+            expected = vav.control_logic(space_temp=temps[i])
+            got = (MODE_NAMES[mode[i]], dat[i], airflow[i], heating_demand[i], cooling_demand[i])
+            assert expected == got, f"zone {i}: scalar {expected} != fleet {got}"
+
+    for name in FLEET_PARAMS:
+        expected = np.array([getattr(vav, name) for vav in controllers], dtype=np.float64)
+        assert np.array_equal(expected, getattr(fleet, name)), f"{name} drifted"
+
+    print(f"Fleet matches VavBoxController exactly for {n_zones} zones x {steps} steps")
+
+
+def benchmark(n_zones=5000, steps=20, seed=2):
+    '''Zones per second for the numpy fleet vs looping the scalar class.'''
+    rng = np.random.default_rng(seed)
+    temps = rng.uniform(62, 82, size=(steps, n_zones))
+
+    controllers = [VavBoxController() for _ in range(n_zones)]
+    start = time.perf_counter()
+    for step in range(steps):
+        row = temps[step].tolist()
+        for i, vav in enumerate(controllers):
+            vav.control_logic(space_temp=row[i])
+    scalar_secs = time.perf_counter() - start
+
+    fleet = VavFleetController(n_zones)
+    start = time.perf_counter()
+    for step in range(steps):
+        fleet.control_logic(temps[step])
+    fleet_secs = time.perf_counter() - start
+
+    scalar_rate = n_zones * steps / scalar_secs
+    fleet_rate = n_zones * steps / fleet_secs
+    print(f"\nBenchmark: {n_zones} zones x {steps} scans")
+    print(f"VavBoxController loop: {scalar_rate:,.0f} zones/sec")
+    print(f"VavFleetController:    {fleet_rate:,.0f} zones/sec")
+    print(f"Speedup: {fleet_rate / scalar_rate:.1f}x")
+    return scalar_rate, fleet_rate
+
+
+if __name__ == "__main__":
+    check_against_scalar()
+    for n_zones in (100, 1000, 10000):
+        benchmark(n_zones=n_zones)
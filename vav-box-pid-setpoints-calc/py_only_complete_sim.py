@@ -1,8 +1,10 @@
-
 class VavBoxController:
     '''
+    Sensor reliability is handled in front of the controller: gate the
+    zone temps through wasm_host/sensor_faults.py SensorFaults (see
+    sensor_fault_sim.py) before control_logic.
+
     TODO add in -
-    state machines for sensor reliability
     air flow PID control for damper
     integral windup prevention
     occupancy state for unoc setpoints
@@ -132,8 +134,46 @@ class VavBoxController:
         return mode, dat_setpoint, airflow_setpoint, heating_demand, cooling_demand
 
 
-def simulate():
+# columns simulate() records every step, mode as the complete_sim.wat code
+TREND_POINTS = (
+    "zone_temp", "space_temp_setpoint", "mode", "dat_setpoint", "airflow_setpoint",
+    "heating_demand", "heating_error", "heating_integral",
+    "cooling_demand", "cooling_error", "cooling_integral",
+)
+
+
+def _plain(value):
+    '''Recorded float as the old prints showed it, 72 rather than 72.0.'''
+    return int(value) if float(value).is_integer() else float(value)
+
+
+def format_step(row):
+    '''The old per step printout, for the debug ConsoleSink.'''
+    from py_fleet_sim import MODE_NAMES
+    return (
+        f"************* STEP: {int(row['t'])} *************\n"
+        f"Zone Temp = {row['zone_temp']:.2f}F, Zone Setpoint = {_plain(row['space_temp_setpoint'])}F\n"
+        f"Mode = {MODE_NAMES[int(row['mode'])]}, DAT Setpoint = {row['dat_setpoint']:.2f}F, Airflow Setpoint = {_plain(row['airflow_setpoint'])}\n"
+        f"Heating PID = {row['heating_demand']:.2f}%, error = {row['heating_error']:.2f}, integral = {row['heating_integral']:.2f}\n"
+        f"Cooling PID = {row['cooling_demand']:.2f}%, error = {row['cooling_error']:.2f}, integral = {row['cooling_integral']:.2f}"
+    )
+
+
+def simulate(recorder=None, debug=False):
+    '''
+    Steps a VavBoxController through heating, satisfied and cooling and
+    records every step into a TrendRecorder (TREND_POINTS columns).
+    debug=True adds a ConsoleSink with the old per step printout.
+    '''
+    # only the sim needs wasm_host, importing VavBoxController leaves sys.path alone
+    import repo_path  # puts the repo root on sys.path for wasm_host
+    from wasm_host.trend_recorder import ConsoleSink, TrendRecorder
+    from py_fleet_sim import MODE_CODES
+
     vav = VavBoxController()
+    recorder = recorder or TrendRecorder(TREND_POINTS, capacity=1024)
+    if debug:
+        recorder.add_sink(ConsoleSink(format_step))
 
     # Constant temperature to test cooling and PID integral effect.
     satisfied_temp = 73  # within dead band
@@ -141,35 +181,35 @@ def simulate():
     constant_heating_temp = 68
     steps = 30 
 
-    print("\nTesting Heating Demand with Constant Temperature outside Deadband")
-    for step in range(10):
-        current_temp = constant_heating_temp
-        mode, dat_setpoint, airflow_setpoint, heating_demand, cooling_demand = vav.control_logic(space_temp=current_temp)
-        print(f"************* STEP: {step+1} *************")
-        print(f"Zone Temp = {current_temp:.2f}F, Zone Setpoint = {vav.space_temp_setpoint}F")
-        print(f"Mode = {mode}, DAT Setpoint = {dat_setpoint:.2f}F, Airflow Setpoint = {airflow_setpoint}")
-        print(f"Heating PID = {heating_demand:.2f}%, error = {vav.prev_error_heating:.2f}, integral = {vav.integral_heating:.2f}")
-        print(f"Cooling PID = {cooling_demand:.2f}%, error = {vav.prev_error_cooling:.2f}, integral = {vav.integral_cooling:.2f}")
-
-    print("\nTesting Satisfied Mode within Deadband")
-    for step in range(5):
-        current_temp = satisfied_temp
-        mode, dat_setpoint, airflow_setpoint, heating_demand, cooling_demand = vav.control_logic(space_temp=current_temp)
-        print(f"************* STEP: {step+1} *************")
-        print(f"Zone Temp = {current_temp:.2f}F, Zone Setpoint = {vav.space_temp_setpoint}F")
-        print(f"Mode = {mode}, DAT Setpoint = {dat_setpoint:.2f}F, Airflow Setpoint = {airflow_setpoint}")
-        print(f"Heating PID = {heating_demand:.2f}%, error = {vav.prev_error_heating:.2f}, integral = {vav.integral_heating:.2f}")
-        print(f"Cooling PID = {cooling_demand:.2f}%, error = {vav.prev_error_cooling:.2f}, integral = {vav.integral_cooling:.2f}")
-
-    print("\nTesting Cooling Demand with Constant Temperature outside Deadband")
-    for step in range(5, steps):
-        current_temp = constant_cooling_temp
-        mode, dat_setpoint, airflow_setpoint, heating_demand, cooling_demand = vav.control_logic(space_temp=current_temp)
-        print(f"************* STEP: {step+1} *************")
-        print(f"Zone Temp = {current_temp:.2f}F, Zone Setpoint = {vav.space_temp_setpoint}F")
-        print(f"Mode = {mode}, DAT Setpoint = {dat_setpoint:.2f}F, Airflow Setpoint = {airflow_setpoint}")
-        print(f"Heating PID = {heating_demand:.2f}%, error = {vav.prev_error_heating:.2f}, integral = {vav.integral_heating:.2f}")
-        print(f"Cooling PID = {cooling_demand:.2f}%, error = {vav.prev_error_cooling:.2f}, integral = {vav.integral_cooling:.2f}")
-
-simulate()
-
+    phases = (
+        ("Testing Heating Demand with Constant Temperature outside Deadband", constant_heating_temp, range(10)),
+        ("Testing Satisfied Mode within Deadband", satisfied_temp, range(5)),
+        ("Testing Cooling Demand with Constant Temperature outside Deadband", constant_cooling_temp, range(5, steps)),
+    )
+    for title, current_temp, step_range in phases:
+        if debug:
+            print(f"\n{title}")
+        for step in step_range:
+            mode, dat_setpoint, airflow_setpoint, heating_demand, cooling_demand = vav.control_logic(space_temp=current_temp)
+            recorder.record(
+                step + 1, current_temp, vav.space_temp_setpoint, MODE_CODES[mode], dat_setpoint, airflow_setpoint,
+                heating_demand, vav.prev_error_heating, vav.integral_heating,
+                cooling_demand, vav.prev_error_cooling, vav.integral_cooling,
+            )
+            if debug:
+                recorder.flush()
+    return recorder
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="VavBoxController heating / satisfied / cooling sim")
+    parser.add_argument("--debug", action="store_true", help="print every step like the old sim")
+    args = parser.parse_args()
+
+    recorder = simulate(debug=args.debug)
+    last = recorder.last(5)
+    print(f"Py Info - {recorder.count} steps recorded, last {len(last['t'])}:")
+    for row in zip(*last.values()):
+        print("  " + ", ".join(f"{name}={value:g}" for name, value in zip(last, row)))
@@ -5,10 +5,13 @@ $ wasm-pack build --target no-modules --release
 
 import wasmtime
 
+import repo_path  # puts the repo root on sys.path for wasm_host
+from wasm_host.module_cache import load_module
+
 # Setup the WASM environment
 engine = wasmtime.Engine()
 store = wasmtime.Store(engine)
-module = wasmtime.Module.from_file(engine, './pkg/rs_vav_box_firmware_bg.wasm')
+module = load_module(engine, './pkg/rs_vav_box_firmware_bg.wasm')
 
 # Instantiate the module
 linker = wasmtime.Linker(engine)
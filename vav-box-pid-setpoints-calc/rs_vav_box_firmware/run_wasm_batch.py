@@ -0,0 +1,169 @@
+'''
+Batched version of run_wasm.py. Instead of ~12 calls across the
+Python -> WASM boundary per box per scan, N boxes' ZoneState records
+go into the firmware's ZONES array with one memory.write, one
+calculate_control_logic_batch(n) call runs the scan and one
+memory.read brings every zone's outputs back.
+
+$ wasm-pack build --target no-modules --release
+$ python run_wasm_batch.py
+'''
+
+import os
+import time
+
+import numpy as np
+import wasmtime
+
+import repo_path  # puts the repo root on sys.path for wasm_host
+from wasm_host.module_cache import load_module
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIRMWARE_WASM = os.path.join(HERE, "pkg", "rs_vav_box_firmware_bg.wasm")
+
+# must match the field order of ZoneState in src/lib.rs, all f64
+ZONE_STATE_FIELDS = (
+    # inputs
+    "zone_air_temp",
+    "zone_air_temp_setpoint",
+    "ahu_supply_air_temp",
+    "clg_flow_min_air_flow_setpoint",
+    "clg_flow_max_air_flow_setpoint",
+    "htg_flow_min_air_flow_setpoint",
+    "htg_flow_max_air_flow_setpoint",
+    "satisfied_flow_min_air_flow_setpoint",
+    "max_discharge_air_temp",
+    "zone_air_temp_deadband",
+    "kp_heating",
+    "ki_heating",
+    "kp_cooling",
+    "ki_cooling",
+    # PID state carried between scans
+    "integral_heating",
+    "integral_cooling",
+    # outputs
+    "mode",
+    "pid_output_heating",
+    "pid_output_cooling",
+    "discharge_air_temp_setpoint",
+    "discharge_air_flow_setpoint",
+)
+ZONE_STATE_DTYPE = np.dtype([(name, "<f8") for name in ZONE_STATE_FIELDS])
+
+
+class VavFirmwareBatch:
+    '''
+    One firmware instance running many VAV boxes. The host owns the
+    zone table (a numpy structured array of ZONE_STATE_DTYPE) and it
+    round trips through linear memory once per scan.
+    '''
+    def __init__(self, module_path=FIRMWARE_WASM, engine=None):
+        engine = engine or wasmtime.Engine()
+        self.store = wasmtime.Store(engine)
+        module = load_module(engine, module_path)
+        self.instance = wasmtime.Linker(engine).instantiate(self.store, module)
+
+        exports = self.instance.exports(self.store)
+        self.memory = exports["memory"]
+        self._batch = exports["calculate_control_logic_batch"]
+        self._init_zone_states = exports["init_zone_states"]
+
+        fields = exports["zone_state_fields"](self.store)
+        if fields != len(ZONE_STATE_FIELDS):
+            raise RuntimeError(f"Firmware ZoneState has {fields} fields, host expects {len(ZONE_STATE_FIELDS)}")
+        self.ptr = exports["zone_state_ptr"](self.store)
+        self.max_zones = exports["max_zones"](self.store)
+
+    def default_zones(self, n):
+        '''Zone table with the firmware's own defaults for n boxes.'''
+        self._check(n)
+        self._init_zone_states(self.store, n)
+        return self.read(n)
+
+    def write(self, zones):
+        self._check(len(zones))
+        self.memory.write(self.store, bytearray(np.ascontiguousarray(zones, dtype=ZONE_STATE_DTYPE)), self.ptr)
+
+    def read(self, n):
+        raw = self.memory.read(self.store, self.ptr, self.ptr + n * ZONE_STATE_DTYPE.itemsize)
+        return np.frombuffer(raw, dtype=ZONE_STATE_DTYPE)
+
+    def step(self, zones):
+        '''
+        Run one scan for every zone in the table and return the updated
+        table (new integrals and outputs filled in).
+        '''
+        self.write(zones)
+        self._batch(self.store, len(zones))
+        return self.read(len(zones))
+
+    def _check(self, n):
+        if n > self.max_zones:
+            raise ValueError(f"{n} zones is more than the firmware's MAX_ZONES ({self.max_zones})")
+
+
+def per_call_scan(instance, store, zone_temps):
+    '''The run_wasm.py way: a dozen boundary crossings per box.'''
+    exports = instance.exports(store)
+    set_zone_air_temp = exports["set_zone_air_temp"]
+    setters = [
+        (exports["set_zone_air_temp_setpoint"], 72.0),
+        (exports["set_ahu_supply_air_temp"], 60.0),
+        (exports["set_clg_flow_min_air_flow_setpoint"], 500.0),
+        (exports["set_clg_flow_max_air_flow_setpoint"], 1000.0),
+        (exports["set_htg_flow_min_air_flow_setpoint"], 400.0),
+        (exports["set_htg_flow_max_air_flow_setpoint"], 800.0),
+        (exports["set_satisfied_flow_min_air_flow_setpoint"], 450.0),
+        (exports["set_max_discharge_air_temp"], 110.0),
+        (exports["set_zone_air_temp_deadband"], 5.0),
+    ]
+    calculate_control_logic = exports["calculate_control_logic"]
+    get_pid_output_heating = exports["get_pid_output_heating"]
+    get_pid_output_cooling = exports["get_pid_output_cooling"]
+
+    outputs = []
+    for temp in zone_temps:
+        set_zone_air_temp(store, temp)
+        for setter, value in setters:
+            setter(store, value)
+        calculate_control_logic(store)
+        outputs.append((get_pid_output_heating(store), get_pid_output_cooling(store)))
+    return outputs
+
+
+def benchmark(n_zones=2000, steps=20, seed=3):
+    rng = np.random.default_rng(seed)
+    temps = rng.uniform(62, 82, size=(steps, n_zones))
+
+    firmware = VavFirmwareBatch()
+    zones = firmware.default_zones(n_zones)
+    start = time.perf_counter()
+    for step in range(steps):
+        zones["zone_air_temp"] = temps[step]
+        zones = firmware.step(zones)
+    batch_secs = time.perf_counter() - start
+
+    single = VavFirmwareBatch()
+    start = time.perf_counter()
+    for step in range(steps):
+        per_call_scan(single.instance, single.store, temps[step].tolist())
+    per_call_secs = time.perf_counter() - start
+
+    print(f"{n_zones} zones x {steps} scans")
+    print(f"per call API: {n_zones * steps / per_call_secs:,.0f} zones/sec")
+    print(f"batch API:    {n_zones * steps / batch_secs:,.0f} zones/sec")
+    print(f"Speedup: {per_call_secs / batch_secs:.1f}x")
+
+
+if __name__ == "__main__":
+    firmware = VavFirmwareBatch()
+    zones = firmware.default_zones(3)
+    zones["zone_air_temp"] = [68.0, 73.0, 76.0]
+    for _ in range(5):
+        zones = firmware.step(zones)
+    for i, zone in enumerate(zones):
+        print(f"zone {i}: mode = {int(zone['mode'])}, heating output = {zone['pid_output_heating']:.2f}, "
+              f"cooling output = {zone['pid_output_cooling']:.2f}, "
+              f"DAT setpoint = {zone['discharge_air_temp_setpoint']:.2f}, "
+              f"airflow setpoint = {zone['discharge_air_flow_setpoint']:.2f}")
+    benchmark()
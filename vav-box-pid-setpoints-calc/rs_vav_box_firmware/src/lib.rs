@@ -108,64 +108,233 @@ pub fn get_pid_output_cooling() -> f64 {
 }
 
 
+// Per zone state for the batch API. One instance of the firmware can run
+// up to MAX_ZONES boxes: the host writes the whole ZONES array in one
+// memory write, calls calculate_control_logic_batch(n) once and reads
+// the outputs back in one read. Every field is f64 (mode included) so the
+// layout is just ZONE_STATE_FIELDS doubles per zone with no padding.
+pub const MAX_ZONES: usize = 4096;
+pub const ZONE_STATE_FIELDS: usize = 21;
+
+#[repr(C)]
+#[derive(Clone, Copy)]
+pub struct ZoneState {
+    // inputs
+    pub zone_air_temp: f64,
+    pub zone_air_temp_setpoint: f64,
+    pub ahu_supply_air_temp: f64,
+    pub clg_flow_min_air_flow_setpoint: f64,
+    pub clg_flow_max_air_flow_setpoint: f64,
+    pub htg_flow_min_air_flow_setpoint: f64,
+    pub htg_flow_max_air_flow_setpoint: f64,
+    pub satisfied_flow_min_air_flow_setpoint: f64,
+    pub max_discharge_air_temp: f64,
+    pub zone_air_temp_deadband: f64,
+    pub kp_heating: f64,
+    pub ki_heating: f64,
+    pub kp_cooling: f64,
+    pub ki_cooling: f64,
+    // PID state carried between scans
+    pub integral_heating: f64,
+    pub integral_cooling: f64,
+    // outputs
+    pub mode: f64,
+    pub pid_output_heating: f64,
+    pub pid_output_cooling: f64,
+    pub discharge_air_temp_setpoint: f64,
+    pub discharge_air_flow_setpoint: f64,
+}
+
+const ZONE_STATE_DEFAULT: ZoneState = ZoneState {
+    zone_air_temp: 70.0,
+    zone_air_temp_setpoint: 72.0,
+    ahu_supply_air_temp: 60.0,
+    clg_flow_min_air_flow_setpoint: 500.0,
+    clg_flow_max_air_flow_setpoint: 1000.0,
+    htg_flow_min_air_flow_setpoint: 400.0,
+    htg_flow_max_air_flow_setpoint: 800.0,
+    satisfied_flow_min_air_flow_setpoint: 450.0,
+    max_discharge_air_temp: 110.0,
+    zone_air_temp_deadband: 5.0,
+    kp_heating: 5.0,
+    ki_heating: 1.0,
+    kp_cooling: 5.0,
+    ki_cooling: 1.0,
+    integral_heating: 0.0,
+    integral_cooling: 0.0,
+    mode: 0.0,
+    pid_output_heating: 0.0,
+    pid_output_cooling: 0.0,
+    discharge_air_temp_setpoint: 0.0,
+    discharge_air_flow_setpoint: 0.0,
+};
+
+// Zeroed so it lands in .bss instead of a 688 KB data segment, the host
+// calls init_zone_states(n) (or writes full records) before the first scan.
+const ZONE_STATE_ZERO: ZoneState = ZoneState {
+    zone_air_temp: 0.0,
+    zone_air_temp_setpoint: 0.0,
+    ahu_supply_air_temp: 0.0,
+    clg_flow_min_air_flow_setpoint: 0.0,
+    clg_flow_max_air_flow_setpoint: 0.0,
+    htg_flow_min_air_flow_setpoint: 0.0,
+    htg_flow_max_air_flow_setpoint: 0.0,
+    satisfied_flow_min_air_flow_setpoint: 0.0,
+    max_discharge_air_temp: 0.0,
+    zone_air_temp_deadband: 0.0,
+    kp_heating: 0.0,
+    ki_heating: 0.0,
+    kp_cooling: 0.0,
+    ki_cooling: 0.0,
+    integral_heating: 0.0,
+    integral_cooling: 0.0,
+    mode: 0.0,
+    pid_output_heating: 0.0,
+    pid_output_cooling: 0.0,
+    discharge_air_temp_setpoint: 0.0,
+    discharge_air_flow_setpoint: 0.0,
+};
+
+static mut ZONES: [ZoneState; MAX_ZONES] = [ZONE_STATE_ZERO; MAX_ZONES];
+
+// The single box statics packed into a ZoneState so both APIs share one
+// implementation of the control logic.
+unsafe fn load_single_zone() -> ZoneState {
+    ZoneState {
+        zone_air_temp: ZONE_AIR_TEMP,
+        zone_air_temp_setpoint: ZONE_AIR_TEMP_SETPOINT,
+        ahu_supply_air_temp: AHU_SUPPLY_AIR_TEMP,
+        clg_flow_min_air_flow_setpoint: CLG_FLOW_MIN_AIR_FLOW_SETPOINT,
+        clg_flow_max_air_flow_setpoint: CLG_FLOW_MAX_AIR_FLOW_SETPOINT,
+        htg_flow_min_air_flow_setpoint: HTG_FLOW_MIN_AIR_FLOW_SETPOINT,
+        htg_flow_max_air_flow_setpoint: HTG_FLOW_MAX_AIR_FLOW_SETPOINT,
+        satisfied_flow_min_air_flow_setpoint: SATISFIED_FLOW_MIN_AIR_FLOW_SETPOINT,
+        max_discharge_air_temp: MAX_DISCHARGE_AIR_TEMP,
+        zone_air_temp_deadband: ZONE_AIR_TEMP_DEADBAND,
+        kp_heating: KP_HEATING,
+        ki_heating: KI_HEATING,
+        kp_cooling: KP_COOLING,
+        ki_cooling: KI_COOLING,
+        integral_heating: INTEGRAL_HEATING,
+        integral_cooling: INTEGRAL_COOLING,
+        mode: MODE as f64,
+        pid_output_heating: PID_OUTPUT_HEATING,
+        pid_output_cooling: PID_OUTPUT_COOLING,
+        discharge_air_temp_setpoint: DISCHARGE_AIR_TEMP_SETPOINT,
+        discharge_air_flow_setpoint: DISCHARGE_AIR_FLOW_SETPOINT,
+    }
+}
+
+unsafe fn store_single_zone(zone: &ZoneState) {
+    INTEGRAL_HEATING = zone.integral_heating;
+    INTEGRAL_COOLING = zone.integral_cooling;
+    MODE = zone.mode as i32;
+    PID_OUTPUT_HEATING = zone.pid_output_heating;
+    PID_OUTPUT_COOLING = zone.pid_output_cooling;
+    DISCHARGE_AIR_TEMP_SETPOINT = zone.discharge_air_temp_setpoint;
+    DISCHARGE_AIR_FLOW_SETPOINT = zone.discharge_air_flow_setpoint;
+}
+
 #[wasm_bindgen]
 pub fn calculate_pid() {
     unsafe {
-        let error = ZONE_AIR_TEMP_SETPOINT - ZONE_AIR_TEMP;
-        MODE = if error.abs() > ZONE_AIR_TEMP_DEADBAND / 2.0 {
-            if error > 0.0 { 1 } else { 2 }
-        } else {
-            0
-        };
-
-        let (kp, ki, integral, pid_output) = match MODE {
-            1 => (
-                &mut KP_HEATING,
-                &mut KI_HEATING,
-                &mut INTEGRAL_HEATING,
-                &mut PID_OUTPUT_HEATING,
-            ),
-            2 => (
-                &mut KP_COOLING,
-                &mut KI_COOLING,
-                &mut INTEGRAL_COOLING,
-                &mut PID_OUTPUT_COOLING,
-            ),
-            _ => return,
-        };
-
-        *integral += error; // Update integral
-        let output = (*kp) * error + (*ki) * (*integral);
-
-        // Limit output and reset integral if necessary
-        let limited_output = output.min(100.0);
-        if output != limited_output {
-            // Prevent integral wind-up
-            *integral -= error; 
-        }
+        let mut zone = load_single_zone();
+        zone_calculate_pid(&mut zone);
+        store_single_zone(&zone);
+    }
+}
 
-        match MODE {
-            1 => {
-                *pid_output = limited_output;
-                PID_OUTPUT_COOLING = 0.0;
-            }
-            2 => {
-                *pid_output = limited_output;
-                PID_OUTPUT_HEATING = 0.0;
-            }
-            _ => {
-                PID_OUTPUT_HEATING = 0.0;
-                PID_OUTPUT_COOLING = 0.0;
-            }
+#[wasm_bindgen]
+pub fn calculate_control_logic() {
+    unsafe {
+        let mut zone = load_single_zone();
+        zone_control_logic(&mut zone);
+        store_single_zone(&zone);
+    }
+}
+
+// unsafe is only needed on older compilers
+#[allow(unused_unsafe)]
+#[wasm_bindgen]
+pub fn zone_state_ptr() -> usize {
+    unsafe { core::ptr::addr_of_mut!(ZONES) as usize }
+}
+
+// Fill the first n zones with the same defaults as the single box statics.
+#[wasm_bindgen]
+pub fn init_zone_states(n: usize) -> usize {
+    let n = n.min(MAX_ZONES);
+    unsafe {
+        let zones = &mut *core::ptr::addr_of_mut!(ZONES);
+        for zone in zones[..n].iter_mut() {
+            *zone = ZONE_STATE_DEFAULT;
         }
     }
+    n
 }
 
 #[wasm_bindgen]
-pub fn calculate_control_logic() {
-    calculate_pid();
-    calculate_discharge_air_temp_setpoint();
-    calculate_discharge_air_flow_setpoint();
+pub fn max_zones() -> usize {
+    MAX_ZONES
+}
+
+#[wasm_bindgen]
+pub fn zone_state_fields() -> usize {
+    ZONE_STATE_FIELDS
+}
+
+// Run one scan for the first n zones of ZONES. Returns how many zones ran
+// (n capped at MAX_ZONES).
+#[wasm_bindgen]
+pub fn calculate_control_logic_batch(n: usize) -> usize {
+    let n = n.min(MAX_ZONES);
+    unsafe {
+        let zones = &mut *core::ptr::addr_of_mut!(ZONES);
+        for zone in zones[..n].iter_mut() {
+            zone_control_logic(zone);
+        }
+    }
+    n
+}
+
+fn zone_control_logic(zone: &mut ZoneState) {
+    zone_calculate_pid(zone);
+    zone_calculate_discharge_air_temp_setpoint(zone);
+    zone_calculate_discharge_air_flow_setpoint(zone);
+}
+
+fn zone_calculate_pid(zone: &mut ZoneState) {
+    let error = zone.zone_air_temp_setpoint - zone.zone_air_temp;
+    let mode = if error.abs() > zone.zone_air_temp_deadband / 2.0 {
+        if error > 0.0 { 1 } else { 2 }
+    } else {
+        0
+    };
+    zone.mode = mode as f64;
+
+    let (kp, ki, integral) = match mode {
+        1 => (zone.kp_heating, zone.ki_heating, &mut zone.integral_heating),
+        2 => (zone.kp_cooling, zone.ki_cooling, &mut zone.integral_cooling),
+        _ => return,
+    };
+
+    *integral += error; // Update integral
+    let output = kp * error + ki * (*integral);
+
+    // Limit output and reset integral if necessary
+    let limited_output = output.min(100.0);
+    if output != limited_output {
+        // Prevent integral wind-up
+        *integral -= error;
+    }
+
+    if mode == 1 {
+        zone.pid_output_heating = limited_output;
+        zone.pid_output_cooling = 0.0;
+    } else {
+        zone.pid_output_cooling = limited_output;
+        zone.pid_output_heating = 0.0;
+    }
 }
 
 fn interpolate_output(pid_output: f64, max_val: f64, min_val: f64) -> f64 {
@@ -174,56 +343,68 @@ fn interpolate_output(pid_output: f64, max_val: f64, min_val: f64) -> f64 {
     min_val + scaled_output * range_difference 
 }
 
+fn zone_calculate_discharge_air_temp_setpoint(zone: &mut ZoneState) {
+    match zone.mode as i32 {
+        1 => { // Heating mode
+            if zone.pid_output_heating <= 50.0 {
+                zone.discharge_air_temp_setpoint = interpolate_output(
+                    zone.pid_output_heating,
+                    zone.max_discharge_air_temp,
+                    zone.ahu_supply_air_temp,
+                );
+            } else {
+                // When PID output is above 50
+                // set to max discharge air temperature
+                zone.discharge_air_temp_setpoint = zone.max_discharge_air_temp;
+            }
+        },
+        2 => { // Cooling mode or other modes
+            zone.discharge_air_temp_setpoint = zone.ahu_supply_air_temp;
+        },
+        _ => { // Satisfied mode or unknown mode
+            zone.discharge_air_temp_setpoint = zone.ahu_supply_air_temp;
+        },
+    }
+}
+
+fn zone_calculate_discharge_air_flow_setpoint(zone: &mut ZoneState) {
+    match zone.mode as i32 {
+        1 => { // Heating mode
+            zone.discharge_air_flow_setpoint = if zone.pid_output_heating > 50.0 {
+                interpolate_output(
+                    zone.pid_output_heating,
+                    zone.htg_flow_max_air_flow_setpoint,
+                    zone.htg_flow_min_air_flow_setpoint,
+                )
+            } else {
+                zone.htg_flow_min_air_flow_setpoint
+            };
+        },
+        2 => { // Cooling mode
+            zone.discharge_air_flow_setpoint = interpolate_output(
+                zone.pid_output_cooling,
+                zone.clg_flow_max_air_flow_setpoint,
+                zone.clg_flow_min_air_flow_setpoint,
+            );
+        },
+        _ => { // Satisfied mode
+            zone.discharge_air_flow_setpoint = zone.satisfied_flow_min_air_flow_setpoint;
+        },
+    }
+}
+
 pub fn calculate_discharge_air_temp_setpoint() {
     unsafe {
-        match MODE {
-            1 => { // Heating mode
-                if PID_OUTPUT_HEATING <= 50.0 {
-                    DISCHARGE_AIR_TEMP_SETPOINT = interpolate_output(
-                        PID_OUTPUT_HEATING,
-                        MAX_DISCHARGE_AIR_TEMP,
-                        AHU_SUPPLY_AIR_TEMP,
-                    );
-                } else {
-                    // When PID output is above 50
-                    // set to max discharge air temperature
-                    DISCHARGE_AIR_TEMP_SETPOINT = MAX_DISCHARGE_AIR_TEMP;
-                }
-            },
-            2 => { // Cooling mode or other modes
-                DISCHARGE_AIR_TEMP_SETPOINT = AHU_SUPPLY_AIR_TEMP;
-            },
-            _ => { // Satisfied mode or unknown mode
-                DISCHARGE_AIR_TEMP_SETPOINT = AHU_SUPPLY_AIR_TEMP;
-            },
-        }
+        let mut zone = load_single_zone();
+        zone_calculate_discharge_air_temp_setpoint(&mut zone);
+        store_single_zone(&zone);
     }
 }
 
 pub fn calculate_discharge_air_flow_setpoint() {
     unsafe {
-        match MODE {
-            1 => { // Heating mode
-                DISCHARGE_AIR_FLOW_SETPOINT = if PID_OUTPUT_HEATING > 50.0 {
-                    interpolate_output(
-                        PID_OUTPUT_HEATING,
-                        HTG_FLOW_MAX_AIR_FLOW_SETPOINT,
-                        HTG_FLOW_MIN_AIR_FLOW_SETPOINT,
-                    )
-                } else {
-                    HTG_FLOW_MIN_AIR_FLOW_SETPOINT
-                };
-            },
-            2 => { // Cooling mode
-                DISCHARGE_AIR_FLOW_SETPOINT = interpolate_output(
-                    PID_OUTPUT_COOLING,
-                    CLG_FLOW_MAX_AIR_FLOW_SETPOINT,
-                    CLG_FLOW_MIN_AIR_FLOW_SETPOINT,
-                );
-            },
-            _ => { // Satisfied mode
-                DISCHARGE_AIR_FLOW_SETPOINT = SATISFIED_FLOW_MIN_AIR_FLOW_SETPOINT;
-            },
-        }
+        let mut zone = load_single_zone();
+        zone_calculate_discharge_air_flow_setpoint(&mut zone);
+        store_single_zone(&zone);
     }
-}
\ No newline at end of file
+}
@@ -0,0 +1,139 @@
+'''
+Sensor fault gating (wasm_host/sensor_faults.py) in front of the VAV
+fleet and the AHU %OA calc.
+
+Two copies of the same closed loop building (VavFleetController +
+ZonePlant) are run on the same injected sensor faults. One copy gets the
+raw readings and the other gets them through SensorFaults.gate():
+
+    zone 0  sensor sticks from step 200
+    zone 1  drops out (NaN) on 20% of scans from step 100
+    zone 2  spikes +80 F on 2% of scans
+    zone 3  goes noisy (3 F std) from step 150
+    AHU     OAT warms up to RAT, so the %OA temperature ratio blows up
+
+It prints how long each fault took to flag, what each copy did with the
+faulty zones (heating/cooling flips, worst integral, how far the real
+zone temp got from setpoint) and the AHU %OA range once OAT is near RAT.
+
+$ python sensor_fault_sim.py
+'''
+
+
+import numpy as np
+
+import repo_path  # puts the repo root on sys.path for wasm_host
+from wasm_host.ahu import load_ahu_main
+from wasm_host.sensor_faults import SensorFaults, describe
+from py_fleet_sim import MODE_COOLING, MODE_HEATING, VavFleetController
+from zone_plant import ZonePlant
+
+# OAT / RAT closer than this and %OA falls back to the damper command
+MIN_OA_RA_DELTA_T = 5.0
+FAULTS = {0: "stuck", 1: "dropout", 2: "spikes", 3: "noisy"}
+FAULT_START = {0: 200, 1: 100, 2: 0, 3: 150}
+
+
+def inject(rng, steps, n_zones):
+    '''Per step sensor error and fault masks, shared by both copies.'''
+    noise = rng.normal(0.0, 0.05, (steps, n_zones))
+    noise[FAULT_START[3]:, 3] = rng.normal(0.0, 3.0, steps - FAULT_START[3])
+    dropout = np.zeros((steps, n_zones), dtype=bool)
+    dropout[FAULT_START[1]:, 1] = rng.random(steps - FAULT_START[1]) < 0.2
+    spikes = np.zeros((steps, n_zones))
+    spikes[:, 2] = np.where(rng.random(steps) < 0.02, 80.0, 0.0)
+    return noise, dropout, spikes
+
+
+def run(gated, steps=600, n_zones=100, seed=24, dt=60.0):
+    ahu = load_ahu_main()
+    rng = np.random.default_rng(seed)
+    noise, dropout, spikes = inject(rng, steps, n_zones)
+    fleet = VavFleetController(n_zones)
+    plant = ZonePlant(n_zones, zone_temp=rng.uniform(69.0, 75.0, n_zones))
+    zone_faults = SensorFaults([f"zone_air_temp[{i}]" for i in range(n_zones)], low=40.0, high=100.0,
+                               window=30, stuck_band=0.01, noise_std=1.0)
+    ahu_names = ["mixed_air_temp", "return_air_temp", "outside_air_temp"]
+    ahu_faults = SensorFaults(ahu_names, low=-30.0, high=130.0, window=10,
+                              pairs=[("outside_air_temp", "return_air_temp", MIN_OA_RA_DELTA_T)])
+
+    flips = np.zeros(n_zones, dtype=np.int64)
+    worst_integral = np.zeros(n_zones)
+    worst_error = np.zeros(n_zones)
+    first_flag = {}
+    prev_mode = np.zeros(n_zones, dtype=np.int8)
+    percent_oa = []
+    stuck_value = None
+    for step in range(steps):
+        readings = plant.zone_temp + noise[step] + spikes[step]
+        readings[dropout[step]] = np.nan
+        if step >= FAULT_START[0]:
+            stuck_value = readings[0] if stuck_value is None else stuck_value
+            readings[0] = stuck_value
+
+        if gated:
+            temps, flags = zone_faults.gate(readings)
+            for zone in FAULTS:
+                if flags[zone] and zone not in first_flag and step >= FAULT_START[zone]:
+                    first_flag[zone] = (step, flags[zone])
+            # nothing good seen yet, leave the zone on its setpoint
+            temps = np.where(np.isnan(temps), fleet.space_temp_setpoint, temps)
+        else:
+            temps = readings
+        mode, dat, airflow, _, _ = fleet.control_logic(temps)
+        plant.step(dat, airflow, dt, 40.0)
+
+        active = (mode == MODE_HEATING) | (mode == MODE_COOLING)
+        flips += active & (prev_mode != 0) & (mode != prev_mode)
+        prev_mode = np.where(active, mode, prev_mode)
+        np.maximum(worst_integral, np.abs(fleet.integral_heating) + np.abs(fleet.integral_cooling), out=worst_integral)
+        np.maximum(worst_error, np.abs(plant.zone_temp - fleet.space_temp_setpoint), out=worst_error)
+
+        # AHU: OAT warms from 40 F to about RAT over the run, MAT is a 30% OA mix
+        oat = 40.0 + 31.5 * step / steps
+        rat = 72.0 + rng.normal(0.0, 0.1)
+        mat = rat + 0.3 * (oat - rat) + rng.normal(0.0, 0.1)
+        if gated:
+            (mat, rat, oat), _ = ahu_faults.gate([mat, rat, oat])
+            percent_oa.append(ahu.calculate_ahu_percent_oa(mat, rat, oat, 20.0, min_delta_t=MIN_OA_RA_DELTA_T))
+        else:
+            percent_oa.append(ahu.calculate_ahu_percent_oa(mat, rat, oat, 20.0))
+
+    return {
+        "flips": flips, "worst_integral": worst_integral, "worst_error": worst_error,
+        "first_flag": first_flag, "percent_oa": np.array(percent_oa),
+        "report": zone_faults.report() if gated else {}, "ahu_report": ahu_faults.report() if gated else {},
+    }
+
+
+def main(steps=600):
+    raw = run(False, steps)
+    gated = run(True, steps)
+
+    print("Py Info - fault detection delay (scans after the fault starts):")
+    for zone, fault in FAULTS.items():
+        if zone in gated["first_flag"]:
+            step, flags = gated["first_flag"][zone]
+            print(f"  zone {zone} {fault:<8} flagged after {step - FAULT_START[zone]:>3} scans as {describe(flags)}")
+        else:
+            print(f"  zone {zone} {fault:<8} never flagged")
+
+    print(f"\n{'zone':<16} {'mode flips raw / gated':>24} {'worst |integral|':>22} {'worst |T - sp|':>18}")
+    for zone, fault in FAULTS.items():
+        print(f"{zone} {fault:<14} {raw['flips'][zone]:>11} / {gated['flips'][zone]:<10} "
+              f"{raw['worst_integral'][zone]:>10.1f} / {gated['worst_integral'][zone]:<9.1f} "
+              f"{raw['worst_error'][zone]:>7.2f} / {gated['worst_error'][zone]:.2f}")
+    healthy = slice(len(FAULTS), None)
+    print(f"{'healthy zones':<16} {raw['flips'][healthy].sum():>11} / {gated['flips'][healthy].sum():<10} "
+          f"{raw['worst_integral'][healthy].max():>10.1f} / {gated['worst_integral'][healthy].max():<9.1f} "
+          f"{raw['worst_error'][healthy].max():>7.2f} / {gated['worst_error'][healthy].max():.2f}")
+
+    tail = slice(int(steps * 0.85), None)
+    print(f"\nAHU %OA once OAT is within a few F of RAT: raw {raw['percent_oa'][tail].min():.2f} to "
+          f"{raw['percent_oa'][tail].max():.2f}, gated {gated['percent_oa'][tail].min():.2f} to "
+          f"{gated['percent_oa'][tail].max():.2f}")
+    print(f"AHU fault counts: {gated['ahu_report']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+'''
+Multi core runner for big what-if studies. Thousands of zone scenarios
+are split into shards, one shard per worker process. Each worker builds
+its controllers once (the complete_sim.wat module comes out of the
+compiled module cache, so workers deserialize instead of recompiling)
+and keeps them for the whole run.
+
+The run is step synchronous: the parent hands every shard the same
+block of steps, waits for all of them and then moves on, so all zones
+are always at the same simulated time. Results come back as one
+float32 numpy block per shard (steps x zones x RESULT_FIELDS), not
+pickled dicts.
+
+Backends:
+    "python" - a VavBoxController per zone (py_only_complete_sim.py)
+    "fleet"  - one VavFleetController per shard (py_fleet_sim.py)
+    "wat"    - a complete_sim.wat instance per zone (wat/wat_instance_pool.py)
+
+$ python sharded_sim.py
+'''
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "wat"))
+
+from py_fleet_sim import MODE_CODES
+
+RESULT_FIELDS = ("mode", "dat_setpoint", "airflow_setpoint", "heating_demand", "cooling_demand")
+BACKENDS = ("python", "fleet", "wat")
+
+
+def scenario_temps(zone_ids, step0, n_steps):
+    '''
+    Zone temp for every zone at every step, a slow sine around a zone
+    specific base temp. Only depends on zone id and step so the results
+    are the same however the zones are sharded.
+    '''
+    zone_ids = np.asarray(zone_ids, dtype=np.float64)
+    base = 64.0 + (zone_ids * 7919 % 16)
+    amplitude = 1.0 + zone_ids % 5
+    period = 30.0 + zone_ids % 50
+    t = np.arange(step0, step0 + n_steps, dtype=np.float64)[:, None]
+    return base + amplitude * np.sin(2 * np.pi * t / period)
+
+
+class Shard:
+    '''The zones one worker process owns, plus their controllers.'''
+    def __init__(self, backend, zone_ids):
+        self.backend = backend
+        self.zone_ids = np.asarray(zone_ids)
+        n = len(self.zone_ids)
+
+        if backend == "python":
+            from py_only_complete_sim import VavBoxController
+            self.controllers = [VavBoxController() for _ in range(n)]
+        elif backend == "fleet":
+            from py_fleet_sim import VavFleetController
+            self.fleet = VavFleetController(n)
+        elif backend == "wat":
+            import wasmtime
+            from wat_instance_pool import COMPLETE_SIM_WAT, WatController
+            from wasm_host.module_cache import load_module
+            engine = wasmtime.Engine()
+            module = load_module(engine, COMPLETE_SIM_WAT)
+            self.controllers = [WatController(engine, module) for _ in range(n)]
+            self.out_globals = [
+                [ctl.outputs[name] for name in (
+                    "mode",
+                    "discharge_air_temp_setpoint",
+                    "discharge_air_flow_setpoint",
+                    "pid_output_heating",
+                    "pid_output_cooling",
+                )]
+                for ctl in self.controllers
+            ]
+        else:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+
+    def run_steps(self, step0, n_steps):
+        temps = scenario_temps(self.zone_ids, step0, n_steps)
+        out = np.empty((n_steps, len(self.zone_ids), len(RESULT_FIELDS)), dtype=np.float32)
+
+        if self.backend == "fleet":
+            for k in range(n_steps):
+                mode, *rest = self.fleet.control_logic(temps[k])
+                out[k, :, 0] = mode
+                for j, values in enumerate(rest, start=1):
+                    out[k, :, j] = values
+            return out
+
+        if self.backend == "python":
+            for k in range(n_steps):
+                row = temps[k].tolist()
+                for i, vav in enumerate(self.controllers):
+                    mode, dat, airflow, heating, cooling = vav.control_logic(space_temp=row[i])
+                    out[k, i] = (MODE_CODES[mode], dat, airflow, heating, cooling)
+            return out
+
+        for k in range(n_steps):
+            row = temps[k].tolist()
+            for i, ctl in enumerate(self.controllers):
+                ctl.inputs["zone_air_temp"].set(row[i])
+                ctl.scan()
+                out[k, i] = [g.get() for g in self.out_globals[i]]
+        return out
+
+
+# one Shard per worker process, built by the pool initializer
+_shard = None
+
+
+def _init_worker(backend, zone_ids):
+    global _shard
+    _shard = Shard(backend, zone_ids)
+
+
+def _run_steps(step0, n_steps):
+    return _shard.run_steps(step0, n_steps)
+
+
+class ShardedRunner:
+    '''
+    Split n_zones across workers processes. Every worker is its own
+    single process executor so a shard always lands on the process
+    that holds its controllers.
+    '''
+    def __init__(self, n_zones, backend="fleet", workers=None, sync_every=1):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+        self.n_zones = n_zones
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 1
+        self.sync_every = sync_every
+
+        if backend == "wat":
+            # compile once here so every worker just deserializes from the cache
+            import wasmtime
+            from wat_instance_pool import COMPLETE_SIM_WAT
+            from wasm_host.module_cache import load_module
+            load_module(wasmtime.Engine(), COMPLETE_SIM_WAT)
+
+        self.shards = [ids for ids in np.array_split(np.arange(n_zones), self.workers) if len(ids)]
+        self.executors = [
+            ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(backend, ids))
+            for ids in self.shards
+        ]
+
+    def run(self, steps):
+        '''
+        Generator of (step0, block) where block is a float32 array of
+        shape (sync_every, n_zones, len(RESULT_FIELDS)) in zone order.
+        '''
+        step0 = 0
+        while step0 < steps:
+            n = min(self.sync_every, steps - step0)
+            futures = [ex.submit(_run_steps, step0, n) for ex in self.executors]
+            # barrier: every shard finishes this block before the next one starts
+            yield step0, np.concatenate([f.result() for f in futures], axis=1)
+            step0 += n
+
+    def close(self):
+        for ex in self.executors:
+            ex.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def scaling_report(n_zones=4000, steps=60, backend="fleet", worker_counts=None, sync_every=10):
+    '''Zone-steps per second for each worker count, startup not included.'''
+    cpus = os.cpu_count() or 1
+    worker_counts = worker_counts or sorted({1, 2, 4, 8, cpus} & set(range(1, cpus + 1)))
+    print(f"\n{backend} backend, {n_zones} zones x {steps} steps ({cpus} CPUs)")
+    base_rate = None
+    for workers in worker_counts:
+        with ShardedRunner(n_zones, backend=backend, workers=workers, sync_every=sync_every) as runner:
+            # first block also waits on worker startup, keep it out of the timing
+            blocks = runner.run(steps + sync_every)
+            next(blocks)
+            start = time.perf_counter()
+            for _ in blocks:
+                pass
+            secs = time.perf_counter() - start
+        rate = n_zones * steps / secs
+        base_rate = base_rate or rate
+        print(f"  {workers:>2} workers: {rate:>12,.0f} zone-steps/sec  "
+              f"speedup {rate / base_rate:4.2f}x  efficiency {rate / base_rate / workers:4.0%}")
+
+
+if __name__ == "__main__":
+    scaling_report(backend="fleet", n_zones=20000)
+    scaling_report(backend="python", n_zones=2000)
+    scaling_report(backend="wat", n_zones=500, steps=20)
@@ -0,0 +1,320 @@
+'''
+Replays BAS trend logs through the controllers. Point histories (zone
+temps and setpoints, mixed/return/outside air temps, OA damper command)
+are streamed in chunks so multi-GB exports never sit in memory. Each
+chunk feeds the VAV control_logic and calculate_ahu_percent_oa from
+ahu-system-air-mgmt/main.py, and the outputs are appended to a CSV
+chunk by chunk.
+
+Trend files are wide, one row per timestamp and one column per point:
+
+    timestamp, mixed_air_temp, return_air_temp, outside_air_temp, oa_damper_cmd,
+    <zone>_zone_temp, <zone>_zone_setpoint, ...
+
+CSV is read with the csv/numpy loaders a chunk of lines at a time.
+Parquet is read Arrow backed with pyarrow's iter_batches (pip install
+pyarrow, only needed for .parquet). Gaps in the trends (empty cells)
+hold the last value like a BAS would.
+
+Backends:
+    "fleet"  - VavFleetController, one vectorized call per timestamp
+    "python" - a VavBoxController per zone, row by row
+
+$ python trend_replay.py --days 365 --zones 20
+$ python trend_replay.py --trend building.csv --out replay_out.csv
+'''
+
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import os
+import time
+
+import numpy as np
+
+import repo_path  # puts the repo root on sys.path for wasm_host
+from wasm_host.ahu import load_ahu_main
+from py_fleet_sim import MODE_CODES, VavFleetController
+from py_only_complete_sim import VavBoxController
+
+AHU_COLUMNS = ("mixed_air_temp", "return_air_temp", "outside_air_temp", "oa_damper_cmd")
+ZONE_TEMP_SUFFIX = "_zone_temp"
+ZONE_SETPOINT_SUFFIX = "_zone_setpoint"
+BACKENDS = ("fleet", "python")
+
+
+def _csv_chunks(path, chunk_rows):
+    with open(path, newline="") as f:
+        header = next(csv.reader([f.readline()]))
+        names = header[1:]
+        while True:
+            lines = list(itertools.islice(f, chunk_rows))
+            if not lines:
+                return
+            timestamps = [line.split(",", 1)[0] for line in lines]
+            try:
+                values = np.loadtxt(lines, delimiter=",", usecols=range(1, len(header)), ndmin=2)
+            except ValueError:
+                # missing cells, the slower parser turns them into nan
+                values = np.genfromtxt(lines, delimiter=",", usecols=range(1, len(header)), ndmin=2)
+            yield timestamps, names, values
+
+
+def _parquet_chunks(path, chunk_rows):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet trends need pyarrow: pip install pyarrow")
+    parquet = pq.ParquetFile(path)
+    for batch in parquet.iter_batches(batch_size=chunk_rows):
+        names = batch.schema.names[1:]
+        timestamps = [str(t) for t in batch.column(0).to_pylist()]
+        values = np.column_stack([
+            batch.column(i).to_numpy(zero_copy_only=False).astype(np.float64)
+            for i in range(1, batch.num_columns)
+        ])
+        yield timestamps, names, values
+
+
+def read_trend_chunks(path, chunk_rows=10000):
+    '''
+    Generator of (timestamps, column names, float64 values array of
+    rows x columns) for each chunk of the trend file.
+    '''
+    if path.endswith(".parquet"):
+        return _parquet_chunks(path, chunk_rows)
+    return _csv_chunks(path, chunk_rows)
+
+
+def hold_last_value(values, last_row):
+    '''Forward fill nan cells down each column, seeded with last_row.'''
+    values = np.vstack([last_row, values])
+    missing = np.isnan(values)
+    if missing.any():
+        idx = np.where(missing, 0, np.arange(len(values))[:, None])
+        np.maximum.accumulate(idx, axis=0, out=idx)
+        values = np.take_along_axis(values, idx, axis=0)
+    return values[1:]
+
+
+def percent_oa_batch(mixed_air_temp, return_air_temp, outside_air_temp, ahu_outside_air_damper_cmd):
+    '''calculate_ahu_percent_oa for whole columns at once, nan where a sensor is missing.'''
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent_oa = np.where(
+            outside_air_temp != return_air_temp,
+            (mixed_air_temp - return_air_temp) / (outside_air_temp - return_air_temp),
+            0.0,
+        )
+    return np.maximum(percent_oa, ahu_outside_air_damper_cmd / 100)
+
+
+class ThroughputCounter:
+    def __init__(self, report_every=5.0):
+        self.report_every = report_every
+        self.rows = 0
+        self.zone_steps = 0
+        self.start = time.perf_counter()
+        self._last_report = self.start
+
+    def add(self, rows, zones):
+        self.rows += rows
+        self.zone_steps += rows * zones
+        now = time.perf_counter()
+        if self.report_every and now - self._last_report >= self.report_every:
+            self._last_report = now
+            print(f"Py Info - {self.rows:,} rows replayed, {self.rate():,.0f} rows/sec")
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def rate(self):
+        return self.rows / max(self.elapsed(), 1e-9)
+
+
+class TrendReplay:
+    '''
+    Replay one trend file through one set of VAV controllers (a zone per
+    <zone>_zone_temp column) and the AHU %OA calc.
+    '''
+    def __init__(self, path, backend="fleet", chunk_rows=10000, ahu_rows=False):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+        self.path = path
+        self.backend = backend
+        self.chunk_rows = chunk_rows
+        # True runs the original calculate_ahu_percent_oa row by row (with
+        # its prints swallowed) instead of percent_oa_batch
+        self.ahu_rows = ahu_rows
+        self.ahu = load_ahu_main()
+        self.zones = None
+        self.counter = None
+
+    def _setup(self, names):
+        index = {name: i for i, name in enumerate(names)}
+        missing = [c for c in AHU_COLUMNS if c not in index]
+        if missing:
+            raise ValueError(f"trend file is missing AHU columns {missing}")
+        self.ahu_idx = [index[c] for c in AHU_COLUMNS]
+        self.zones = [n[:-len(ZONE_TEMP_SUFFIX)] for n in names if n.endswith(ZONE_TEMP_SUFFIX)]
+        self.temp_idx = [index[z + ZONE_TEMP_SUFFIX] for z in self.zones]
+        self.setpoint_idx = [index.get(z + ZONE_SETPOINT_SUFFIX) for z in self.zones]
+        self.last_row = np.full(len(names), np.nan)
+
+        n = len(self.zones)
+        if self.backend == "fleet":
+            self.fleet = VavFleetController(n)
+        else:
+            self.controllers = [VavBoxController() for _ in range(n)]
+
+    def _ahu_chunk(self, values):
+        mat, rat, oat, dpr = (values[:, i] for i in self.ahu_idx)
+        if not self.ahu_rows:
+            return percent_oa_batch(mat, rat, oat, dpr)
+        out = np.empty(len(values))
+        with contextlib.redirect_stdout(io.StringIO()):
+            for k, row in enumerate(zip(mat.tolist(), rat.tolist(), oat.tolist(), dpr.tolist())):
+                row = [None if v != v else v for v in row]
+                if row[3] is None:
+                    out[k] = np.nan
+                    continue
+                value = self.ahu.calculate_ahu_percent_oa(*row)
+                out[k] = np.nan if value is None else value
+        return out
+
+    def _zone_chunk(self, values):
+        rows, n = len(values), len(self.zones)
+        temps = values[:, self.temp_idx]
+        has_setpoint = [i for i, col in enumerate(self.setpoint_idx) if col is not None]
+        setpoints = values[:, [self.setpoint_idx[i] for i in has_setpoint]]
+
+        mode = np.empty((rows, n), dtype=np.int8)
+        dat = np.empty((rows, n))
+        airflow = np.empty((rows, n))
+
+        if self.backend == "fleet":
+            space_temp_setpoint = self.fleet.space_temp_setpoint
+            for k in range(rows):
+                space_temp_setpoint[has_setpoint] = setpoints[k]
+                mode[k], dat[k], airflow[k], _, _ = self.fleet.control_logic(temps[k])
+            return mode, dat, airflow
+
+        for k in range(rows):
+            row = temps[k].tolist()
+            for j, i in enumerate(has_setpoint):
+                self.controllers[i].space_temp_setpoint = setpoints[k, j]
+            for i, vav in enumerate(self.controllers):
+                m, dat[k, i], airflow[k, i], _, _ = vav.control_logic(space_temp=row[i])
+                mode[k, i] = MODE_CODES[m]
+        return mode, dat, airflow
+
+    def output_header(self):
+        header = ["timestamp", "percent_oa"]
+        for zone in self.zones:
+            header += [f"{zone}_mode", f"{zone}_dat_setpoint", f"{zone}_airflow_setpoint"]
+        return header
+
+    def run(self):
+        '''
+        Generator of (timestamps, percent_oa, mode, dat_setpoint,
+        airflow_setpoint) per chunk, the zone outputs as rows x zones.
+        '''
+        self.counter = ThroughputCounter()
+        for timestamps, names, values in read_trend_chunks(self.path, self.chunk_rows):
+            if self.zones is None:
+                self._setup(names)
+            values = hold_last_value(values, self.last_row)
+            self.last_row = values[-1]
+            percent_oa = self._ahu_chunk(values)
+            mode, dat, airflow = self._zone_chunk(values)
+            self.counter.add(len(values), len(self.zones))
+            yield timestamps, percent_oa, mode, dat, airflow
+
+    def replay_to_csv(self, out_path):
+        '''Run the whole trend, appending each output chunk to out_path as it comes.'''
+        with open(out_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            header_written = False
+            for timestamps, percent_oa, mode, dat, airflow in self.run():
+                if not header_written:
+                    writer.writerow(self.output_header())
+                    header_written = True
+                # object columns so mode is written as an int, not "1.0"
+                zone_cols = np.stack([
+                    mode.astype(object), np.round(dat, 3).astype(object), np.round(airflow, 2).astype(object),
+                ], axis=2).reshape(len(mode), -1)
+                block = np.column_stack([np.round(percent_oa, 4).astype(object), zone_cols]).tolist()
+                writer.writerows([t] + row for t, row in zip(timestamps, block))
+        return self.counter
+
+
+def write_synthetic_trend(path, n_zones=20, days=365, interval=60, chunk_rows=50000, seed=9):
+    '''A building-year of made up trends, written in chunks too.'''
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(68, 76, n_zones)
+    swing = rng.uniform(1, 4, n_zones)
+    setpoints = rng.choice([70.0, 72.0, 74.0], n_zones)
+    steps = int(days * 86400 / interval)
+    t0 = np.datetime64("2024-01-01T00:00")
+
+    header = ["timestamp", *AHU_COLUMNS]
+    for i in range(n_zones):
+        header += [f"zone{i + 1}{ZONE_TEMP_SUFFIX}", f"zone{i + 1}{ZONE_SETPOINT_SUFFIX}"]
+
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for start in range(0, steps, chunk_rows):
+            k = np.arange(start, min(start + chunk_rows, steps))
+            day = k * interval / 86400.0
+            oat = 52 - 25 * np.cos(2 * np.pi * (day - 15) / 365) - 8 * np.cos(2 * np.pi * (day % 1 - 5 / 24))
+            rat = 72 + rng.normal(0, 0.3, len(k))
+            damper = np.where((day % 1 > 6 / 24) & (day % 1 < 18 / 24), 35.0, 15.0)
+            mat = rat + damper / 100 * (oat - rat) + rng.normal(0, 0.2, len(k))
+            zone_temp = base + swing * np.sin(2 * np.pi * (day[:, None] % 1)) + rng.normal(0, 0.2, (len(k), n_zones))
+            zone_cols = np.stack([zone_temp, np.broadcast_to(setpoints, zone_temp.shape)], axis=2).reshape(len(k), -1)
+            block = np.round(np.column_stack([mat, rat, oat, damper, zone_cols]), 2).tolist()
+            stamps = (t0 + (k * interval).astype("timedelta64[s]")).astype(str)
+            writer.writerows([t] + row for t, row in zip(stamps, block))
+    return path
+
+
+def check_ahu_batch(trend_path, rows=2000):
+    '''percent_oa_batch against calculate_ahu_percent_oa on the first rows.'''
+    batch = TrendReplay(trend_path, chunk_rows=rows)
+    scalar = TrendReplay(trend_path, chunk_rows=rows, ahu_rows=True)
+    _, a, *_ = next(batch.run())
+    _, b, *_ = next(scalar.run())
+    assert np.allclose(a, b, equal_nan=True), "percent_oa_batch drifted from calculate_ahu_percent_oa"
+    print(f"Py Info - percent_oa_batch matches calculate_ahu_percent_oa on {rows} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trend", help="trend CSV or Parquet, made up if not given")
+    parser.add_argument("--out", default="replay_out.csv")
+    parser.add_argument("--backend", default="fleet", choices=BACKENDS)
+    parser.add_argument("--chunk-rows", type=int, default=10000)
+    parser.add_argument("--zones", type=int, default=20, help="zones in the made up trend")
+    parser.add_argument("--days", type=float, default=365, help="days in the made up trend")
+    args = parser.parse_args()
+
+    trend = args.trend
+    if trend is None:
+        trend = "synthetic_trend.csv"
+        start = time.perf_counter()
+        write_synthetic_trend(trend, n_zones=args.zones, days=args.days)
+        print(f"Py Info - wrote {trend} ({os.path.getsize(trend) / 1e6:,.0f} MB) "
+              f"in {time.perf_counter() - start:.1f} s")
+
+    check_ahu_batch(trend)
+    replay = TrendReplay(trend, backend=args.backend, chunk_rows=args.chunk_rows)
+    counter = replay.replay_to_csv(args.out)
+    print(f"Py Info - replayed {counter.rows:,} rows x {len(replay.zones)} zones in {counter.elapsed():.1f} s "
+          f"({counter.rate():,.0f} rows/sec, {counter.zone_steps / counter.elapsed():,.0f} zone-steps/sec) "
+          f"-> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,87 +1,144 @@
-import wasmtime
+'''
+complete_sim.wat closed loop sim, with the simulation and the plotting
+split so it starts fast on a headless edge box.
+
+Nothing heavy is imported at module level. wasmtime is imported (and the
+Store built) only when a sim actually runs, and matplotlib only when a
+plot is rendered. The sim records every step into a binary trend file
+(wasm_host/trend_recorder.py BinarySink) instead of holding lists for
+the plot. Rendering maps that file back and downsamples each line to
+the plot's pixel width (wasm_host/downsample.py, min/max or LTTB)
+before matplotlib sees it, so a year of 1 min steps renders in about as
+long as a day does. Startup, import and render times are printed at the
+end.
+
+The zone is a lumped version of zone_plant.py's 2R2C (air + mass as one
+node, same params), solved exactly per step so long dt stays stable and
+a step costs a math.exp instead of a numpy call. t in the trend is hours.
+
+$ python complete_wat_file_sim.py                       # 7 days, sim + complete_sim_plot.png
+$ python complete_wat_file_sim.py --days 365 --headless # sim only, no matplotlib import
+$ python complete_wat_file_sim.py --render-only         # re-plot the trend, no wasmtime import
+'''
+
+import argparse
+import math
+import os
 import random
-import matplotlib.pyplot as plt
-
-# Initialize the WASM environment
-engine = wasmtime.Engine()
-store = wasmtime.Store(engine)
-module = wasmtime.Module.from_file(engine, "./complete_sim.wat")
-linker = wasmtime.Linker(engine)
-
-# Define global variables for WASM based on the .wat definitions
-# only points in sim to be passed from py to wasm all else
-# is just default values to be set in the wat file
-zone_air_temp = wasmtime.Global(
-    store,
-    wasmtime.GlobalType(wasmtime.ValType.f64(), mutable=True),
-    wasmtime.Val.f64(68.0),
-)
-
-set_point = wasmtime.Global(
-    store,
-    wasmtime.GlobalType(wasmtime.ValType.f64(), mutable=True),
-    wasmtime.Val.f64(72.0),
-)
-
-ahu_supply_air_temp = wasmtime.Global(
-    store,
-    wasmtime.GlobalType(wasmtime.ValType.f64(), mutable=True),
-    wasmtime.Val.f64(61.0),
-)
-
-clg_flow_min_air_flow_setpoint = wasmtime.Global(
-    store,
-    wasmtime.GlobalType(wasmtime.ValType.f64(), mutable=True),
-    wasmtime.Val.f64(50.0),
-)
-
-clg_flow_max_air_flow_setpoint = wasmtime.Global(
-    store,
-    wasmtime.GlobalType(wasmtime.ValType.f64(), mutable=True),
-    wasmtime.Val.f64(1000.0),
-)
 
-satisfied_flow_min_air_flow_setpoint = wasmtime.Global(
-    store,
-    wasmtime.GlobalType(wasmtime.ValType.f64(), mutable=True),
-    wasmtime.Val.f64(50.0),
-)
+HERE = os.path.dirname(os.path.abspath(__file__))
+import repo_path  # puts the repo root on sys.path for wasm_host
+from wasm_host.startup import startup_report, timed, timed_import
 
-htg_flow_min_air_flow_setpoint = wasmtime.Global(
-    store,
-    wasmtime.GlobalType(wasmtime.ValType.f64(), mutable=True),
-    wasmtime.Val.f64(100.0),
-)
+with timed("import numpy + trend helpers"):
+    from wasm_host.downsample import METHODS, plot_trend
+    from wasm_host.trend_recorder import BinarySink, TrendRecorder, open_binary_trend
 
-htg_flow_max_air_flow_setpoint = wasmtime.Global(
-    store,
-    wasmtime.GlobalType(wasmtime.ValType.f64(), mutable=True),
-    wasmtime.Val.f64(850.0),
+COMPLETE_SIM_WAT = os.path.join(HERE, "complete_sim.wat")
+TREND_POINTS = (
+    "zone_air_temp", "outdoor_air_temp", "mode", "discharge_air_temp_setpoint",
+    "discharge_air_flow_setpoint", "pid_output_heating", "pid_output_cooling",
 )
-
-
-
-# Define globals in the linker to match the module imports
-linker.define(store, "env", "zone_air_temp", zone_air_temp)
-linker.define(store, "env", "set_point", set_point)
-linker.define(store, "env", "ahu_supply_air_temp", ahu_supply_air_temp)
-linker.define(store, "env", "clg_flow_min_air_flow_setpoint", clg_flow_min_air_flow_setpoint)
-linker.define(store, "env", "clg_flow_max_air_flow_setpoint", clg_flow_max_air_flow_setpoint)
-linker.define(store, "env", "satisfied_flow_min_air_flow_setpoint", satisfied_flow_min_air_flow_setpoint)
-linker.define(store, "env", "htg_flow_min_air_flow_setpoint", htg_flow_min_air_flow_setpoint)
-linker.define(store, "env", "htg_flow_max_air_flow_setpoint", htg_flow_max_air_flow_setpoint)
-
-# Instantiate the module with the linker
-instance = linker.instantiate(store, module)
-
-control_logic = instance.exports(store)["control_logic"]
-integral_heating = instance.exports(store)["integral_heating"]
-integral_cooling = instance.exports(store)["integral_cooling"]
-pid_output_heating = instance.exports(store)["pid_output_heating"]
-pid_output_cooling = instance.exports(store)["pid_output_cooling"]
-discharge_air_temp_setpoint = instance.exports(store)["discharge_air_temp_setpoint"] 
-discharge_air_flow_setpoint = instance.exports(store)["discharge_air_flow_setpoint"]
-zone_air_temp_error = instance.exports(store)["zone_air_temp_error"]
-mode = instance.exports(store)["mode"]
-
-
+# zone_plant.PLANT_DEFAULTS, air and mass lumped into one node
+C_ZONE = 500.0 + 8000.0
+R_OUT = 0.01
+Q_INTERNAL = 3000.0
+AIR_HEAT = 1.08
+
+
+def build_sim():
+    wasmtime = timed_import("wasmtime")
+    from wasm_host.bindings import bind
+    from wasm_host.module_cache import load_module
+
+    # Initialize the WASM environment
+    with timed("engine + module load"):
+        engine = wasmtime.Engine()
+        store = wasmtime.Store(engine)
+        module = load_module(engine, COMPLETE_SIM_WAT)
+    # Imported f64 globals are built from the module's import types. Only
+    # points in sim to be passed from py to wasm all else is just default
+    # values to be set in the wat file
+    with timed("instantiate"):
+        sim = bind(engine, module, store=store, imports={
+            "zone_air_temp": 68.0,
+            "ahu_supply_air_temp": 61.0,
+            "clg_flow_min_air_flow_setpoint": 50.0,
+            "clg_flow_max_air_flow_setpoint": 1000.0,
+            "satisfied_flow_min_air_flow_setpoint": 50.0,
+            "htg_flow_min_air_flow_setpoint": 100.0,
+            "htg_flow_max_air_flow_setpoint": 850.0,
+        })
+    # every import and export is now an attribute resolved once, e.g.
+    #   sim.zone_air_temp = 70.0
+    #   sim.control_logic()
+    #   sim.mode, sim.integral_heating, sim.discharge_air_flow_setpoint
+    # or in bulk: sim.set_inputs({...}), sim.set_row(row), sim.read_outputs()
+    return sim
+
+
+def outdoor_temp(hours):
+    '''55 F +/- 30 over the year (coldest mid Jan) and +/- 8 over the day (warmest 3 pm).'''
+    yearly = -30.0 * math.cos(2 * math.pi * (hours / 24.0 - 15.0) / 365.0)
+    daily = -8.0 * math.cos(2 * math.pi * (hours - 15.0) / 24.0)
+    return 55.0 + yearly + daily
+
+
+def simulate(sim, steps, dt, trend_path, zone_temp=68.0, seed=25):
+    '''Runs steps scans dt seconds apart, every step goes into trend_path.'''
+    rng = random.Random(seed)
+    h = dt / 3600.0
+    recorder = TrendRecorder(TREND_POINTS, capacity=65536)
+    recorder.add_sink(BinarySink(trend_path))
+    half = recorder.capacity // 2
+    for step in range(steps):
+        hours = step * h
+        oat = outdoor_temp(hours)
+        # sensor noise on what the controller sees
+        sim.zone_air_temp = zone_temp + rng.gauss(0.0, 0.05)
+        sim.control_logic()
+        dat = sim.discharge_air_temp_setpoint
+        cfm = sim.discharge_air_flow_setpoint
+        recorder.record(hours, zone_temp, oat, sim.mode, dat, cfm, sim.pid_output_heating, sim.pid_output_cooling)
+
+        # exact step of C dT/dt = (To - T)/R + 1.08 cfm (DAT - T) + Q with the inputs held
+        g = 1.0 / R_OUT + AIR_HEAT * cfm
+        t_eq = (oat / R_OUT + AIR_HEAT * cfm * dat + Q_INTERNAL) / g
+        zone_temp = t_eq + (zone_temp - t_eq) * math.exp(-h * g / C_ZONE)
+        if recorder.count - recorder.flushed >= half:
+            recorder.flush()
+    recorder.close()
+    return recorder
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=float, default=7.0)
+    parser.add_argument("--dt", type=float, default=60.0, help="seconds per step")
+    parser.add_argument("--trend", default=os.path.join(HERE, "complete_sim.trend"))
+    parser.add_argument("--plot", default=os.path.join(HERE, "complete_sim_plot.png"))
+    parser.add_argument("--headless", action="store_true", help="run the sim, don't plot")
+    parser.add_argument("--render-only", action="store_true", help="plot an existing --trend, don't run the sim")
+    parser.add_argument("--width", type=int, default=1600, help="plot width in px, the downsample budget")
+    parser.add_argument("--method", choices=METHODS + ("none",), default="minmax")
+    args = parser.parse_args()
+
+    if not args.render_only:
+        sim = build_sim()
+        steps = int(args.days * 86400 / args.dt)
+        with timed("simulate"):
+            simulate(sim, steps, args.dt, args.trend)
+        print(f"Py Info - {steps:,} steps of {args.dt:g} s written to {args.trend}")
+
+    if not args.headless:
+        trend = open_binary_trend(args.trend)
+        method = None if args.method == "none" else args.method
+        path = plot_trend(trend, args.plot, width_px=args.width, method=method,
+                          title=f"complete_sim.wat, {len(trend['t']):,} samples ({args.method})")
+        if path:
+            print(f"Py Info - plot saved to {path}")
+    startup_report()
+
+
+if __name__ == "__main__":
+    main()
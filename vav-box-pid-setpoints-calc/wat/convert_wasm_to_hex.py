@@ -1,16 +1,20 @@
-def wasm_to_hex_c_array(wasm_file_path, hex_file_path, array_name="wasmModuleBytecode"):
-    # Read the wasm file as binary
-    with open(wasm_file_path, 'rb') as wasm_file:
-        binary_data = wasm_file.read()
+import os
 
-    # Convert binary data to hexadecimal format, formatted for C array initialization
-    hex_array = ', '.join(f'0x{byte:02x}' for byte in binary_data)
+import repo_path  # puts the repo root on sys.path for wasm_host
+from wasm_host.artifact import build_artifact, print_report
 
-    # Prepare the output content in C array format
-    formatted_output = f"unsigned char {array_name}[] = {{\n  {hex_array}\n}};"
 
-    # Write the formatted data to a new file
-    with open(hex_file_path, 'w') as hex_file:
-        hex_file.write(formatted_output)
+def wasm_to_hex_c_array(wasm_file_path, hex_file_path, array_name="wasmModuleBytecode", **options):
+    '''
+    Custom sections stripped, data segments trimmed, written as a C
+    array with length / CRC32 defines. See wasm_host/artifact.py for the
+    options and for batch mode (python -m wasm_host.artifact --all).
+    '''
+    report = build_artifact(wasm_file_path, hex_file_path, array_name, **options)
+    print_report(report)
+    return report
+
 # Example usage
-wasm_to_hex_c_array('complete_sim.wasm', 'complete_sim.hex')
+if __name__ == "__main__":
+    here = os.path.dirname(os.path.abspath(__file__))
+    wasm_to_hex_c_array(os.path.join(here, 'complete_sim.wasm'), os.path.join(here, 'complete_sim.hex'))
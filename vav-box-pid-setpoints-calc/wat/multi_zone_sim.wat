@@ -0,0 +1,232 @@
+(module
+  ;; Multi zone version of complete_sim.wat. Zone state lives in linear
+  ;; memory as one f64 column per field (struct of arrays) instead of
+  ;; scalar globals, and control_logic_zones runs two zones per step with
+  ;; f64x2 SIMD. Mode selection is branchless: compare masks plus
+  ;; v128.bitselect stand in for the nested ifs of $calculate_pid,
+  ;; $calculate_discharge_air_temp_setpoint and
+  ;; $calculate_discharge_air_flow_setpoint. The math is done in the same
+  ;; order as complete_sim.wat, so every output matches it bit for bit.
+  ;;
+  ;; Column k starts at k * $stride bytes (see $field_ptr), the host
+  ;; calls $set_capacity(n) once and fills the columns in bulk.
+  ;;
+  ;;  0 zone_air_temp                    8 integral_heating
+  ;;  1 ahu_supply_air_temp              9 integral_cooling
+  ;;  2 zone_air_temp_setpoint          10 pid_output_heating
+  ;;  3 clg_flow_min_air_flow_setpoint  11 pid_output_cooling
+  ;;  4 clg_flow_max_air_flow_setpoint  12 zone_air_temp_error
+  ;;  5 satisfied_flow_min_air_flow_sp  13 discharge_air_temp_setpoint
+  ;;  6 htg_flow_min_air_flow_setpoint  14 discharge_air_flow_setpoint
+  ;;  7 htg_flow_max_air_flow_setpoint  15 mode (i64: 0 sat, 1 htg, 2 clg)
+  (memory (export "memory") 1)
+
+  ;; PID parameters for heating and cooling (no derivative term), same as complete_sim.wat
+  (global $Kp_heating f64 (f64.const 5.0))
+  (global $Ki_heating f64 (f64.const 1.0))
+  (global $Kp_cooling f64 (f64.const 5.0))
+  (global $Ki_cooling f64 (f64.const 1.0))
+  (global $zone_air_temp_deadband f64 (f64.const 5.0))
+  (global $max_discharge_air_temp (mut f64) (f64.const 110))
+
+  (global $n_fields i32 (i32.const 16))
+  ;; zones per column, always even so the last pair never runs off the column
+  (global $capacity (mut i32) (i32.const 0))
+  ;; bytes per column
+  (global $stride (mut i32) (i32.const 0))
+
+  ;; Size the columns for n zones and zero them. Returns the capacity
+  ;; (n rounded up to even) or -1 if memory could not grow.
+  (func $set_capacity (param $n i32) (result i32)
+    (local $cap i32)
+    (local $bytes i32)
+    (local $pages i32)
+    (local.set $cap (i32.and (i32.add (local.get $n) (i32.const 1)) (i32.const -2)))
+    (local.set $bytes (i32.mul (i32.mul (local.get $cap) (i32.const 8)) (global.get $n_fields)))
+    (local.set $pages (i32.shr_u (i32.add (local.get $bytes) (i32.const 65535)) (i32.const 16)))
+    (if (i32.gt_u (local.get $pages) (memory.size))
+      (then
+        (if (i32.eq (memory.grow (i32.sub (local.get $pages) (memory.size))) (i32.const -1))
+          (then (return (i32.const -1))))))
+    (memory.fill (i32.const 0) (i32.const 0) (local.get $bytes))
+    (global.set $capacity (local.get $cap))
+    (global.set $stride (i32.mul (local.get $cap) (i32.const 8)))
+    (local.get $cap)
+  )
+
+  (func $field_ptr (param $field i32) (result i32)
+    (i32.mul (local.get $field) (global.get $stride))
+  )
+
+  ;; One scan for zones [0, n). Traps if n is over the capacity (or
+  ;; negative), instead of running into the next column
+  (func $control_logic_zones (param $n i32)
+    (local $o i32)
+    (local $end i32)
+    (local $s i32)
+    (local $c1 i32)
+    (local $c2 i32)
+    (local $c3 i32)
+    (local $c4 i32)
+    (local $c5 i32)
+    (local $c6 i32)
+    (local $c7 i32)
+    (local $c8 i32)
+    (local $c9 i32)
+    (local $c10 i32)
+    (local $c11 i32)
+    (local $c12 i32)
+    (local $c13 i32)
+    (local $c14 i32)
+    (local $c15 i32)
+    (local $temp v128)
+    (local $sat v128)
+    (local $err v128)
+    (local $active v128)
+    (local $positive v128)
+    (local $heat v128)
+    (local $cool v128)
+    (local $ih0 v128)
+    (local $ic0 v128)
+    (local $out v128)
+    (local $capped v128)
+    (local $oh v128)
+    (local $oc v128)
+    (local $scaled v128)
+    (local $lo v128)
+    (local $hi v128)
+    (local $flow_heat v128)
+    (local $half_deadband v128)
+    (local $zero v128)
+    (local $hundred v128)
+    (local $fifty v128)
+    (local $max_dat v128)
+
+    (if (i32.gt_u (local.get $n) (global.get $capacity))
+      (then (unreachable)))
+
+    ;; column offsets, column 0 (zone_air_temp) starts at 0
+    (local.set $s (global.get $stride))
+    (local.set $c1 (i32.mul (local.get $s) (i32.const 1)))
+    (local.set $c2 (i32.mul (local.get $s) (i32.const 2)))
+    (local.set $c3 (i32.mul (local.get $s) (i32.const 3)))
+    (local.set $c4 (i32.mul (local.get $s) (i32.const 4)))
+    (local.set $c5 (i32.mul (local.get $s) (i32.const 5)))
+    (local.set $c6 (i32.mul (local.get $s) (i32.const 6)))
+    (local.set $c7 (i32.mul (local.get $s) (i32.const 7)))
+    (local.set $c8 (i32.mul (local.get $s) (i32.const 8)))
+    (local.set $c9 (i32.mul (local.get $s) (i32.const 9)))
+    (local.set $c10 (i32.mul (local.get $s) (i32.const 10)))
+    (local.set $c11 (i32.mul (local.get $s) (i32.const 11)))
+    (local.set $c12 (i32.mul (local.get $s) (i32.const 12)))
+    (local.set $c13 (i32.mul (local.get $s) (i32.const 13)))
+    (local.set $c14 (i32.mul (local.get $s) (i32.const 14)))
+    (local.set $c15 (i32.mul (local.get $s) (i32.const 15)))
+    (local.set $end (i32.mul (local.get $n) (i32.const 8)))
+    (local.set $half_deadband
+      (f64x2.splat (f64.div (global.get $zone_air_temp_deadband) (f64.const 2.0))))
+    (local.set $zero (f64x2.splat (f64.const 0.0)))
+    (local.set $hundred (f64x2.splat (f64.const 100.0)))
+    (local.set $fifty (f64x2.splat (f64.const 50.0)))
+    (local.set $max_dat (f64x2.splat (global.get $max_discharge_air_temp)))
+
+    (block $done
+      (loop $pairs
+        (br_if $done (i32.ge_u (local.get $o) (local.get $end)))
+
+        ;; zone_air_temp_error = setpoint - zone_air_temp
+        (local.set $temp (v128.load (local.get $o)))
+        (local.set $sat (v128.load (i32.add (local.get $o) (local.get $c1))))
+        (local.set $err
+          (f64x2.sub (v128.load (i32.add (local.get $o) (local.get $c2))) (local.get $temp)))
+        (v128.store (i32.add (local.get $o) (local.get $c12)) (local.get $err))
+
+        ;; mode masks (all ones in a lane when true)
+        (local.set $active (f64x2.gt (f64x2.abs (local.get $err)) (local.get $half_deadband)))
+        (local.set $positive (f64x2.gt (local.get $err) (local.get $zero)))
+        (local.set $heat (v128.and (local.get $active) (local.get $positive)))
+        (local.set $cool (v128.andnot (local.get $active) (local.get $positive)))
+        (v128.store (i32.add (local.get $o) (local.get $c15))
+          (v128.or
+            (v128.and (local.get $heat) (i64x2.splat (i64.const 1)))
+            (v128.and (local.get $cool) (i64x2.splat (i64.const 2)))))
+
+        (local.set $ih0 (v128.load (i32.add (local.get $o) (local.get $c8))))
+        (local.set $ic0 (v128.load (i32.add (local.get $o) (local.get $c9))))
+
+        ;; heating PI off the old integral, the integral only moves if the
+        ;; output is under the 100 cap, everything is 0 outside heating
+        (local.set $out
+          (f64x2.add
+            (f64x2.mul (f64x2.splat (global.get $Kp_heating)) (local.get $err))
+            (f64x2.mul (f64x2.splat (global.get $Ki_heating)) (local.get $ih0))))
+        (local.set $capped (f64x2.gt (local.get $out) (local.get $hundred)))
+        (local.set $oh
+          (v128.and (v128.bitselect (local.get $hundred) (local.get $out) (local.get $capped)) (local.get $heat)))
+        (v128.store (i32.add (local.get $o) (local.get $c8))
+          (v128.and
+            (v128.bitselect (local.get $ih0) (f64x2.add (local.get $ih0) (local.get $err)) (local.get $capped))
+            (local.get $heat)))
+
+        ;; cooling PI, output is the abs value, same cap and integral hold
+        (local.set $out
+          (f64x2.abs
+            (f64x2.add
+              (f64x2.mul (f64x2.splat (global.get $Kp_cooling)) (local.get $err))
+              (f64x2.mul (f64x2.splat (global.get $Ki_cooling)) (local.get $ic0)))))
+        (local.set $capped (f64x2.gt (local.get $out) (local.get $hundred)))
+        (local.set $oc
+          (v128.and (v128.bitselect (local.get $hundred) (local.get $out) (local.get $capped)) (local.get $cool)))
+        (v128.store (i32.add (local.get $o) (local.get $c9))
+          (v128.and
+            (v128.bitselect (local.get $ic0) (f64x2.add (local.get $ic0) (local.get $err)) (local.get $capped))
+            (local.get $cool)))
+        (v128.store (i32.add (local.get $o) (local.get $c10)) (local.get $oh))
+        (v128.store (i32.add (local.get $o) (local.get $c11)) (local.get $oc))
+
+        ;; discharge air temp: heating resets AHU SAT -> max DAT over 0-50%
+        ;; and holds max DAT above that, AHU SAT otherwise
+        (local.set $scaled (f64x2.div (local.get $oh) (local.get $hundred)))
+        (v128.store (i32.add (local.get $o) (local.get $c13))
+          (v128.bitselect
+            (v128.bitselect
+              (f64x2.add (local.get $sat)
+                (f64x2.mul (f64x2.sub (local.get $max_dat) (local.get $sat)) (local.get $scaled)))
+              (local.get $max_dat)
+              (f64x2.le (local.get $oh) (local.get $fifty)))
+            (local.get $sat)
+            (local.get $heat)))
+
+        ;; discharge air flow: heating min below 50%, reset min -> max from
+        ;; 50%, cooling resets min -> max, satisfied min otherwise
+        (local.set $lo (v128.load (i32.add (local.get $o) (local.get $c6))))
+        (local.set $hi (v128.load (i32.add (local.get $o) (local.get $c7))))
+        (local.set $flow_heat
+          (v128.bitselect
+            (f64x2.add (local.get $lo)
+              (f64x2.mul (f64x2.sub (local.get $hi) (local.get $lo)) (local.get $scaled)))
+            (local.get $lo)
+            (f64x2.ge (local.get $oh) (local.get $fifty))))
+        (local.set $lo (v128.load (i32.add (local.get $o) (local.get $c3))))
+        (local.set $hi (v128.load (i32.add (local.get $o) (local.get $c4))))
+        (v128.store (i32.add (local.get $o) (local.get $c14))
+          (v128.bitselect
+            (local.get $flow_heat)
+            (v128.bitselect
+              (f64x2.add (local.get $lo)
+                (f64x2.mul (f64x2.sub (local.get $hi) (local.get $lo))
+                  (f64x2.div (local.get $oc) (local.get $hundred))))
+              (v128.load (i32.add (local.get $o) (local.get $c5)))
+              (local.get $cool))
+            (local.get $heat)))
+
+        (local.set $o (i32.add (local.get $o) (i32.const 16)))
+        (br $pairs)
+      )
+    )
+  )
+
+  (export "set_capacity" (func $set_capacity))
+  (export "field_ptr" (func $field_ptr))
+  (export "control_logic_zones" (func $control_logic_zones))
+)
@@ -0,0 +1,183 @@
+'''
+Python driver for multi_zone_sim.wat, the f64x2 SIMD multi zone version
+of complete_sim.wat.
+
+Every zone field is a column in the module's linear memory. MultiZoneWat
+maps each column as a numpy view once, so filling the inputs for the
+whole building is one numpy assignment per column, a scan is one
+control_logic_zones call, and the outputs are read straight off the
+same views. No per zone globals or per zone calls.
+
+check_against_scalar() runs the same zones through per zone
+complete_sim.wat instances (wat_instance_pool.WatController) and
+requires every output to match bit for bit. benchmark() prints zones/sec
+for both.
+
+$ python multi_zone_wat_sim.py
+'''
+
+import os
+import time
+
+import numpy as np
+import wasmtime
+
+import repo_path  # puts the repo root on sys.path for wasm_host
+from wasm_host.bindings import FastFunc
+from wasm_host.marshal import memory_view
+from wasm_host.module_cache import load_module
+from wat_instance_pool import COMPLETE_SIM_WAT, INPUT_DEFAULTS, OUTPUT_NAMES, WatController
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MULTI_ZONE_WAT = os.path.join(HERE, "multi_zone_sim.wat")
+
+# column order in multi_zone_sim.wat
+INPUT_COLUMNS = (
+    "zone_air_temp",
+    "ahu_supply_air_temp",
+    "zone_air_temp_setpoint",
+    "clg_flow_min_air_flow_setpoint",
+    "clg_flow_max_air_flow_setpoint",
+    "satisfied_flow_min_air_flow_setpoint",
+    "htg_flow_min_air_flow_setpoint",
+    "htg_flow_max_air_flow_setpoint",
+)
+OUTPUT_COLUMNS = (
+    "integral_heating",
+    "integral_cooling",
+    "pid_output_heating",
+    "pid_output_cooling",
+    "zone_air_temp_error",
+    "discharge_air_temp_setpoint",
+    "discharge_air_flow_setpoint",
+    "mode",
+)
+# complete_sim.wat has the setpoint as a constant
+COLUMN_DEFAULTS = dict(INPUT_DEFAULTS, zone_air_temp_setpoint=72.0)
+
+
+class MultiZoneWat:
+    '''
+    n_zones worth of complete_sim.wat state in one instance. Columns
+    are numpy views into guest memory (mode is int64), write inputs
+    into them and read outputs from them.
+    '''
+    def __init__(self, n_zones, engine=None, module_path=MULTI_ZONE_WAT):
+        self.engine = engine or wasmtime.Engine()
+        self.store = wasmtime.Store(self.engine)
+        self.instance = wasmtime.Instance(self.store, load_module(self.engine, module_path), [])
+        exports = self.instance.exports(self.store)
+        self.n_zones = n_zones
+        self.capacity = exports["set_capacity"](self.store, n_zones)
+        if self.capacity < 0:
+            raise MemoryError(f"guest memory could not grow to {n_zones} zones")
+        # memory only grows in set_capacity, so these views stay good
+        view = memory_view(exports["memory"], self.store)
+        field_ptr = exports["field_ptr"]
+        self.columns = {}
+        for field, name in enumerate(INPUT_COLUMNS + OUTPUT_COLUMNS):
+            dtype = "<i8" if name == "mode" else "<f8"
+            self.columns[name] = np.frombuffer(view, dtype=dtype, count=n_zones, offset=field_ptr(self.store, field))
+        control_logic = exports["control_logic_zones"]
+        self._control_logic = FastFunc(self.store, control_logic, control_logic.type(self.store))
+        self.set_inputs(**{name: COLUMN_DEFAULTS.get(name, 0.0) for name in INPUT_COLUMNS})
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def set_inputs(self, **values):
+        '''Column name -> scalar or array of n_zones.'''
+        for name, value in values.items():
+            self.columns[name][:] = value
+
+    def scan(self):
+        self._control_logic(self.n_zones)
+
+    def step(self, **values):
+        self.set_inputs(**values)
+        self.scan()
+        return self.read_outputs()
+
+    def read_outputs(self):
+        '''Copies of the output columns.'''
+        return {name: self.columns[name].copy() for name in OUTPUT_COLUMNS}
+
+
+def _scenario(rng, n_zones, steps):
+    '''Zone temps that walk through heating, satisfied and cooling, plus a few extremes to hit the caps.'''
+    temps = rng.uniform(60.0, 84.0, n_zones)
+    temps[:4] = (30.0, 120.0, 72.0, 69.5)
+    series = [temps]
+    for _ in range(steps - 1):
+        temps = temps + rng.normal(0.0, 1.5, n_zones)
+        series.append(temps)
+    sat = rng.uniform(52.0, 62.0, (steps, n_zones))
+    return np.array(series), sat
+
+
+def check_against_scalar(n_zones=61, steps=80, seed=23):
+    engine = wasmtime.Engine()
+    rng = np.random.default_rng(seed)
+    temps, sat = _scenario(rng, n_zones, steps)
+    flow_inputs = {
+        "clg_flow_max_air_flow_setpoint": rng.uniform(600.0, 1200.0, n_zones),
+        "htg_flow_max_air_flow_setpoint": rng.uniform(500.0, 900.0, n_zones),
+    }
+
+    simd = MultiZoneWat(n_zones, engine)
+    simd.set_inputs(**flow_inputs)
+    scalar_module = load_module(engine, COMPLETE_SIM_WAT)
+    scalars = [WatController(engine, scalar_module) for _ in range(n_zones)]
+    for zone, ctl in enumerate(scalars):
+        ctl.set_inputs(**{name: float(values[zone]) for name, values in flow_inputs.items()})
+
+    for step in range(steps):
+        got = simd.step(zone_air_temp=temps[step], ahu_supply_air_temp=sat[step])
+        for zone, ctl in enumerate(scalars):
+            expected = ctl.step(zone_air_temp=float(temps[step, zone]), ahu_supply_air_temp=float(sat[step, zone]))
+            for name in OUTPUT_NAMES:
+                a, b = expected[name], got[name][zone]
+                same = a == b if name == "mode" else np.float64(a).tobytes() == np.float64(b).tobytes()
+                if not same:
+                    raise AssertionError(f"step {step} zone {zone} {name}: scalar {a!r} simd {b!r}")
+    modes = np.bincount(got["mode"], minlength=3)
+    print(f"Py Info - multi_zone_sim.wat matches complete_sim.wat bit for bit over {steps} steps x {n_zones} zones "
+          f"(last step {modes[0]} satisfied / {modes[1]} heating / {modes[2]} cooling)")
+
+
+def benchmark(sizes=(1000, 10000, 100000), scalar_zones=500, scans=200, seed=24):
+    engine = wasmtime.Engine()
+    rng = np.random.default_rng(seed)
+
+    scalar_module = load_module(engine, COMPLETE_SIM_WAT)
+    scalars = [WatController(engine, scalar_module) for _ in range(scalar_zones)]
+    temps = rng.uniform(60.0, 84.0, scalar_zones).tolist()
+    start = time.perf_counter()
+    for _ in range(5):
+        for ctl, temp in zip(scalars, temps):
+            ctl.set_inputs(zone_air_temp=temp)
+            ctl.scan()
+            ctl.read_outputs()
+    scalar_rate = 5 * scalar_zones / (time.perf_counter() - start)
+    print(f"complete_sim.wat, one instance per zone: {scalar_rate:,.0f} zones/sec")
+
+    for n_zones in sizes:
+        simd = MultiZoneWat(n_zones, engine)
+        temps = rng.uniform(60.0, 84.0, n_zones)
+        start = time.perf_counter()
+        for _ in range(scans):
+            simd["zone_air_temp"][:] = temps
+            simd.scan()
+        secs = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(scans):
+            simd.scan()
+        kernel_secs = time.perf_counter() - start
+        rate = scans * n_zones / secs
+        print(f"multi_zone_sim.wat, {n_zones:>7,} zones: {rate:>13,.0f} zones/sec with the input fill "
+              f"({scans * n_zones / kernel_secs:,.0f} kernel only), {rate / scalar_rate:,.0f}x")
+
+
+if __name__ == "__main__":
+    check_against_scalar()
+    benchmark()
@@ -0,0 +1,205 @@
+'''
+Pool of ready to go complete_sim.wat controllers.
+
+Each pooled controller has its own Store, its own imported f64 Globals
+and its own instance. Checking one out is a list pop, and returning it
+puts the PID state (integral_heating, integral_cooling, outputs, mode)
+back to the values captured right after instantiation, so a zone never
+pays compile, link or instantiate cost on the scan path.
+'''
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import wasmtime
+
+import repo_path  # puts the repo root on sys.path for wasm_host
+from wasm_host.module_cache import load_module
+from wasm_host.raw_globals import ScalarGlobal
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COMPLETE_SIM_WAT = os.path.join(HERE, "complete_sim.wat")
+
+# same defaults as complete_wat_file_sim.py
+INPUT_DEFAULTS = {
+    "zone_air_temp": 68.0,
+    "ahu_supply_air_temp": 61.0,
+    "clg_flow_min_air_flow_setpoint": 50.0,
+    "clg_flow_max_air_flow_setpoint": 1000.0,
+    "satisfied_flow_min_air_flow_setpoint": 50.0,
+    "htg_flow_min_air_flow_setpoint": 100.0,
+    "htg_flow_max_air_flow_setpoint": 850.0,
+}
+
+OUTPUT_NAMES = (
+    "mode",
+    "zone_air_temp_error",
+    "pid_output_heating",
+    "pid_output_cooling",
+    "integral_heating",
+    "integral_cooling",
+    "discharge_air_temp_setpoint",
+    "discharge_air_flow_setpoint",
+)
+
+
+class WatController:
+    '''One complete_sim.wat instance with its own Store and input Globals.'''
+    def __init__(self, engine, module, input_defaults=INPUT_DEFAULTS):
+        self.store = wasmtime.Store(engine)
+        self.input_defaults = dict(input_defaults)
+
+        # one mutable f64 Global per module import, passed in import order
+        self.inputs = {}
+        imports = []
+        for imp in module.imports:
+            value = self.input_defaults.get(imp.name, 0.0)
+            glob = wasmtime.Global(
+                self.store,
+                wasmtime.GlobalType(wasmtime.ValType.f64(), mutable=True),
+                wasmtime.Val.f64(value),
+            )
+            self.inputs[imp.name] = ScalarGlobal(self.store, glob)
+            imports.append(glob)
+        self.instance = wasmtime.Instance(self.store, module, imports)
+
+        # resolve exports once, not per scan
+        exports = self.instance.exports(self.store)
+        self._control_logic = exports["control_logic"]
+        self.outputs = {name: ScalarGlobal(self.store, exports[name]) for name in OUTPUT_NAMES}
+
+        # clean state to reset back to
+        self.snapshot_state = self.snapshot()
+
+    def snapshot(self):
+        '''Values of every mutable exported global.'''
+        return {name: glob.get() for name, glob in self.outputs.items() if glob.mutable}
+
+    def restore(self, state):
+        for name, value in state.items():
+            self.outputs[name].set(value)
+
+    def reset(self):
+        '''Back to a fresh instance state without re-instantiating.'''
+        self.restore(self.snapshot_state)
+        for name, glob in self.inputs.items():
+            glob.set(self.input_defaults.get(name, 0.0))
+
+    def set_inputs(self, **values):
+        for name, value in values.items():
+            self.inputs[name].set(value)
+
+    def step(self, **values):
+        '''Set any inputs given, run one control_logic scan and return the outputs.'''
+        if values:
+            self.set_inputs(**values)
+        self.scan()
+        return self.read_outputs()
+
+    def scan(self):
+        '''Run control_logic once with whatever is in the input globals.'''
+        self._control_logic(self.store)
+
+    def read_outputs(self):
+        return {name: glob.get() for name, glob in self.outputs.items()}
+
+
+class WatControllerPool:
+    '''
+    Fixed set of WatController objects handed out to zones. If the
+    pool runs dry a new controller is instantiated (and counted) so
+    callers never block.
+    '''
+    def __init__(self, size=8, module_path=COMPLETE_SIM_WAT, engine=None, input_defaults=INPUT_DEFAULTS):
+        self.engine = engine or wasmtime.Engine()
+        self.module = load_module(self.engine, module_path)
+        self.input_defaults = input_defaults
+        self._lock = threading.Lock()
+        self._idle = [self._new_controller() for _ in range(size)]
+        self.prewarmed = size
+
+        self.checkouts = 0
+        self.reused = 0
+        self.created_on_demand = 0
+        self.checkout_secs = []
+
+    def _new_controller(self):
+        return WatController(self.engine, self.module, self.input_defaults)
+
+    def checkout(self):
+        start = time.perf_counter()
+        with self._lock:
+            controller = self._idle.pop() if self._idle else None
+            self.checkouts += 1
+            if controller is not None:
+                self.reused += 1
+            else:
+                self.created_on_demand += 1
+        if controller is None:
+            controller = self._new_controller()
+        self.checkout_secs.append(time.perf_counter() - start)
+        return controller
+
+    def checkin(self, controller, reset=True):
+        if reset:
+            controller.reset()
+        with self._lock:
+            self._idle.append(controller)
+
+    @contextmanager
+    def controller(self):
+        controller = self.checkout()
+        try:
+            yield controller
+        finally:
+            self.checkin(controller)
+
+    def stats(self):
+        secs = sorted(self.checkout_secs)
+        n = len(secs)
+        return {
+            "prewarmed": self.prewarmed,
+            "idle": len(self._idle),
+            "checkouts": self.checkouts,
+            "created_on_demand": self.created_on_demand,
+            "reuse_rate": self.reused / self.checkouts if self.checkouts else 0.0,
+            "checkout_us_avg": 1e6 * sum(secs) / n if n else 0.0,
+            "checkout_us_p99": 1e6 * secs[min(n - 1, int(n * 0.99))] if n else 0.0,
+        }
+
+
+def simulate_zones(n_zones=200, steps=30, pool_size=16):
+    '''Run n_zones independent zone scenarios through a small pool.'''
+    pool = WatControllerPool(size=pool_size)
+    final = []
+    for zone in range(n_zones):
+        zone_temp = 66.0 + (zone % 12)
+        with pool.controller() as ctl:
+            for _ in range(steps):
+                outputs = ctl.step(zone_air_temp=zone_temp)
+            final.append(outputs)
+
+    stats = pool.stats()
+    print(f"Ran {n_zones} zones x {steps} steps on a pool of {pool_size}")
+    for key, value in stats.items():
+        print(f"  {key}: {value:.3f}" if isinstance(value, float) else f"  {key}: {value}")
+
+    # what the pool saves per zone compared to building a fresh instance
+    ctl = pool.checkout()
+    start = time.perf_counter()
+    for _ in range(1000):
+        ctl.reset()
+    reset_us = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for _ in range(100):
+        pool._new_controller()
+    new_us = (time.perf_counter() - start) * 10000
+    pool.checkin(ctl)
+    print(f"reset: {reset_us:.1f} us, fresh Store + instantiate: {new_us:.1f} us")
+    return final
+
+
+if __name__ == "__main__":
+    simulate_zones()
@@ -0,0 +1,7 @@
+'''
+Shared Python host helpers for the wasmtime runners in this repo.
+
+The run_wasm.py / *_sim.py scripts live in their own project folders.
+Each of those folders has a repo_path.py that puts the repo root on
+sys.path, scripts `import repo_path` before importing from here.
+'''
@@ -0,0 +1,24 @@
+'''
+Loads ahu-system-air-mgmt/main.py as a module.
+
+main.py is a script living in a folder with a dash in its name, so it
+can't be imported normally. The vav-box-pid-setpoints-calc sims that
+also run the AHU %OA calc (scan loop, trend replay, point table, sensor
+faults) load it through here.
+
+    ahu = load_ahu_main()
+    ahu.calculate_ahu_percent_oa(60.0, 72.0, 40.0, 20.0)
+'''
+
+import importlib.util
+import os
+
+AHU_MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ahu-system-air-mgmt", "main.py")
+
+
+def load_ahu_main():
+    '''A fresh copy of main.py's module, its globals aren't shared between callers.'''
+    spec = importlib.util.spec_from_file_location("ahu_main", AHU_MAIN)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,391 @@
+'''
+Firmware artifact pipeline: .wasm -> stripped .wasm -> C array.
+
+The MCU only needs the sections the runtime executes. Custom sections
+(name, producers, target_features, .debug_*, sourceMappingURL) are
+dropped, which for complete_sim.wasm is over 40% of the file. Other
+size passes, all optional:
+
+    trim_data  - leading/trailing zero bytes are cut off active data
+                 segments (linear memory starts zeroed), only for
+                 segments that don't overlap another one
+    dedupe     - an active data segment that is an exact repeat of an
+                 earlier one (same memory, offset and bytes) is emptied
+    compress   - the emitted array is zlib data, the firmware inflates
+                 it into RAM before loading (NAME_RAW_LEN is the size)
+
+The result is checked with wasmtime's validator before it is written.
+The C array is written in 16 byte lines built from bytes.hex() slices,
+not one f-string per byte, and the header carries the length, CRC32
+and sha256 so the firmware (or a flashing script) can verify it.
+
+    $ python -m wasm_host.artifact vav-box-pid-setpoints-calc/wat/complete_sim.wasm
+    $ python -m wasm_host.artifact --all --out-dir build/c_arrays
+'''
+
+import argparse
+import hashlib
+import os
+import sys
+import zlib
+
+WASM_MAGIC = b"\0asm"
+WASM_VERSION = b"\x01\0\0\0"
+SECTION_CUSTOM = 0
+SECTION_DATA = 11
+SECTION_NAMES = {
+    0: "custom", 1: "type", 2: "import", 3: "function", 4: "table", 5: "memory", 6: "global",
+    7: "export", 8: "start", 9: "element", 10: "code", 11: "data", 12: "datacount", 13: "tag",
+}
+BYTES_PER_LINE = 16
+# build leftovers that are never the deployable module
+SKIP_DIRS = {"deps", "incremental", "build", ".fingerprint", "__pycache__", ".git"}
+
+
+class WasmFormatError(ValueError):
+    pass
+
+
+def read_leb(data, pos, signed=False):
+    '''LEB128 at pos, returns (value, next pos).'''
+    result = shift = 0
+    while True:
+        if pos >= len(data):
+            raise WasmFormatError("truncated LEB128")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            break
+    if signed and byte & 0x40:
+        result -= 1 << shift
+    return result, pos
+
+
+def write_leb(value, signed=False):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if signed:
+            done = (value == 0 and not byte & 0x40) or (value == -1 and byte & 0x40)
+        else:
+            done = value == 0
+        out.append(byte if done else byte | 0x80)
+        if done:
+            return bytes(out)
+
+
+class Section:
+    def __init__(self, id, payload):
+        self.id = id
+        self.payload = payload
+
+    @property
+    def name(self):
+        '''Custom section name, or the standard section name.'''
+        if self.id != SECTION_CUSTOM:
+            return SECTION_NAMES.get(self.id, f"unknown{self.id}")
+        length, pos = read_leb(self.payload, 0)
+        return self.payload[pos:pos + length].decode("utf-8", "replace")
+
+    def encode(self):
+        return bytes([self.id]) + write_leb(len(self.payload)) + self.payload
+
+
+def parse_sections(data):
+    # wasmtime.wat2wasm() hands back a bytearray, slices of it would be unhashable
+    data = bytes(data)
+    if data[:4] != WASM_MAGIC:
+        raise WasmFormatError("not a wasm binary (bad magic)")
+    if data[4:8] != WASM_VERSION:
+        raise WasmFormatError(f"unsupported wasm version {data[4:8].hex()}")
+    sections = []
+    pos = 8
+    while pos < len(data):
+        id = data[pos]
+        size, pos = read_leb(data, pos + 1)
+        if pos + size > len(data):
+            raise WasmFormatError(f"section {SECTION_NAMES.get(id, id)} runs past end of file")
+        sections.append(Section(id, data[pos:pos + size]))
+        pos += size
+    return sections
+
+
+def encode_module(sections):
+    return WASM_MAGIC + WASM_VERSION + b"".join(s.encode() for s in sections)
+
+
+class DataSegment:
+    '''
+    One entry of the data section. Active segments with an i32.const
+    offset keep the parsed offset, anything else is passed through as is.
+    '''
+    def __init__(self, raw, kind, memory=0, offset=None, init=b""):
+        self.raw = raw
+        self.kind = kind
+        self.memory = memory
+        self.offset = offset
+        self.init = init
+
+    @property
+    def active(self):
+        return self.kind in (0, 2) and self.offset is not None
+
+    def encode(self):
+        if not self.active:
+            return self.raw
+        expr = b"\x41" + write_leb(self.offset, signed=True) + b"\x0b"
+        head = b"\x00" if self.kind == 0 else b"\x02" + write_leb(self.memory)
+        return head + expr + write_leb(len(self.init)) + self.init
+
+
+def _skip_const_expr(payload, pos):
+    '''Position after a constant expression's end opcode.'''
+    while True:
+        op = payload[pos]
+        pos += 1
+        if op == 0x0B:
+            return pos
+        if op in (0x41, 0x42):  # i32.const / i64.const
+            _, pos = read_leb(payload, pos, signed=True)
+        elif op == 0x23:  # global.get
+            _, pos = read_leb(payload, pos)
+        elif op in (0x6A, 0x6B, 0x6C, 0x7C, 0x7D, 0x7E):  # extended const add/sub/mul
+            pass
+        else:
+            raise WasmFormatError(f"unsupported opcode 0x{op:02x} in data segment offset")
+
+
+def parse_data(payload):
+    count, pos = read_leb(payload, 0)
+    segments = []
+    for _ in range(count):
+        start = pos
+        kind, pos = read_leb(payload, pos)
+        memory = 0
+        offset = None
+        if kind == 2:
+            memory, pos = read_leb(payload, pos)
+        if kind in (0, 2):
+            # only the plain (i32.const N) end form gets rewritten
+            if payload[pos] == 0x41:
+                value, end = read_leb(payload, pos + 1, signed=True)
+                if payload[end] == 0x0B:
+                    offset = value
+            pos = _skip_const_expr(payload, pos)
+        elif kind != 1:
+            raise WasmFormatError(f"unknown data segment kind {kind}")
+        length, pos = read_leb(payload, pos)
+        init = payload[pos:pos + length]
+        pos += length
+        segments.append(DataSegment(payload[start:pos], kind, memory, offset, init))
+    return segments
+
+
+def encode_data(segments):
+    return write_leb(len(segments)) + b"".join(s.encode() for s in segments)
+
+
+def _overlaps(seg, segments):
+    '''
+    Other active segments that may write any of seg's bytes. One with a
+    non constant offset (global.get) could land anywhere.
+    '''
+    end = seg.offset + len(seg.init)
+    return [
+        other for other in segments
+        if other is not seg and other.kind in (0, 2) and other.memory == seg.memory
+        and (other.offset is None or (other.offset < end and seg.offset < other.offset + len(other.init)))
+    ]
+
+
+def optimize_data(segments, trim_data=True, dedupe=True):
+    '''Returns bytes saved. Segment count and order never change (data.drop / memory.init use indexes).'''
+    before = sum(len(s.encode()) for s in segments)
+    if dedupe:
+        seen = set()
+        for seg in segments:
+            if not seg.active:
+                continue
+            key = (seg.memory, seg.offset, seg.init)
+            # a different segment in between could have overwritten the first copy
+            if key in seen and all(o.offset == seg.offset and o.init == seg.init for o in _overlaps(seg, segments)):
+                seg.init = b""
+            seen.add(key)
+    if trim_data:
+        for seg in segments:
+            if not seg.active or not seg.init or _overlaps(seg, segments):
+                continue
+            stripped = seg.init.lstrip(b"\0")
+            seg.offset += len(seg.init) - len(stripped)
+            seg.init = stripped.rstrip(b"\0")
+    return before - sum(len(s.encode()) for s in segments)
+
+
+def strip_module(data, keep_custom=(), trim_data=False, dedupe=False):
+    '''
+    Returns (stripped bytes, report). keep_custom is a set of custom
+    section names to leave in.
+    '''
+    data = bytes(data)
+    sections = parse_sections(data)
+    report = {"input_bytes": len(data), "sections": [], "removed": [], "data_saved": 0}
+    kept = []
+    for section in sections:
+        entry = (section.name, len(section.payload))
+        if section.id == SECTION_CUSTOM and section.name not in keep_custom:
+            report["removed"].append(entry)
+            continue
+        if section.id == SECTION_DATA and (trim_data or dedupe):
+            segments = parse_data(section.payload)
+            report["data_saved"] = optimize_data(segments, trim_data, dedupe)
+            section = Section(SECTION_DATA, encode_data(segments))
+        report["sections"].append((section.name, len(section.payload)))
+        kept.append(section)
+    out = encode_module(kept)
+    report["output_bytes"] = len(out)
+    return out, report
+
+
+def validate(data):
+    '''wasmtime's validator, skipped if wasmtime isn't installed.'''
+    try:
+        import wasmtime
+    except ImportError:
+        return None
+    wasmtime.Module.validate(wasmtime.Engine(), data)
+    return True
+
+
+def c_identifier(path):
+    base = os.path.splitext(os.path.basename(path))[0]
+    ident = "".join(c if c.isalnum() else "_" for c in base)
+    return ident if ident and not ident[0].isdigit() else "_" + ident
+
+
+def c_array_lines(payload, array_name, raw_len=None, source=None):
+    '''Generator of the C source, BYTES_PER_LINE bytes per line.'''
+    upper = array_name.upper()
+    yield f"/* generated by wasm_host/artifact.py{' from ' + source if source else ''} */\n"
+    yield f"/* sha256 {hashlib.sha256(payload).hexdigest()} */\n"
+    yield f"#define {upper}_LEN {len(payload)}u\n"
+    yield f"#define {upper}_CRC32 0x{zlib.crc32(payload):08x}u\n"
+    if raw_len is not None:
+        yield f"/* zlib compressed, inflate to {upper}_RAW_LEN bytes before loading */\n"
+        yield f"#define {upper}_RAW_LEN {raw_len}u\n"
+    yield f"const unsigned char {array_name}[] = {{\n"
+    for start in range(0, len(payload), BYTES_PER_LINE):
+        chunk = payload[start:start + BYTES_PER_LINE]
+        # "00,61,73" -> "0x00, 0x61, 0x73"
+        yield "  0x" + chunk.hex(",").replace(",", ", 0x") + ",\n"
+    yield "};\n"
+
+
+def build_artifact(wasm_path, out_path=None, array_name=None, keep_custom=(), trim_data=True,
+                   dedupe=True, compress=False, strip=True):
+    '''
+    Strip, validate and write wasm_path as a C array (out_path, default
+    next to the .wasm with a .hex extension). Also writes the stripped
+    .wasm next to out_path. Returns the size report.
+    '''
+    with open(wasm_path, "rb") as f:
+        data = f.read()
+    if strip:
+        module, report = strip_module(data, keep_custom, trim_data, dedupe)
+    else:
+        module = data
+        report = {"input_bytes": len(data), "output_bytes": len(data), "sections": [], "removed": [], "data_saved": 0}
+    report["valid"] = validate(module)
+
+    payload = zlib.compress(module, 9) if compress else module
+    out_path = out_path or os.path.splitext(wasm_path)[0] + ".hex"
+    array_name = array_name or c_identifier(wasm_path) + "_wasm"
+    with open(out_path, "w") as f:
+        f.writelines(c_array_lines(payload, array_name, len(module) if compress else None,
+                                   os.path.basename(wasm_path)))
+    if strip:
+        with open(os.path.splitext(out_path)[0] + ".stripped.wasm", "wb") as f:
+            f.write(module)
+
+    report.update(
+        source=wasm_path,
+        output=out_path,
+        array_name=array_name,
+        array_bytes=len(payload),
+        crc32=f"{zlib.crc32(payload):08x}",
+        sha256=hashlib.sha256(payload).hexdigest(),
+    )
+    return report
+
+
+def find_modules(root):
+    '''
+    Every deployable .wasm under root: hand written ones plus wasm-pack
+    pkg/ and cargo target/wasm32-*/release outputs. Skips cargo deps and
+    our own .stripped.wasm outputs.
+    '''
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        parts = dirpath.replace("\\", "/").split("/")
+        if "target" in parts and "release" not in parts:
+            continue
+        for name in sorted(filenames):
+            if name.endswith(".wasm") and not name.endswith(".stripped.wasm"):
+                found.append(os.path.join(dirpath, name))
+    return found
+
+
+def print_report(report):
+    saved = report["input_bytes"] - report["array_bytes"]
+    print(f"Py Info - {report['source']} -> {report['output']} ({report['array_name']})")
+    print(f"  {report['input_bytes']:,} bytes in, {report['output_bytes']:,} stripped, "
+          f"{report['array_bytes']:,} in the array ({saved / report['input_bytes']:.0%} smaller), "
+          f"crc32 {report['crc32']}, valid {report['valid']}")
+    for name, size in report["removed"]:
+        print(f"  removed custom section {name!r}: {size:,} bytes")
+    if report["data_saved"]:
+        print(f"  data segments trimmed: {report['data_saved']:,} bytes")
+    for name, size in report["sections"]:
+        print(f"  {name:<12} {size:>8,} bytes")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Strip .wasm modules and emit them as C arrays")
+    parser.add_argument("wasm", nargs="*", help=".wasm files to convert")
+    parser.add_argument("--all", action="store_true", help="convert every .wasm in the repo")
+    parser.add_argument("--out-dir", help="write the .hex files here instead of next to each .wasm")
+    parser.add_argument("--keep", action="append", default=[], help="custom section name to keep (repeatable)")
+    parser.add_argument("--no-strip", action="store_true", help="emit the module untouched")
+    parser.add_argument("--no-trim-data", action="store_true", help="leave zero bytes in data segments")
+    parser.add_argument("--compress", action="store_true", help="emit zlib compressed bytes")
+    args = parser.parse_args(argv)
+
+    paths = list(args.wasm)
+    if args.all:
+        paths += find_modules(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    if not paths:
+        parser.error("give .wasm files or --all")
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    failed = 0
+    for path in paths:
+        out = None
+        if args.out_dir:
+            out = os.path.join(args.out_dir, c_identifier(path) + ".hex")
+        try:
+            report = build_artifact(path, out, keep_custom=set(args.keep), trim_data=not args.no_trim_data,
+                                    dedupe=not args.no_trim_data, compress=args.compress, strip=not args.no_strip)
+        except Exception as e:
+            failed += 1
+            print(f"Py Info - {path} failed: {e}")
+            continue
+        print_report(report)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
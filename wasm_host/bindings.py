@@ -0,0 +1,400 @@
+'''
+Typed bindings generated from a module's own imports/exports.
+
+The runners look exports up by string on every use and build each
+imported Global by hand. bind() reads module.imports / module.exports
+once, creates the imported globals (with the import's own type), links
+and instantiates, then hands back an object where
+
+    - every exported and imported numeric global is a plain attribute
+      (sim.zone_air_temp = 70.0, sim.mode) going through ScalarGlobal
+    - every exported function is a bound callable with the store already
+      in it (sim.control_logic()), numeric signatures skip Func.__call__
+      and go straight to wasmtime_func_call with preallocated args
+    - inputs (imported globals) and outputs (exported globals) can be set
+      or read in bulk from a dict or a NumPy row
+
+The class is generated once per module signature and cached, so a new
+.wat controller needs no glue code at all:
+
+    sim = bind(engine, load_module(engine, "complete_sim.wat"), imports={"zone_air_temp": 68.0})
+    sim.control_logic()
+    print(sim.discharge_air_flow_setpoint)
+
+Print the typed facade for a module:
+    $ python -m wasm_host.bindings vav-box-pid-setpoints-calc/wat/complete_sim.wat
+
+FastFunc and ScalarGlobal use wasmtime-py internals (see raw_globals.py)
+and fall back to the public API if an upgrade moves them. Check which
+path is in use:
+    $ python -m wasm_host.bindings --check
+'''
+
+import ctypes
+import keyword
+import sys
+import warnings
+
+import wasmtime
+
+from .raw_globals import FAST_PATH, KINDS, ScalarGlobal, ffi
+
+# the FastFunc call path needs this wasmtime-py internal on top of the
+# ones raw_globals checks, without it FastFunc uses Func.__call__
+try:
+    from wasmtime._func import maybe_raise_last_exn
+except ImportError:
+    maybe_raise_last_exn = None
+    if FAST_PATH:
+        warnings.warn("wasmtime._func.maybe_raise_last_exn not found, FastFunc falls back to Func.__call__",
+                      RuntimeWarning)
+FUNC_FAST_PATH = FAST_PATH and maybe_raise_last_exn is not None
+
+PY_TYPES = {"i32": "int", "i64": "int", "f32": "float", "f64": "float"}
+
+
+def _attr_name(name):
+    '''
+    Export/import name as a python identifier. Names Binding already uses
+    (store, exports, snapshot, ...) get a trailing _, the wasm name still
+    works in exports / set_inputs / read_outputs.
+    '''
+    ident = "".join(c if c.isalnum() or c == "_" else "_" for c in name)
+    if not ident or ident[0].isdigit() or keyword.iskeyword(ident):
+        ident = "_" + ident
+    while ident in RESERVED:
+        ident += "_"
+    return ident
+
+
+class FastFunc:
+    '''
+    Exported function with only numeric params/results. The store
+    context, func handle and the wasmtime_val_t arrays for args and
+    results are set up once, a call just fills the args in. When the
+    wasmtime internals aren't there (FUNC_FAST_PATH False) it calls
+    through the public Func.__call__ instead, same results.
+    '''
+    def __init__(self, store, func, ty):
+        self.func = func
+        self.params = [str(p) for p in ty.params]
+        self.results = [str(r) for r in ty.results]
+        self._store = store
+        self._nargs = len(self.params)
+        self.fast = FUNC_FAST_PATH and hasattr(func, "_func")
+        if not self.fast:
+            return
+        self._ctx = store._context()
+        self._ref = ctypes.byref(func._func)
+        self._args = (ffi.wasmtime_val_t * len(self.params))()
+        for val, kind in zip(self._args, self.params):
+            val.kind = KINDS[kind]
+        self._rets = (ffi.wasmtime_val_t * len(self.results))()
+        self._arg_slots = [(val.of, kind) for val, kind in zip(self._args, self.params)]
+        self._ret_slots = [(val.of, kind) for val, kind in zip(self._rets, self.results)]
+        self._nrets = len(self.results)
+
+    def __call__(self, *args):
+        if len(args) != self._nargs:
+            raise TypeError(f"expected {self._nargs} arguments, got {len(args)}")
+        if not self.fast:
+            return self.func(self._store, *args)
+        for (of, kind), value in zip(self._arg_slots, args):
+            setattr(of, kind, value)
+        trap = ctypes.POINTER(ffi.wasm_trap_t)()
+        error = ffi.wasmtime_func_call(
+            self._ctx, self._ref, self._args, self._nargs, self._rets, self._nrets, ctypes.byref(trap)
+        )
+        if error:
+            raise wasmtime.WasmtimeError._from_ptr(error)
+        if trap:
+            trap_obj = wasmtime.Trap._from_ptr(trap)
+            # a python exception from a host func comes back as a trap
+            maybe_raise_last_exn()
+            raise trap_obj
+        if self._nrets == 0:
+            return None
+        if self._nrets == 1:
+            of, kind = self._ret_slots[0]
+            return getattr(of, kind)
+        return [getattr(of, kind) for of, kind in self._ret_slots]
+
+
+class _GlobalAttr:
+    '''Data descriptor so sim.name reads/writes the global directly.'''
+    def __init__(self, index, name, kind, mutable):
+        self.index = index
+        self.name = name
+        self.kind = kind
+        self.mutable = mutable
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return obj._globals[self.index].get()
+
+    def __set__(self, obj, value):
+        if not self.mutable:
+            raise AttributeError(f"global {self.name!r} is immutable")
+        obj._globals[self.index].set(value)
+
+
+def _is_numeric_func(ty):
+    return all(str(t) in KINDS for t in list(ty.params) + list(ty.results))
+
+
+class Binding:
+    '''
+    Base for the generated classes. input_names / output_names are the
+    numeric imported / exported globals in module order.
+    '''
+    input_names = ()
+    output_names = ()
+    func_names = ()
+
+    def __init__(self, engine, module, store=None, imports=None, host_funcs=None, externs=None):
+        self.store = store or wasmtime.Store(engine)
+        self.module = module
+        imports = imports or {}
+        host_funcs = host_funcs or {}
+        externs = externs or {}
+
+        self._globals = []
+        self.imported = {}
+        linked = []
+        for imp in module.imports:
+            key = f"{imp.module}.{imp.name}"
+            ty = imp.type
+            if key in externs or imp.name in externs:
+                item = externs.get(key, externs.get(imp.name))
+            elif isinstance(ty, wasmtime.GlobalType):
+                value = imports.get(key, imports.get(imp.name, 0))
+                item = wasmtime.Global(self.store, ty, _val(ty.content, value))
+            elif isinstance(ty, wasmtime.FuncType):
+                func = host_funcs.get(key, host_funcs.get(imp.name))
+                if func is None:
+                    raise LookupError(f"no host function given for import {key}")
+                item = wasmtime.Func(self.store, ty, func)
+            else:
+                raise LookupError(f"import {key} is a {type(ty).__name__}, pass it in externs")
+            linked.append(item)
+            self.imported[imp.name] = item
+        self.instance = wasmtime.Instance(self.store, module, linked)
+
+        exports = self.instance.exports(self.store)
+        self.exports = {}
+        for name in self._global_order:
+            self._globals.append(ScalarGlobal(self.store, self.imported.get(name) or exports[name]))
+        for name in self.func_names:
+            func = exports[name]
+            ty = func.type(self.store)
+            call = FastFunc(self.store, func, ty) if _is_numeric_func(ty) else _bound(func, self.store)
+            setattr(self, _attr_name(name), call)
+            self.exports[name] = call
+        for exp in module.exports:
+            if exp.name not in self.exports and exp.name not in self._global_index:
+                # memories, tables and non numeric globals as plain handles
+                self.exports[exp.name] = exports[exp.name]
+                if not hasattr(self, _attr_name(exp.name)):
+                    setattr(self, _attr_name(exp.name), exports[exp.name])
+
+        self._inputs = [self._globals[self._global_index[n]] for n in self.input_names]
+        self._outputs = [self._globals[self._global_index[n]] for n in self.output_names]
+
+    def set_inputs(self, values=None, **kwargs):
+        '''Set imported globals from a dict and/or keywords.'''
+        for source in (values or {}, kwargs):
+            for name, value in source.items():
+                self._globals[self._global_index[name]].set(value)
+
+    def set_row(self, row, names=None):
+        '''
+        Set globals from a sequence or NumPy row, in input_names order
+        unless names is given.
+        '''
+        targets = self._inputs if names is None else [self._globals[self._global_index[n]] for n in names]
+        values = row.tolist() if hasattr(row, "tolist") else row
+        if len(values) != len(targets):
+            raise ValueError(f"row has {len(values)} values for {len(targets)} globals")
+        for glob, value in zip(targets, values):
+            glob.set(value)
+
+    def read_outputs(self):
+        return {name: glob.get() for name, glob in zip(self.output_names, self._outputs)}
+
+    def read_row(self, out=None, names=None):
+        '''Exported globals as a list, or written into out (e.g. a NumPy row).'''
+        sources = self._outputs if names is None else [self._globals[self._global_index[n]] for n in names]
+        values = [glob.get() for glob in sources]
+        if out is None:
+            return values
+        out[:] = values
+        return out
+
+    def snapshot(self):
+        '''Every mutable global, imported or exported.'''
+        return {name: glob.get() for name, glob in zip(self._global_order, self._globals) if glob.mutable}
+
+    def restore(self, state):
+        for name, value in state.items():
+            self._globals[self._global_index[name]].set(value)
+
+
+# every attribute a Binding has before the generated ones go on
+RESERVED = frozenset(dir(Binding)) | {
+    "store", "module", "imported", "instance", "exports", "_globals", "_inputs", "_outputs",
+    "_global_order", "_global_index",
+}
+
+
+def _val(kind, value):
+    kind = str(kind)
+    if kind == "i32":
+        return wasmtime.Val.i32(int(value))
+    if kind == "i64":
+        return wasmtime.Val.i64(int(value))
+    if kind == "f32":
+        return wasmtime.Val.f32(float(value))
+    if kind == "f64":
+        return wasmtime.Val.f64(float(value))
+    return value
+
+
+def _bound(func, store):
+    def call(*args):
+        return func(store, *args)
+    call.__name__ = "wasm_call"
+    return call
+
+
+_class_cache = {}
+
+
+def signature(module):
+    '''Hashable description of everything bind() cares about.'''
+    return (
+        tuple((imp.module, imp.name, str(imp.type)) for imp in module.imports),
+        tuple((exp.name, str(exp.type)) for exp in module.exports),
+    )
+
+
+def binding_class(module, name="WasmBinding"):
+    '''Generate (or fetch the cached) Binding subclass for this module's signature.'''
+    key = (name, signature(module))
+    cls = _class_cache.get(key)
+    if cls is not None:
+        return cls
+
+    attrs = {}
+    owners = {}
+    global_order = []
+    input_names = []
+    output_names = []
+    func_names = []
+
+    def claim(wasm_name):
+        attr = _attr_name(wasm_name)
+        if attr in owners:
+            raise ValueError(f"{wasm_name!r} and {owners[attr]!r} both bind to attribute {attr!r}")
+        owners[attr] = wasm_name
+        return attr
+
+    for imp in module.imports:
+        ty = imp.type
+        if isinstance(ty, wasmtime.GlobalType) and str(ty.content) in KINDS:
+            input_names.append(imp.name)
+            attrs[claim(imp.name)] = _GlobalAttr(len(global_order), imp.name, str(ty.content), ty.mutable)
+            global_order.append(imp.name)
+    for exp in module.exports:
+        ty = exp.type
+        if isinstance(ty, wasmtime.GlobalType) and str(ty.content) in KINDS:
+            output_names.append(exp.name)
+            attrs[claim(exp.name)] = _GlobalAttr(len(global_order), exp.name, str(ty.content), ty.mutable)
+            global_order.append(exp.name)
+        elif isinstance(ty, wasmtime.FuncType):
+            claim(exp.name)
+            func_names.append(exp.name)
+
+    attrs.update(
+        input_names=tuple(input_names),
+        output_names=tuple(output_names),
+        func_names=tuple(func_names),
+        _global_order=tuple(global_order),
+        _global_index={n: i for i, n in enumerate(global_order)},
+    )
+    cls = type(name, (Binding,), attrs)
+    _class_cache[key] = cls
+    return cls
+
+
+def bind(engine, module, store=None, imports=None, host_funcs=None, externs=None, name="WasmBinding"):
+    '''
+    Instantiate module behind its generated binding class.
+
+    imports:    {name or "module.name": value} initial values for imported globals (default 0)
+    host_funcs: {name or "module.name": callable} for imported functions
+    externs:    {name or "module.name": Memory/Table/Global/Func} to link as is
+    '''
+    cls = binding_class(module, name)
+    return cls(engine, module, store=store, imports=imports, host_funcs=host_funcs, externs=externs)
+
+
+def stub(module, name="WasmBinding"):
+    '''The generated facade as .pyi style text.'''
+    lines = [f"class {name}(Binding):"]
+    for imp in module.imports:
+        ty = imp.type
+        if isinstance(ty, wasmtime.GlobalType) and str(ty.content) in KINDS:
+            note = "" if ty.mutable else "  # immutable"
+            lines.append(f"    {_attr_name(imp.name)}: {PY_TYPES[str(ty.content)]}  # import {imp.module}.{imp.name}{note}")
+    for exp in module.exports:
+        ty = exp.type
+        if isinstance(ty, wasmtime.GlobalType) and str(ty.content) in KINDS:
+            note = "" if ty.mutable else "  # immutable"
+            lines.append(f"    {_attr_name(exp.name)}: {PY_TYPES[str(ty.content)]}{note}")
+        elif isinstance(ty, wasmtime.FuncType):
+            params = ", ".join(f"arg{i}: {PY_TYPES.get(str(p), 'object')}" for i, p in enumerate(ty.params))
+            results = [PY_TYPES.get(str(r), "object") for r in ty.results]
+            ret = "None" if not results else results[0] if len(results) == 1 else f"list[{' | '.join(sorted(set(results)))}]"
+            lines.append(f"    def {_attr_name(exp.name)}(self{', ' if params else ''}{params}) -> {ret}: ...")
+        else:
+            lines.append(f"    {_attr_name(exp.name)}: wasmtime.{type(ty).__name__.replace('Type', '')}")
+    return "\n".join(lines)
+
+
+def check_fast_path():
+    '''
+    Calls a tiny module through FastFunc and bind() and says whether the
+    wasmtime internals fast path or the public API fallback is in use.
+    '''
+    from . import raw_globals
+
+    raw_globals.check_fast_path()
+    engine = wasmtime.Engine()
+    module = wasmtime.Module(engine, """
+        (module
+          (global (export "out") (mut f64) (f64.const 0))
+          (func (export "scale") (param f64 i32) (result f64)
+            (global.set 0 (f64.mul (local.get 0) (f64.convert_i32_s (local.get 1))))
+            (global.get 0)))
+    """)
+    sim = bind(engine, module)
+    if not sim.scale(1.5, 3) == sim.out == 4.5:
+        raise RuntimeError("FastFunc round trip failed")
+    path = "C API fast path" if FUNC_FAST_PATH else "public Func.__call__ fallback"
+    print(f"Py Info - FastFunc calls go through the {path}")
+    return FUNC_FAST_PATH
+
+
+if __name__ == "__main__":
+    from .module_cache import load_module
+
+    if not sys.argv[1:] or sys.argv[1] == "--check":
+        check_fast_path()
+    for path in sys.argv[1:]:
+        if path == "--check":
+            continue
+        engine = wasmtime.Engine()
+        print(f"# {path}")
+        print(stub(load_module(engine, path)))
+        print()
@@ -0,0 +1,276 @@
+'''
+Per scan execution budgets for guest controllers.
+
+The engine is built with fuel consumption and epoch interruption on
+(BUDGET_CONFIG, also part of the module cache key since it changes the
+compiled code). Before every scan the store gets a fuel budget, a
+deterministic instruction count, and an epoch deadline, a wall clock
+bound driven by an EpochTicker thread bumping the engine epoch.
+
+ScanBudget runs one scan under those limits:
+    - fuel used and wall time of every exported call made through
+      budget.call() go into a CostProfile per export, plus one for the
+      whole scan
+    - if the guest runs out of fuel or hits the epoch deadline, the trap
+      is caught, the guest globals are rolled back to where they were
+      before the scan and the last good outputs are returned instead.
+      Only globals are rolled back, not linear memory, so a controller
+      that keeps state in memory can be left with a half finished scan
+      there
+    - capacity() turns the profile into zones per CPU at a scan rate
+
+    engine = budget_engine()
+    sim = bind(engine, load_module(engine, "complete_sim.wat"))
+    budget = ScanBudget.for_binding(sim, fuel_per_scan=5000)
+    outputs = budget.scan(lambda: budget.call("control_logic", sim.control_logic))
+
+$ python -m wasm_host.budget
+'''
+
+import threading
+import time
+from collections import deque
+
+import wasmtime
+
+from .module_cache import make_engine
+
+BUDGET_CONFIG = {"consume_fuel": True, "epoch_interruption": True}
+BUDGET_TRAPS = (wasmtime.TrapCode.OUT_OF_FUEL, wasmtime.TrapCode.INTERRUPT)
+PROFILE_SAMPLES = 1000
+# epoch deadline per scan, in EpochTicker intervals (100 ms at the 1 ms default)
+DEFAULT_EPOCH_TICKS = 100
+
+
+def budget_engine(config=None):
+    '''Engine with fuel + epochs on, extra wasmtime.Config settings merged in.'''
+    return make_engine({**BUDGET_CONFIG, **(config or {})})
+
+
+class EpochTicker:
+    '''Background thread that bumps engine's epoch every interval seconds.'''
+    def __init__(self, engine, interval=0.001):
+        self.engine = engine
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="epoch-ticker", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.engine.increment_epoch()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class CostProfile:
+    '''Fuel and wall time per call, recent samples kept for percentiles.'''
+    def __init__(self, name, samples=PROFILE_SAMPLES):
+        self.name = name
+        self.calls = 0
+        self.overruns = 0
+        self.fuel_total = 0
+        self.fuel_max = 0
+        self.ns_total = 0
+        self.fuel = deque(maxlen=samples)
+        self.ns = deque(maxlen=samples)
+
+    def record(self, fuel, ns, ok=True):
+        self.calls += 1
+        if not ok:
+            self.overruns += 1
+        self.fuel_total += fuel
+        self.fuel_max = max(self.fuel_max, fuel)
+        self.ns_total += ns
+        self.fuel.append(fuel)
+        self.ns.append(ns)
+
+    def stats(self):
+        fuel = sorted(self.fuel)
+        ns = sorted(self.ns)
+        n = len(fuel)
+        p = lambda values, q: values[min(n - 1, int(n * q))] if n else 0
+        return {
+            "calls": self.calls,
+            "overruns": self.overruns,
+            "fuel_avg": self.fuel_total / self.calls if self.calls else 0.0,
+            "fuel_p50": p(fuel, 0.5),
+            "fuel_p99": p(fuel, 0.99),
+            "fuel_max": self.fuel_max,
+            "us_avg": self.ns_total / self.calls / 1000 if self.calls else 0.0,
+            "us_p99": p(ns, 0.99) / 1000,
+            "fuel_per_sec": self.fuel_total / (self.ns_total / 1e9) if self.ns_total else 0.0,
+        }
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, name, trap):
+        super().__init__(f"{name} went over its scan budget ({trap.trap_code.name})")
+        self.name = name
+        self.trap = trap
+
+
+class ScanBudget:
+    '''
+    Budget, cost profile and last good outputs for one controller
+    (one Store). snapshot()/restore() capture and put back the guest
+    state, read_outputs() gives what a good scan produced.
+
+    epoch_ticks is the wall clock bound, in engine epoch increments. The
+    deadline is set before every scan since an engine with epoch
+    interruption on traps any call past a deadline of 0. It only bites
+    while something (an EpochTicker) bumps the epoch.
+    '''
+    def __init__(self, store, snapshot, restore, read_outputs, fuel_per_scan=100_000,
+                 epoch_ticks=DEFAULT_EPOCH_TICKS):
+        if epoch_ticks is None or epoch_ticks < 1:
+            raise ValueError(f"epoch_ticks must be at least 1, got {epoch_ticks!r}")
+        self.store = store
+        self.snapshot = snapshot
+        self.restore = restore
+        self.read_outputs = read_outputs
+        self.fuel_per_scan = fuel_per_scan
+        self.epoch_ticks = epoch_ticks
+        self.profiles = {}
+        self.scan_profile = CostProfile("scan")
+        self.last_good = read_outputs()
+        self.last_error = None
+        self.fallbacks = 0
+
+    @classmethod
+    def for_binding(cls, binding, **kwargs):
+        '''Budget for a wasm_host.bindings object.'''
+        return cls(binding.store, binding.snapshot, binding.restore, binding.read_outputs, **kwargs)
+
+    def profile(self, name):
+        prof = self.profiles.get(name)
+        if prof is None:
+            prof = self.profiles[name] = CostProfile(name)
+        return prof
+
+    def call(self, name, func, *args):
+        '''Call an export inside a scan, charging its fuel to name's profile.'''
+        fuel_before = self.store.get_fuel()
+        start = time.perf_counter_ns()
+        try:
+            result = func(*args)
+        except wasmtime.Trap as trap:
+            used = fuel_before - self.store.get_fuel()
+            self.profile(name).record(used, time.perf_counter_ns() - start, ok=False)
+            if trap.trap_code in BUDGET_TRAPS:
+                raise BudgetExceeded(name, trap) from trap
+            raise
+        self.profile(name).record(fuel_before - self.store.get_fuel(), time.perf_counter_ns() - start)
+        return result
+
+    def scan(self, scan_func):
+        '''
+        Run scan_func under the per scan budget. Returns the fresh outputs,
+        or the last good ones if the guest blew its budget. Exports called
+        through budget.call() get their own cost profile, a budget trap
+        from an export called directly is charged to the scan.
+        '''
+        state = self.snapshot()
+        self.store.set_fuel(self.fuel_per_scan)
+        self.store.set_epoch_deadline(self.epoch_ticks)
+        start = time.perf_counter_ns()
+        try:
+            try:
+                scan_func()
+            except wasmtime.Trap as trap:
+                if trap.trap_code not in BUDGET_TRAPS:
+                    raise
+                raise BudgetExceeded("scan", trap) from trap
+        except BudgetExceeded as e:
+            self.scan_profile.record(self.fuel_per_scan - self.store.get_fuel(), time.perf_counter_ns() - start, ok=False)
+            # a trap can land halfway through the guest's global updates
+            self.restore(state)
+            self.last_error = e
+            self.fallbacks += 1
+            return self.last_good
+        self.scan_profile.record(self.fuel_per_scan - self.store.get_fuel(), time.perf_counter_ns() - start)
+        self.last_good = self.read_outputs()
+        return self.last_good
+
+    def report(self):
+        report = {"scan": self.scan_profile.stats(), "fallbacks": self.fallbacks}
+        report.update({name: prof.stats() for name, prof in self.profiles.items()})
+        return report
+
+    def capacity(self, scan_hz, cpu_share=0.7):
+        '''
+        Zones that fit on one CPU at scan_hz, from the measured average
+        and p99 time per scan (host overhead included).
+        '''
+        stats = self.scan_profile.stats()
+        budget_secs = cpu_share / scan_hz
+        fit = lambda us: int(budget_secs / (us / 1e6)) if us else 0
+        return {"scan_hz": scan_hz, "cpu_share": cpu_share,
+                "zones_avg": fit(stats["us_avg"]), "zones_p99": fit(stats["us_p99"])}
+
+
+# spins when the input is over 100, stands in for a guest bug
+RUNAWAY_WAT = '''
+(module
+  (import "env" "zone_air_temp" (global $t (mut f64)))
+  (global $out (mut f64) (f64.const 0))
+  (global $scans (mut i32) (i32.const 0))
+  (func (export "control_logic")
+    (global.set $scans (i32.add (global.get $scans) (i32.const 1)))
+    (global.set $out (f64.mul (global.get $t) (f64.const 2)))
+    (if (f64.gt (global.get $t) (f64.const 100))
+      (then (loop $spin (br $spin)))))
+  (export "out" (global $out))
+  (export "scans" (global $scans)))
+'''
+
+
+def demo(scans=2000):
+    import os
+    from .bindings import bind
+    from .module_cache import load_module
+
+    wat = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                       "vav-box-pid-setpoints-calc", "wat", "complete_sim.wat")
+    engine = budget_engine()
+    with EpochTicker(engine, interval=0.001):
+        sim = bind(engine, load_module(engine, wat), imports={"ahu_supply_air_temp": 55.0})
+        budget = ScanBudget.for_binding(sim, fuel_per_scan=5_000, epoch_ticks=50)
+        for i in range(scans):
+            sim.zone_air_temp = 64.0 + (i % 16)
+            budget.scan(lambda: budget.call("control_logic", sim.control_logic))
+        print("complete_sim.wat control_logic cost profile:")
+        for key, value in budget.report()["control_logic"].items():
+            print(f"  {key}: {value:,.1f}" if isinstance(value, float) else f"  {key}: {value}")
+        for hz in (1.0, 10.0):
+            print(f"  capacity at {hz:g} Hz: {budget.capacity(hz)}")
+
+        runaway = bind(engine, wasmtime.Module(engine, RUNAWAY_WAT))
+        budget = ScanBudget.for_binding(runaway, fuel_per_scan=10_000, epoch_ticks=50)
+        for temp in (70.0, 72.0, 500.0, 74.0):
+            runaway.zone_air_temp = temp
+            fallbacks = budget.fallbacks
+            outputs = budget.scan(lambda: budget.call("control_logic", runaway.control_logic))
+            note = f" <- fell back, {budget.last_error}" if budget.fallbacks > fallbacks else ""
+            print(f"runaway zone_air_temp={temp}: outputs {outputs}{note}")
+        print(f"runaway fallbacks: {budget.fallbacks}")
+
+
+if __name__ == "__main__":
+    demo()
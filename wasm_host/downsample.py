@@ -0,0 +1,141 @@
+'''
+Downsampling trends to a pixel budget before they are plotted.
+
+A year of 1 min samples is half a million points per line, and
+matplotlib drawing every one of them takes far longer than the sim that
+made them, for a plot only ~1600 px wide. Two reducers pick which
+samples to keep, as an index array into the original trend:
+
+    minmax - split into width_px buckets and keep each bucket's min and
+             max sample (2 per pixel column). Every spike survives, and
+             it is fully vectorized (one reshape + argmin/argmax).
+    lttb   - Largest Triangle Three Buckets (Steinarsson 2013): keep the
+             one sample per bucket that makes the biggest triangle with
+             the sample kept in the previous bucket and the mean of the
+             next bucket. Closest to the shape of the line, one numpy
+             pass per bucket.
+
+Both keep the first and last sample and assume x is sorted.
+plot_trend() downsamples every column of a trend (open_binary_trend()
+columns or any {name: array}) and renders it, importing matplotlib only
+then.
+
+$ python -m wasm_host.downsample  # samples/sec for both reducers
+'''
+
+import time
+
+import numpy as np
+
+from .startup import import_pyplot, timed
+
+METHODS = ("minmax", "lttb")
+
+
+def minmax_indices(y, width_px):
+    '''Indexes of the min and max sample in each of width_px buckets, sorted.'''
+    n = len(y)
+    if n <= 2 * width_px:
+        return np.arange(n)
+    size = -(-n // width_px)
+    buckets = -(-n // size)
+    # pad the last bucket with its last sample so every bucket reshapes
+    padded = np.empty(buckets * size)
+    padded[:n] = y
+    padded[n:] = y[-1]
+    grid = padded.reshape(buckets, size)
+    base = np.arange(buckets) * size
+    pair = np.stack((base + grid.argmin(axis=1), base + grid.argmax(axis=1)), axis=1)
+    pair.sort(axis=1)
+    idx = np.minimum(pair.ravel(), n - 1)
+    idx = np.concatenate(([0], idx, [n - 1]))
+    return idx[np.concatenate(([True], np.diff(idx) > 0))]
+
+
+def lttb_indices(x, y, n_out):
+    '''Indexes of the n_out samples Largest Triangle Three Buckets keeps.'''
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # bucket i covers [edges[i], edges[i + 1]), first and last sample are their own buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    idx = np.empty(n_out, dtype=np.intp)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            cx = x[hi:edges[i + 2]].mean()
+            cy = y[hi:edges[i + 2]].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        ax, ay = x[a], y[a]
+        # twice the triangle area, the 1/2 doesn't change the argmax
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        area[np.isnan(area)] = -1.0
+        a = lo + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+
+def downsample(x, y, width_px=1600, method="minmax"):
+    '''(x, y) cut down to about 2 * width_px (minmax) or width_px (lttb) samples.'''
+    if method == "minmax":
+        idx = minmax_indices(y, width_px)
+    elif method == "lttb":
+        idx = lttb_indices(x, y, width_px)
+    else:
+        raise ValueError(f"method must be one of {METHODS}")
+    return np.asarray(x[idx]), np.asarray(y[idx])
+
+
+def plot_trend(trend, path, points=None, width_px=1600, method="minmax", x="t", title=None):
+    '''
+    One subplot per point (all columns but x if None), downsampled to
+    width_px first. method=None plots every sample. Saves to path and
+    returns it, or returns None if matplotlib isn't installed.
+    '''
+    points = [name for name in trend if name != x] if points is None else list(points)
+    t = trend[x]
+    with timed("downsample"):
+        lines = {}
+        for name in points:
+            lines[name] = (np.asarray(t), np.asarray(trend[name])) if method is None else \
+                downsample(t, trend[name], width_px, method)
+    plt = import_pyplot()
+    if plt is None:
+        print("Py Info - matplotlib not installed (pip install matplotlib), skipping the plot")
+        return None
+    with timed("render"):
+        dpi = 100
+        fig, axes = plt.subplots(len(points), 1, sharex=True, squeeze=False,
+                                 figsize=(width_px / dpi, 2.0 * len(points)), dpi=dpi)
+        for ax, name in zip(axes[:, 0], points):
+            ax.plot(*lines[name], linewidth=0.8)
+            ax.set_ylabel(name, fontsize=8)
+            ax.grid(True, alpha=0.3)
+        axes[-1, 0].set_xlabel(x)
+        if title:
+            fig.suptitle(title)
+        fig.tight_layout()
+        fig.savefig(path)
+        plt.close(fig)
+    return path
+
+
+def benchmark(sizes=(100_000, 1_000_000, 10_000_000), width_px=1600):
+    rng = np.random.default_rng(25)
+    for n in sizes:
+        x = np.arange(n, dtype=np.float64)
+        y = np.cumsum(rng.normal(0.0, 0.1, n))
+        for method in METHODS:
+            start = time.perf_counter()
+            kept = len(downsample(x, y, width_px, method)[0])
+            secs = time.perf_counter() - start
+            print(f"{method:>6} {n:>12,} -> {kept:>5,} samples: {secs * 1000:>8.1f} ms, {n / secs:>14,.0f} samples/sec")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,145 @@
+'''
+Hot swap a running controller module without losing its PID state.
+
+Redeploying complete_sim.wat (or the Rust firmware) used to mean a new
+Store, so integral_heating / integral_cooling and mode went back to
+their defaults and the zone got a control bump. HotSwap keeps the
+running controller scanning while the new build is compiled (through
+the module cache) and instantiated in its own Store on a background
+thread. The wasmtime C calls release the GIL, so the scan loop keeps
+its timing. The next scan() after it is ready does the switch before
+running:
+
+    1. export_state(old) -> {name: value}
+    2. import_state(new, state) for every name the new build also has
+    3. the new controller runs this scan, the old one is dropped
+
+No scan is skipped. The switch itself is a few global reads/writes,
+and its latency is logged along with the compile time and the state
+diff: what was carried over, the new build's default it replaced,
+and names only one side has.
+
+    swap = HotSwap.for_binding(engine, "complete_sim.wat", imports={...})
+    swap.scan(lambda sim: sim.control_logic())
+    swap.stage("complete_sim_v2.wat")       # returns right away
+    swap.scan(lambda sim: sim.control_logic())   # swaps here once compiled
+'''
+
+import threading
+import time
+
+from .bindings import bind
+from .module_cache import load_module
+
+
+class HotSwap:
+    '''
+    load(source) builds a ready to run controller. export_state /
+    import_state move its state between builds, state being a plain
+    {name: number} dict.
+    '''
+    def __init__(self, load, export_state, import_state, source, name="controller", log=print):
+        self.load = load
+        self.export_state = export_state
+        self.import_state = import_state
+        self.name = name
+        self.log = log
+        self.source = source
+        self.current = load(source)
+        self.generation = 0
+        self.history = []
+        self._lock = threading.Lock()
+        self._pending = None
+        self._thread = None
+        self.last_error = None
+
+    @classmethod
+    def for_binding(cls, engine, source, imports=None, **kwargs):
+        '''
+        A .wat/.wasm behind wasm_host.bindings. State is every mutable
+        global (imported inputs included), so the new build also starts
+        from the live input values.
+        '''
+        def load(path):
+            return bind(engine, load_module(engine, path), imports=imports)
+
+        def import_state(binding, state):
+            kinds = {name: binding._globals[i].kind for name, i in binding._global_index.items()}
+            binding.restore({
+                name: int(value) if kinds[name] in ("i32", "i64") else float(value)
+                for name, value in state.items()
+            })
+
+        return cls(load, lambda b: b.snapshot(), import_state, source, **kwargs)
+
+    def stage(self, source, wait=False):
+        '''Compile and instantiate source in the background, swap at the next scan.'''
+        if self._thread is not None and self._thread.is_alive():
+            raise RuntimeError(f"{self.name}: a swap to {self._thread.name} is already being staged")
+        self._thread = threading.Thread(target=self._build, args=(source,), name=str(source), daemon=True)
+        self._thread.start()
+        if wait:
+            self._thread.join()
+        return self._thread
+
+    def _build(self, source):
+        start = time.perf_counter()
+        try:
+            controller = self.load(source)
+        except Exception as e:
+            # keep running the old build
+            self.last_error = e
+            self.log(f"Py Info - {self.name}: staging {source} failed, still on {self.source}: {e}")
+            return
+        with self._lock:
+            self._pending = (source, controller, time.perf_counter() - start)
+
+    @property
+    def pending(self):
+        return self._pending is not None
+
+    def scan(self, scan_func):
+        '''scan_func(controller) on whichever build is live, swapping first if one is ready.'''
+        if self._pending is not None:
+            self._swap()
+        return scan_func(self.current)
+
+    def _swap(self):
+        with self._lock:
+            source, controller, build_secs = self._pending
+            self._pending = None
+        start = time.perf_counter()
+        old_state = self.export_state(self.current)
+        new_defaults = self.export_state(controller)
+        carried = {name: value for name, value in old_state.items() if name in new_defaults}
+        self.import_state(controller, carried)
+        old_source = self.source
+        self.current = controller
+        self.source = source
+        self.generation += 1
+        swap_secs = time.perf_counter() - start
+
+        record = {
+            "generation": self.generation,
+            "from": old_source,
+            "to": source,
+            "build_ms": build_secs * 1000,
+            "swap_us": swap_secs * 1e6,
+            # name -> (carried over value, what the new build would have started with)
+            "diff": {n: (v, new_defaults[n]) for n, v in carried.items() if v != new_defaults[n]},
+            "dropped": sorted(set(old_state) - set(new_defaults)),
+            "added": sorted(set(new_defaults) - set(old_state)),
+        }
+        self.history.append(record)
+        self.log(
+            f"Py Info - {self.name}: swapped to {source} (gen {self.generation}), "
+            f"build {record['build_ms']:.1f} ms in background, switch {record['swap_us']:.0f} us, "
+            f"{len(carried)} state values carried, {len(record['diff'])} differ from the new defaults"
+        )
+        for name, (value, default) in record["diff"].items():
+            self.log(f"  {name}: {value!r} (new build default {default!r})")
+        if record["dropped"]:
+            self.log(f"  not in new build: {', '.join(record['dropped'])}")
+        if record["added"]:
+            self.log(f"  new in this build (defaults kept): {', '.join(record['added'])}")
+        return record
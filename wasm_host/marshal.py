@@ -0,0 +1,199 @@
+'''
+Zero copy string / buffer marshalling between Python and guest linear
+memory.
+
+The old helpers in run_wasm.py did one memory.read per byte until they
+hit the NUL, and wrote strings at data_len - len which stomps on
+whatever the guest keeps at the top of memory. Here the guest memory is
+viewed in place through Memory.get_buffer_ptr() (no copy), the
+terminator is found with one memchr over the guest bytes and guest
+buffers come from the module's exported alloc/dealloc.
+
+Guest side (Rust):
+    #[no_mangle]
+    pub extern "C" fn alloc(size: usize) -> *mut u8
+    #[no_mangle]
+    pub extern "C" fn dealloc(ptr: *mut u8, size: usize)
+
+Run the read microbenchmark:
+    $ python -m wasm_host.marshal
+'''
+
+import ctypes
+import ctypes.util
+import sys
+import time
+from contextlib import contextmanager
+
+import wasmtime
+
+
+def _load_memchr():
+    try:
+        if sys.platform == "win32":
+            libc = ctypes.cdll.msvcrt
+        else:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"))
+        memchr = libc.memchr
+    except (OSError, AttributeError, TypeError):
+        return None
+    memchr.restype = ctypes.c_void_p
+    memchr.argtypes = (ctypes.c_void_p, ctypes.c_int, ctypes.c_size_t)
+    return memchr
+
+
+_memchr = _load_memchr()
+FIND_CHUNK = 4096
+
+
+def memory_view(memory, store):
+    '''
+    Writable memoryview over the whole guest memory, no copy. Take a
+    new one after anything that can grow memory (guest alloc, memory.grow).
+    '''
+    return memoryview(memory.get_buffer_ptr(store)).cast("B")
+
+
+def find_nul(memory, store, ptr):
+    '''Offset of the first NUL at or after ptr, or -1 if memory ends first.'''
+    size = memory.data_len(store)
+    if ptr < 0 or ptr >= size:
+        raise IndexError(f"pointer {ptr} outside guest memory ({size} bytes)")
+    base = ctypes.addressof(memory.data_ptr(store).contents)
+    if _memchr is not None:
+        hit = _memchr(base + ptr, 0, size - ptr)
+        return hit - base if hit else -1
+    # no libc: bounded chunked find on the zero copy view
+    view = memory_view(memory, store)
+    start = ptr
+    while start < size:
+        stop = min(start + FIND_CHUNK, size)
+        found = bytes(view[start:stop]).find(b"\x00")
+        if found >= 0:
+            return start + found
+        start = stop
+    return -1
+
+
+def read_c_string(memory, store, ptr, encoding="utf-8"):
+    end = find_nul(memory, store, ptr)
+    if end < 0:
+        raise ValueError(f"no NUL terminator after pointer {ptr}")
+    base = ctypes.addressof(memory.data_ptr(store).contents)
+    return ctypes.string_at(base + ptr, end - ptr).decode(encoding)
+
+
+def read_bytes(memory, store, ptr, size):
+    return bytes(memory_view(memory, store)[ptr:ptr + size])
+
+
+class GuestMemory:
+    '''
+    Marshalling helpers bound to one instance: its memory plus the
+    exported alloc/dealloc, resolved once.
+    '''
+    def __init__(self, instance, store, memory_name="memory", alloc_name="alloc", dealloc_name="dealloc"):
+        exports = instance.exports(store)
+        self.store = store
+        self.memory = exports[memory_name]
+        self._alloc = exports[alloc_name] if alloc_name in exports else None
+        self._dealloc = exports[dealloc_name] if dealloc_name in exports else None
+
+    def view(self):
+        return memory_view(self.memory, self.store)
+
+    def read_c_string(self, ptr, encoding="utf-8"):
+        return read_c_string(self.memory, self.store, ptr, encoding)
+
+    def read_bytes(self, ptr, size):
+        return read_bytes(self.memory, self.store, ptr, size)
+
+    def read_array(self, ptr, dtype, count):
+        '''numpy array copied out of guest memory (numpy only needed here).'''
+        import numpy as np
+        dtype = np.dtype(dtype)
+        return np.frombuffer(self.view(), dtype=dtype, count=count, offset=ptr).copy()
+
+    def alloc(self, size):
+        if self._alloc is None:
+            raise RuntimeError("module does not export an allocator (alloc/dealloc)")
+        ptr = self._alloc(self.store, size)
+        if ptr == 0:
+            raise MemoryError(f"guest alloc({size}) failed")
+        return ptr
+
+    def free(self, ptr, size):
+        if self._dealloc is not None:
+            self._dealloc(self.store, ptr, size)
+
+    def write_bytes(self, data):
+        '''
+        Copy data into a fresh guest buffer. Returns (ptr, size), free it
+        with free(ptr, size). size is what was allocated, which is 1 for
+        empty data since a zero size alloc is not allowed guest side.
+        '''
+        size = max(len(data), 1)
+        ptr = self.alloc(size)
+        # view taken after alloc since alloc can grow memory
+        self.view()[ptr:ptr + len(data)] = data
+        return ptr, size
+
+    def write_c_string(self, string, encoding="utf-8"):
+        return self.write_bytes(string.encode(encoding) + b"\x00")
+
+    @contextmanager
+    def c_string(self, string, encoding="utf-8"):
+        '''Guest copy of string for the length of a with block.'''
+        ptr, size = self.write_c_string(string, encoding)
+        try:
+            yield ptr
+        finally:
+            self.free(ptr, size)
+
+
+def read_c_string_bytewise(memory, store, ptr):
+    '''The original run_wasm.py reader, kept for the benchmark.'''
+    result_bytes = []
+    offset = 0
+    while True:
+        byte = memory.read(store, start=ptr + offset, stop=ptr + offset + 1)[0]
+        if byte == 0:
+            break
+        result_bytes.append(byte)
+        offset += 1
+    return bytes(result_bytes).decode('utf-8')
+
+
+def sample_config_string(n_zones):
+    '''Looks like the AHU air manager's Debug formatted zone output.'''
+    return "{" + ", ".join(
+        f'"zone{i}": Some({500.0 + i * 3.25:.4f})' for i in range(n_zones)
+    ) + "}"
+
+
+def benchmark(repeats=20):
+    store = wasmtime.Store()
+    memory = wasmtime.Memory(store, wasmtime.MemoryType(wasmtime.Limits(4, None)))
+    for n_zones in (4, 40, 400):
+        text = sample_config_string(n_zones)
+        data = text.encode() + b"\x00"
+        ptr = 1024
+        memory.write(store, data, ptr)
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            old = read_c_string_bytewise(memory, store, ptr)
+        old_secs = (time.perf_counter() - start) / repeats
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            new = read_c_string(memory, store, ptr)
+        new_secs = (time.perf_counter() - start) / repeats
+
+        assert old == new == text
+        print(f"{len(data):>7} byte string: byte at a time {old_secs * 1e6:10.1f} us, "
+              f"memchr {new_secs * 1e6:7.1f} us ({old_secs / new_secs:,.0f}x)")
+
+
+if __name__ == "__main__":
+    benchmark()
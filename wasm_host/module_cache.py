@@ -0,0 +1,247 @@
+'''
+On disk cache of compiled wasmtime modules.
+
+Compiling a .wasm/.wat with Cranelift is the slow part of starting a
+runner on an edge box. The first load compiles and saves the result of
+Module.serialize(), every load after that is Module.deserialize_file()
+which is just an mmap of native code.
+
+Cache entries are keyed by a sha256 of the module bytes, the engine
+config settings, the wasmtime version and the host CPU so a stale or
+foreign artifact is never handed to the wrong engine. The config is
+taken from the engine itself: make_engine() records the settings it
+built each engine with, and any other engine (a plain wasmtime.Engine())
+counts as default settings. wasmtime also refuses to deserialize an
+artifact compiled for different settings, so an engine built by hand
+from a custom Config costs a recompile, never a wrong module. The cache
+is kept under a size / entry count bound by evicting the least recently
+used entries (by file mtime, which gets bumped on every hit).
+
+The cache never stops a module from loading. A cache dir that can't be
+created or written (read only rootfs, full disk) is a RuntimeWarning
+and the freshly compiled module is returned as if there were no cache.
+
+Usage:
+    engine = make_engine({"consume_fuel": True})
+    module = load_module(engine, "./complete_sim.wat")
+
+Check cold vs warm startup for a module:
+    $ python -m wasm_host.module_cache ./vav-box-pid-setpoints-calc/wat/complete_sim.wat
+'''
+
+import hashlib
+import os
+import platform
+import sys
+import time
+import warnings
+import weakref
+from importlib import metadata
+
+import wasmtime
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "WASM_MODULE_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "wasm-iot-box", "modules"),
+)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 64
+CACHE_EXT = ".cwasm"
+# engine -> the config dict make_engine() built it from
+_ENGINE_CONFIGS = weakref.WeakKeyDictionary()
+
+
+def wasmtime_version():
+    try:
+        return metadata.version("wasmtime")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def make_engine(config=None):
+    '''
+    Build an Engine from a plain dict of wasmtime.Config settings,
+    e.g. {"consume_fuel": True, "cranelift_opt_level": "speed"}.
+    The engine remembers the dict, it is what load_module() hashes into
+    the cache key.
+    '''
+    if not config:
+        return wasmtime.Engine()
+    cfg = wasmtime.Config()
+    for name, value in config.items():
+        setattr(cfg, name, value)
+    engine = wasmtime.Engine(cfg)
+    _ENGINE_CONFIGS[engine] = dict(config)
+    return engine
+
+
+def engine_config(engine):
+    '''The settings make_engine() built engine with, {} for any other engine.'''
+    return _ENGINE_CONFIGS.get(engine, {})
+
+
+def cache_key(module_bytes, config=None):
+    h = hashlib.sha256()
+    h.update(module_bytes)
+    for name, value in sorted((config or {}).items()):
+        h.update(f"|{name}={value!r}".encode())
+    h.update(f"|wasmtime={wasmtime_version()}|{platform.machine()}|{sys.platform}".encode())
+    return h.hexdigest()
+
+
+class LoadRecord:
+    def __init__(self, path, key, hit, seconds):
+        self.path = path
+        self.key = key
+        self.hit = hit
+        self.seconds = seconds
+
+    def __repr__(self):
+        kind = "warm" if self.hit else "cold"
+        return f"LoadRecord({self.path!r}, {kind}, {self.seconds * 1000:.2f} ms)"
+
+
+class ModuleCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.loads = []
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_EXT)
+
+    def load(self, engine, path):
+        '''
+        Return a compiled Module for the .wasm/.wat at path, from the
+        cache when possible.
+        '''
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            module_bytes = f.read()
+        key = cache_key(module_bytes, engine_config(engine))
+        entry = self.entry_path(key)
+
+        module = None
+        if os.path.exists(entry):
+            try:
+                module = wasmtime.Module.deserialize_file(engine, entry)
+            except wasmtime.WasmtimeError:
+                # incompatible or truncated artifact, recompile below
+                self._remove(entry)
+            else:
+                self._touch(entry)
+
+        hit = module is not None
+        if not hit:
+            module = wasmtime.Module(engine, module_bytes)
+            try:
+                self._store(entry, module.serialize())
+                self.evict()
+            except OSError as e:
+                warnings.warn(f"module cache {self.cache_dir} not writable ({e}), {path} was compiled "
+                              "but not cached", RuntimeWarning)
+
+        record = LoadRecord(path, key, hit, time.perf_counter() - start)
+        self.loads.append(record)
+        return module
+
+    def _store(self, entry, data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{entry}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            # atomic so a reader never deserializes a half written file
+            os.replace(tmp, entry)
+        except OSError:
+            self._remove(tmp)
+            raise
+
+    def _touch(self, entry):
+        '''Bump mtime for LRU, a read only cache still serves hits.'''
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+
+    def _remove(self, entry):
+        try:
+            os.remove(entry)
+        except OSError:
+            pass
+
+    def entries(self):
+        '''(mtime, size, path) for every cache entry, oldest first.'''
+        if not os.path.isdir(self.cache_dir):
+            return []
+        found = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(CACHE_EXT):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            found.append((st.st_mtime, st.st_size, path))
+        found.sort()
+        return found
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        while entries and (total > self.max_bytes or len(entries) > self.max_entries):
+            _, size, path = entries.pop(0)
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            self._remove(path)
+
+    def startup_report(self):
+        cold = [r.seconds for r in self.loads if not r.hit]
+        warm = [r.seconds for r in self.loads if r.hit]
+        report = {
+            "cold_loads": len(cold),
+            "warm_loads": len(warm),
+            "cold_ms_avg": 1000 * sum(cold) / len(cold) if cold else None,
+            "warm_ms_avg": 1000 * sum(warm) / len(warm) if warm else None,
+        }
+        for record in self.loads:
+            print(f"Py Info - {record}")
+        return report
+
+
+default_cache = ModuleCache()
+
+
+def load_module(engine, path, cache=None):
+    '''Drop in for wasmtime.Module.from_file(engine, path) that uses the default cache.'''
+    return (cache or default_cache).load(engine, path)
+
+
+def compare_cold_warm(path, config=None, repeats=5):
+    '''Time a forced compile against cache hits for one module.'''
+    cache = ModuleCache()
+    engine = make_engine(config)
+    with open(path, "rb") as f:
+        entry = cache.entry_path(cache_key(f.read(), config))
+    cache._remove(entry)
+    cache.load(engine, path)
+    for _ in range(repeats):
+        cache.load(engine, path)
+    report = cache.startup_report()
+    if report["warm_ms_avg"]:
+        print(f"Cold start {report['cold_ms_avg']:.2f} ms, warm start {report['warm_ms_avg']:.2f} ms "
+              f"({report['cold_ms_avg'] / report['warm_ms_avg']:.1f}x faster)")
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python -m wasm_host.module_cache <module.wasm|module.wat> [...]")
+        sys.exit(1)
+    for module_path in sys.argv[1:]:
+        compare_cold_warm(module_path)
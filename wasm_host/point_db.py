@@ -0,0 +1,347 @@
+'''
+Shared memory point database between field I/O and the controllers.
+
+Sensor values used to get to a controller by hand: a wasmtime.Global
+set per point, or kwargs into VavBoxController / calculate_ahu_percent_oa.
+A PointTable is one mmap backed file with a fixed layout, so a poller
+process can write thousands of points into it and any number of
+controller processes map the same pages and read them in place.
+
+File layout (little endian):
+
+    header   64 bytes: magic, version, n_points, names_len, seq (u64),
+             publish time of bank 0 and bank 1 (f64)
+    names    JSON list of point names, padded to 8 bytes
+    bank 0   n_points float64
+    bank 1   n_points float64
+
+There is one writer per table, and it double buffers. A publish writes
+the back bank and then flips which bank is live. seq is a seqlock
+counter: odd while a publish is in progress, +2 per publish, and the
+live bank is (seq // 2) % 2. A reader grabs the live bank as a numpy
+view (no copy) and runs straight off it. The read is good as long as
+the writer didn't start a second publish in the meantime, which is the
+only way that bank gets written again. read() checks that after the
+fact and re-runs the reader if it was lapped.
+
+    db = PointTable.create("/dev/shm/ahu1.points", point_names(zone_air_temp=500, ahu_supply_air_temp=1))
+    with db.write() as bank:                     # poller
+        bank[db.block("zone_air_temp")] = temps
+    db = PointTable.open("/dev/shm/ahu1.points") # controller
+    zone_temps = db.block("zone_air_temp")
+    db.read(lambda bank: fleet.control_logic(bank[zone_temps]))
+
+The seqlock is plain numpy stores and loads into the mapping with no
+memory barriers. That is only sound on x86, which keeps stores (and
+loads) in program order, so a reader that sees the new seq also sees
+the bank written before it. ARM (the aarch64 edge boxes) may reorder
+them, and a reader could pass stable() on a torn bank. Everywhere else
+(LOCKED) the table file is flock()ed instead: write() holds an
+exclusive lock from the start of the publish to the seq flip, read()
+and snapshot() hold a shared one while func runs. The lock syscalls are
+full barriers, so the seq and bank a reader sees are always the ones
+the last publish left. Set POINT_DB_LOCK=1 to use the lock on x86 too.
+
+Controller outputs go back the same way through a second table the
+controller process owns. SyntheticPoller (below) stands in for the
+field bus poller and python -m wasm_host.point_db measures throughput.
+'''
+
+import json
+import mmap
+import multiprocessing
+import os
+import platform
+import struct
+import time
+import warnings
+from contextlib import contextmanager
+
+import numpy as np
+
+MAGIC = b"PTDB"
+VERSION = 1
+HEADER_SIZE = 64
+# magic, version, n_points, names_len
+_HEADER = struct.Struct("<4sIII")
+SEQ_OFFSET = 16
+BANK_TIME_OFFSET = 24
+# the seqlock needs x86's in order stores/loads, see the module docstring
+ORDERED_MACHINES = ("x86_64", "amd64", "i386", "i686", "x86")
+LOCKED = platform.machine().lower() not in ORDERED_MACHINES or os.environ.get("POINT_DB_LOCK") == "1"
+try:
+    import fcntl
+except ImportError:
+    # Windows, only ever x86 here in practice
+    fcntl = None
+
+
+def point_names(**blocks):
+    '''
+    Layout from block sizes: point_names(zone_air_temp=3, oat=1) ->
+    ["zone_air_temp[0]", "zone_air_temp[1]", "zone_air_temp[2]", "oat"].
+    A block's points are contiguous, so PointTable.block() is a slice.
+    '''
+    names = []
+    for name, size in blocks.items():
+        names.extend([name] if size == 1 else [f"{name}[{i}]" for i in range(size)])
+    return names
+
+
+def _block_name(point):
+    return point.split("[", 1)[0]
+
+
+class PointTable:
+    '''
+    One mapped point table. Use create() for the writer side and open()
+    for readers, both can be used from any number of processes.
+    '''
+    def __init__(self, path, writable):
+        if LOCKED and fcntl is None:
+            warnings.warn(f"PointTable needs flock() on {platform.machine()} and this platform has none, "
+                          "readers can see a torn bank", RuntimeWarning)
+        self.path = path
+        self.writable = writable
+        self._file = open(path, "r+b" if writable else "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        magic, version, n_points, names_len = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} point table")
+        self.names = json.loads(bytes(self._mmap[HEADER_SIZE:HEADER_SIZE + names_len]).decode())
+        self.n_points = n_points
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self._blocks = {}
+        for i, name in enumerate(self.names):
+            start, stop = self._blocks.get(_block_name(name), (i, i))
+            self._blocks[_block_name(name)] = (start, i + 1)
+
+        bank_offset = HEADER_SIZE + _pad8(names_len)
+        buf = memoryview(self._mmap)
+        # u64 at an 8 byte aligned offset, one store/load on every target we run on
+        self._seq = np.frombuffer(buf, dtype="<u8", count=1, offset=SEQ_OFFSET)
+        self._bank_time = np.frombuffer(buf, dtype="<f8", count=2, offset=BANK_TIME_OFFSET)
+        self.banks = np.frombuffer(buf, dtype="<f8", count=2 * n_points, offset=bank_offset).reshape(2, n_points)
+        self.laps = 0
+
+    @classmethod
+    def create(cls, path, names, initial=np.nan):
+        '''New table file at path (overwritten), every point set to initial.'''
+        names = list(names)
+        if len(set(names)) != len(names):
+            raise ValueError("point names must be unique")
+        encoded = json.dumps(names).encode()
+        bank_offset = HEADER_SIZE + _pad8(len(encoded))
+        size = bank_offset + 2 * 8 * len(names)
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(names), len(encoded)).ljust(HEADER_SIZE, b"\x00"))
+            f.write(encoded.ljust(_pad8(len(encoded)), b"\x00"))
+            f.write(np.full(2 * len(names), initial, dtype="<f8").tobytes())
+            f.truncate(size)
+        return cls(path, writable=True)
+
+    @classmethod
+    def open(cls, path, writable=False):
+        return cls(path, writable)
+
+    def block(self, name):
+        '''slice of a point_names() block, bank[slice] is a view.'''
+        return slice(*self._blocks[name])
+
+    def indexes(self, names):
+        return np.array([self.index[name] for name in names], dtype=np.intp)
+
+    @property
+    def seq(self):
+        return int(self._seq[0])
+
+    @property
+    def publishes(self):
+        return self.seq // 2
+
+    def live_bank(self):
+        '''(seq, live bank view). Only safe to trust until stable(seq) says otherwise.'''
+        seq = int(self._seq[0])
+        return seq, self.banks[(seq // 2) % 2]
+
+    def stable(self, seq):
+        '''True if the bank live at seq hasn't been touched by a later publish.'''
+        # the next publish after seq's goes odd before writing that bank
+        return int(self._seq[0]) < (seq // 2) * 2 + 3
+
+    @contextmanager
+    def _locked(self, exclusive=False):
+        '''flock the table file where the seqlock alone isn't safe (LOCKED).'''
+        if not LOCKED or fcntl is None:
+            yield
+            return
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def read(self, func, retries=100):
+        '''
+        func(bank) on the live bank, in place. Re-run if the writer
+        lapped it, so func should only read the bank and compute, not
+        hold on to the view or have side effects it can't repeat.
+        '''
+        for _ in range(retries):
+            with self._locked():
+                seq, bank = self.live_bank()
+                result = func(bank)
+                if self.stable(seq):
+                    return result
+            self.laps += 1
+        raise RuntimeError(f"{self.path}: reader lapped {retries} times in a row, writer too fast for this read")
+
+    def snapshot(self):
+        '''Copy of the live bank as {name: value}, for logging and debugging.'''
+        values = self.read(lambda bank: bank.copy())
+        return dict(zip(self.names, values.tolist()))
+
+    def publish_time(self):
+        with self._locked():
+            seq = self.seq
+            return float(self._bank_time[(seq // 2) % 2])
+
+    @contextmanager
+    def write(self, copy_live=True):
+        '''
+        Writer side. Yields the back bank (by default a copy of the live
+        one, so only the points that changed need writing) and makes it
+        live when the with block exits cleanly. If the block raises, the
+        half written back bank is dropped and the exception goes on.
+        '''
+        if not self.writable:
+            raise PermissionError(f"{self.path} was opened read only")
+        with self._locked(exclusive=True):
+            seq = int(self._seq[0])
+            back = (seq // 2 + 1) % 2
+            self._seq[0] = seq + 1
+            bank = self.banks[back]
+            if copy_live:
+                np.copyto(bank, self.banks[1 - back])
+            try:
+                yield bank
+            except BaseException:
+                # nothing gets published: seq goes back to the old even value,
+                # the live bank was never touched, and readers that overlapped
+                # still pass stable()
+                self._seq[0] = seq
+                raise
+            self._bank_time[back] = time.time()
+            self._seq[0] = seq + 2
+
+    def publish(self, values=None, **points):
+        '''Write a full bank in names order and/or single points by name.'''
+        with self.write(copy_live=values is None) as bank:
+            if values is not None:
+                bank[:] = values
+            for name, value in points.items():
+                bank[self.index[name]] = value
+
+    def close(self):
+        # numpy views keep the mmap exported, drop ours first
+        self._seq = self._bank_time = self.banks = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # a caller still holds a bank view, the mapping goes when that does
+            pass
+        self._file.close()
+
+
+def _pad8(n):
+    return (n + 7) & ~7
+
+
+class SyntheticPoller:
+    '''
+    Stand in for the field bus poller: writes every point of a table at
+    rate_hz with a slow sine plus noise around a base value per block,
+    each point offset from its base by up to +/- spread.
+    run() is the loop, start() runs it in its own process.
+    '''
+    def __init__(self, path, base=None, amplitude=2.0, noise=0.05, spread=0.0, rate_hz=10.0, seed=0):
+        self.path = path
+        self.base = base or {}
+        self.spread = spread
+        self.amplitude = amplitude
+        self.noise = noise
+        self.rate_hz = rate_hz
+        self.seed = seed
+        self.process = None
+        self._stop = None
+
+    def run(self, duration=None, stop=None):
+        table = PointTable.open(self.path, writable=True)
+        rng = np.random.default_rng(self.seed)
+        base = np.full(table.n_points, 70.0)
+        for block, value in self.base.items():
+            base[table.block(block)] = value
+        base += rng.uniform(-self.spread, self.spread, table.n_points)
+        phase = rng.uniform(0, 2 * np.pi, table.n_points)
+        noise = np.empty(table.n_points)
+        period = 1.0 / self.rate_hz if self.rate_hz else 0.0
+        start = time.perf_counter()
+        next_at = start
+        while not (stop is not None and stop.is_set()):
+            now = time.perf_counter()
+            if duration is not None and now - start >= duration:
+                break
+            with table.write(copy_live=False) as bank:
+                np.sin(phase + 0.01 * (now - start), out=bank)
+                bank *= self.amplitude
+                bank += base
+                bank += rng.standard_normal(out=noise) * self.noise
+            bank = None
+            if period:
+                next_at += period
+                time.sleep(max(next_at - time.perf_counter(), 0.0))
+        publishes = table.publishes
+        table.close()
+        return publishes
+
+    def start(self):
+        self._stop = multiprocessing.Event()
+        self.process = multiprocessing.Process(target=self.run, kwargs={"stop": self._stop}, daemon=True)
+        self.process.start()
+        return self
+
+    def stop(self):
+        if self.process is not None:
+            self._stop.set()
+            self.process.join()
+            self.process = None
+
+
+def benchmark(n_points=10000, seconds=2.0, path=None):
+    '''Poller process flat out vs a reader loop summing every point in place.'''
+    path = path or os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else ".", "point_db_bench.points")
+    table = PointTable.create(path, point_names(point=n_points))
+    poller = SyntheticPoller(path, rate_hz=0).start()
+    try:
+        while table.publishes == 0:
+            time.sleep(0.001)
+        reads = 0
+        first = table.publishes
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            table.read(np.sum)
+            reads += 1
+        secs = time.perf_counter() - start
+        writes = table.publishes - first
+    finally:
+        poller.stop()
+    print(f"{n_points:,} points, poller process publishing flat out for {secs:.1f} s:")
+    print(f"  writer: {writes / secs:,.0f} publishes/s ({writes * n_points / secs:,.0f} points/s)")
+    print(f"  reader: {reads / secs:,.0f} reads/s ({reads * n_points / secs:,.0f} points/s), "
+          f"{table.laps} reads re-run after a lap")
+    table.close()
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,112 @@
+'''
+Fast get/set for numeric wasmtime Globals.
+
+Global.value() / Global.set_value() look up the global's type and build
+a fresh Val on every call, which is most of the cost of poking a
+controller input. ScalarGlobal binds the store context, the global
+handle and one scratch wasmtime_val_t up front and goes straight to the
+C API, so it is only for i32/i64/f32/f64 globals.
+
+That fast path uses wasmtime-py internals (wasmtime._ffi,
+Store._context(), Global._global), which are not public API and were
+checked against wasmtime 49. If an upgrade moves them, FAST_PATH is
+False, a RuntimeWarning at import says what is missing, and ScalarGlobal
+falls back to the public Global.value() / set_value(). Nothing else
+changes, it is just slower.
+
+$ python -m wasm_host.raw_globals  # says whether the fast path is on
+'''
+
+import ctypes
+import warnings
+
+import wasmtime
+
+NUMERIC = ("i32", "i64", "f32", "f64")
+
+
+def _load_ffi():
+    '''(ffi module, {kind: WASMTIME_* tag}, None) or (None, {kind: None}, why not).'''
+    try:
+        from wasmtime import _ffi as ffi
+        kinds = {kind: getattr(ffi, f"WASMTIME_{kind.upper()}") for kind in NUMERIC}
+        for name in ("wasmtime_val_t", "wasm_trap_t", "wasmtime_global_get", "wasmtime_global_set",
+                     "wasmtime_func_call"):
+            getattr(ffi, name)
+        if not callable(getattr(wasmtime.Store, "_context", None)):
+            raise AttributeError("wasmtime.Store has no _context()")
+    except (ImportError, AttributeError) as e:
+        return None, dict.fromkeys(NUMERIC), f"{type(e).__name__}: {e}"
+    return ffi, kinds, None
+
+
+ffi, KINDS, FAST_PATH_ERROR = _load_ffi()
+FAST_PATH = ffi is not None
+if not FAST_PATH:
+    warnings.warn(f"wasmtime internals not found ({FAST_PATH_ERROR}), wasm_host falls back to the public "
+                  "Global / Func API", RuntimeWarning)
+
+
+class ScalarGlobal:
+    def __init__(self, store, glob):
+        ty = glob.type(store)
+        kind = str(ty.content)
+        if kind not in KINDS:
+            raise TypeError(f"ScalarGlobal only handles numeric globals, got {kind}")
+        self.kind = kind
+        self.mutable = ty.mutable
+        self.glob = glob
+        self.store = store
+        self.fast = FAST_PATH and hasattr(glob, "_global")
+        if not self.fast:
+            # public API, instance attributes shadow the fast methods
+            self.get = self._public_get
+            self.set = self._public_set
+            return
+        self._ctx = store._context()
+        self._ref = ctypes.byref(glob._global)
+        self._val = ffi.wasmtime_val_t()
+        self._val.kind = KINDS[kind]
+        self._val_ref = ctypes.byref(self._val)
+        # view onto the union inside _val, shares its memory
+        self._of = self._val.of
+
+    def get(self):
+        ffi.wasmtime_global_get(self._ctx, self._ref, self._val_ref)
+        return getattr(self._of, self.kind)
+
+    def set(self, value):
+        setattr(self._of, self.kind, value)
+        error = ffi.wasmtime_global_set(self._ctx, self._ref, self._val_ref)
+        if error:
+            raise wasmtime.WasmtimeError._from_ptr(error)
+
+    def _public_get(self):
+        return self.glob.value(self.store)
+
+    def _public_set(self, value):
+        self.glob.set_value(self.store, value)
+
+
+def check_fast_path():
+    '''
+    Round trips an f64 and an i64 global through ScalarGlobal and says
+    whether the internals path or the public fallback is in use.
+    '''
+    store = wasmtime.Store()
+    for valtype, init, value in ((wasmtime.ValType.f64(), wasmtime.Val.f64(0.0), 71.5),
+                                 (wasmtime.ValType.i64(), wasmtime.Val.i64(0), 2)):
+        glob = wasmtime.Global(store, wasmtime.GlobalType(valtype, True), init)
+        scalar = ScalarGlobal(store, glob)
+        scalar.set(value)
+        if not scalar.get() == value == glob.value(store):
+            raise RuntimeError(f"ScalarGlobal {valtype} round trip failed")
+    if FAST_PATH:
+        print("Py Info - wasmtime internals found, ScalarGlobal uses the C API fast path")
+    else:
+        print(f"Py Info - wasmtime internals missing ({FAST_PATH_ERROR}), ScalarGlobal uses the public Global API")
+    return FAST_PATH
+
+
+if __name__ == "__main__":
+    check_fast_path()
@@ -0,0 +1,225 @@
+'''
+Asyncio scan loop scheduler for running lots of controllers on fixed
+scan periods (1 s VAV PID, 60 s AHU %OA, ...) from one event loop.
+
+Tasks sit in a hashed timer wheel: the loop wakes once per tick
+(resolution), pops the slot for that tick and runs whatever is due.
+Each task gets the real elapsed time since its last run as dt, which
+is what the PID integrators should be using rather than a hard-coded 1.
+
+Plain functions run inline on the loop (controller math is short and
+CPU bound). Coroutine functions get their own asyncio task, bounded by
+the task's deadline with asyncio.wait_for, so a slow one (field bus I/O)
+never holds up the wheel. Per task metrics: runs, start jitter,
+execution time, deadline overruns and skipped periods.
+
+    sched = ScanScheduler()
+    sched.add("vav-1", 1.0, lambda dt: vav.control_logic(temp, dt=dt))
+    asyncio.run(sched.run(duration=10))
+    sched.print_report()
+'''
+
+import asyncio
+import inspect
+import math
+from collections import deque
+
+JITTER_SAMPLES = 1000
+
+
+class ScanTask:
+    def __init__(self, name, period, func, deadline=None, phase=0.0):
+        if period <= 0:
+            raise ValueError("period must be > 0")
+        self.name = name
+        self.period = period
+        self.func = func
+        self.deadline = deadline if deadline is not None else period
+        self.phase = phase
+        self.is_coroutine = inspect.iscoroutinefunction(func)
+
+        self.next_due = None
+        self.rounds = 0
+        self.last_start = None
+        self.running = None
+
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.errors = 0
+        self.jitter = deque(maxlen=JITTER_SAMPLES)
+        self.exec_max = 0.0
+        self.exec_total = 0.0
+
+    def stats(self):
+        jitter = sorted(self.jitter)
+        n = len(jitter)
+        return {
+            "period": self.period,
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "jitter_ms_p50": 1000 * jitter[n // 2] if n else 0.0,
+            "jitter_ms_p99": 1000 * jitter[min(n - 1, int(n * 0.99))] if n else 0.0,
+            "jitter_ms_max": 1000 * jitter[-1] if n else 0.0,
+            "exec_ms_avg": 1000 * self.exec_total / self.runs if self.runs else 0.0,
+            "exec_ms_max": 1000 * self.exec_max,
+        }
+
+
+class ScanScheduler:
+    def __init__(self, resolution=0.01, wheel_size=512):
+        self.resolution = resolution
+        self.wheel_size = wheel_size
+        self.slots = [[] for _ in range(wheel_size)]
+        self.tasks = []
+        self.t0 = None
+        self.tick = 0
+        self._stopping = False
+        self._loop = None
+
+    def add(self, name, period, func, deadline=None, phase=None):
+        '''
+        Register func(dt) to run every period seconds. phase offsets the
+        first run, by default tasks with the same period are spread
+        across it so they don't all land on one tick.
+        '''
+        if phase is None:
+            same = sum(1 for t in self.tasks if t.period == period)
+            phase = (same * self.resolution) % period
+        task = ScanTask(name, period, func, deadline, phase)
+        self.tasks.append(task)
+        if self.t0 is not None:
+            task.next_due = self._loop.time() + phase
+            self._schedule(task)
+        return task
+
+    def stop(self):
+        self._stopping = True
+
+    def _schedule(self, task):
+        # small epsilon so float noise on an exact tick boundary does not push it a tick late
+        due_tick = max(self.tick + 1, math.ceil((task.next_due - self.t0) / self.resolution - 1e-9))
+        ticks_away = due_tick - self.tick
+        task.rounds = (ticks_away - 1) // self.wheel_size
+        self.slots[due_tick % self.wheel_size].append(task)
+
+    async def run(self, duration=None):
+        self._loop = asyncio.get_running_loop()
+        self.t0 = self._loop.time()
+        # start one tick back so anything due right away fires on tick 0
+        self.tick = -1
+        self._stopping = False
+        for task in self.tasks:
+            task.next_due = self.t0 + task.phase
+            self._schedule(task)
+
+        end = self.t0 + duration if duration is not None else None
+        while not self._stopping:
+            target = self.t0 + (self.tick + 1) * self.resolution
+            delay = target - self._loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            now = self._loop.time()
+            if end is not None and now >= end:
+                break
+            # catch up on every tick that passed while we slept or ran
+            current = int((now - self.t0) / self.resolution)
+            while self.tick < current:
+                self.tick += 1
+                self._fire_slot(self.tick % self.wheel_size)
+
+        pending = [t.running for t in self.tasks if t.running is not None and not t.running.done()]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def _fire_slot(self, index):
+        slot = self.slots[index]
+        if not slot:
+            return
+        self.slots[index] = []
+        for task in slot:
+            if task.rounds > 0:
+                task.rounds -= 1
+                self.slots[index].append(task)
+            else:
+                self._start(task)
+
+    def _start(self, task):
+        if task.is_coroutine and task.running is not None and not task.running.done():
+            # last scan is still going, don't stack a second one. Nothing
+            # ran, so no jitter sample and the next dt still counts from
+            # the last real start
+            task.overruns += 1
+            self._advance(task)
+            return
+
+        start = self._loop.time()
+        task.jitter.append(max(0.0, start - task.next_due))
+        dt = start - task.last_start if task.last_start is not None else task.period
+        task.last_start = start
+
+        if task.is_coroutine:
+            task.running = self._loop.create_task(self._run_coroutine(task, dt, start))
+        else:
+            try:
+                task.func(dt)
+            except Exception:
+                task.errors += 1
+            self._finish(task, start)
+
+        self._advance(task)
+
+    async def _run_coroutine(self, task, dt, start):
+        try:
+            await asyncio.wait_for(task.func(dt), timeout=task.deadline)
+        except asyncio.TimeoutError:
+            task.overruns += 1
+        except Exception:
+            task.errors += 1
+        self._finish(task, start, count_overrun=False)
+
+    def _finish(self, task, start, count_overrun=True):
+        elapsed = self._loop.time() - start
+        task.runs += 1
+        task.exec_total += elapsed
+        task.exec_max = max(task.exec_max, elapsed)
+        if count_overrun and elapsed > task.deadline:
+            task.overruns += 1
+
+    def _advance(self, task):
+        task.next_due += task.period
+        now = self._loop.time()
+        if task.next_due < now:
+            # fell behind by whole periods, skip them instead of bursting
+            missed = math.ceil((now - task.next_due) / task.period)
+            task.skipped += missed
+            task.next_due += missed * task.period
+        self._schedule(task)
+
+    def report(self):
+        return {task.name: task.stats() for task in self.tasks}
+
+    def summary(self):
+        '''Worst case across tasks, grouped by scan period.'''
+        by_period = {}
+        for task in self.tasks:
+            s = task.stats()
+            group = by_period.setdefault(task.period, {
+                "tasks": 0, "runs": 0, "overruns": 0, "skipped": 0, "errors": 0,
+                "jitter_ms_p99": 0.0, "jitter_ms_max": 0.0, "exec_ms_max": 0.0,
+            })
+            group["tasks"] += 1
+            for key in ("runs", "overruns", "skipped", "errors"):
+                group[key] += s[key]
+            for key in ("jitter_ms_p99", "jitter_ms_max", "exec_ms_max"):
+                group[key] = max(group[key], s[key])
+        return by_period
+
+    def print_report(self):
+        for period, group in sorted(self.summary().items()):
+            print(f"{period:>6.2f} s scan: {group['tasks']} tasks, {group['runs']} runs, "
+                  f"{group['overruns']} overruns, {group['skipped']} skipped, {group['errors']} errors, "
+                  f"jitter p99 {group['jitter_ms_p99']:.2f} ms (max {group['jitter_ms_max']:.2f} ms), "
+                  f"exec max {group['exec_ms_max']:.3f} ms")
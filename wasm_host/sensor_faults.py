@@ -0,0 +1,284 @@
+'''
+Streaming sensor fault detection in front of the controllers.
+
+VavBoxController takes whatever zone temp it is handed, and
+calculate_ahu_percent_oa only checks for None. A SensorFaults stage
+sits between the field readings and the controllers. It keeps rolling
+window stats per point and gates every reading before it reaches the
+PID or the %OA math.
+
+Everything is one numpy array with a slot per point, and a sample is a
+row with one reading per point. Each update is O(1) per point whatever
+the window length:
+
+    mean / variance - Welford, then the sliding window form once the
+                      window is full (the oldest sample comes out as
+                      the newest goes in)
+    min / max       - van Herk / Gil-Werman: a running prefix min/max of
+                      the current block of `window` samples, plus suffix
+                      min/max of the block before it, computed once per
+                      block. The window is always a suffix of one block
+                      plus a prefix of the next
+
+Flags per point (bit mask, FAULT_NAMES):
+
+    MISSING       reading is NaN / None
+    OUT_OF_RANGE  outside the point's [low, high]
+    STUCK         full window with max - min <= stuck_band
+    NOISY         rolling std > noise_std
+    LOW_DELTA_T   set on both points of a pair (e.g. OAT / RAT) whose
+                  rolling means are closer than the pair's min_delta_t
+
+gate() returns the readings the controllers should see. MISSING,
+OUT_OF_RANGE and STUCK points hold their last good value (NaN until
+there is one), and NOISY points get the rolling mean. The stats get the
+held value, so a dropout doesn't pull the window around. Until a point
+has had a good reading it only feeds placeholders, which its first good
+reading wipes (RollingStats.reset_points), and STUCK / NOISY only look
+at samples taken since then.
+
+    faults = SensorFaults(["zone_temp[0]", ...], low=40, high=100, window=60)
+    good, flags = faults.gate(readings)
+    fleet.control_logic(good)
+'''
+
+import time
+
+import numpy as np
+
+MISSING = 1
+OUT_OF_RANGE = 2
+STUCK = 4
+NOISY = 8
+LOW_DELTA_T = 16
+FAULT_NAMES = {MISSING: "missing", OUT_OF_RANGE: "out of range", STUCK: "stuck", NOISY: "noisy",
+               LOW_DELTA_T: "low delta T"}
+# faults where the reading itself can't be trusted, hold the last good value
+HOLD_FAULTS = MISSING | OUT_OF_RANGE | STUCK
+
+
+def describe(flags):
+    '''Bit mask -> "stuck, noisy".'''
+    return ", ".join(name for bit, name in FAULT_NAMES.items() if flags & bit) or "ok"
+
+
+class RollingStats:
+    '''
+    Rolling mean, variance, min and max over the last `window` rows of
+    n_points columns, O(1) per point per update.
+    '''
+    def __init__(self, n_points, window):
+        self.n_points = n_points
+        self.window = window
+        self.count = 0
+        self.buffer = np.zeros((window, n_points))
+        self.mean = np.zeros(n_points)
+        self._m2 = np.zeros(n_points)
+        # suffix min/max of the previous block, prefix min/max of the current one
+        self._suffix_min = np.full((window + 1, n_points), np.inf)
+        self._suffix_max = np.full((window + 1, n_points), -np.inf)
+        self._prefix_min = np.full(n_points, np.inf)
+        self._prefix_max = np.full(n_points, -np.inf)
+        self._delta = np.empty(n_points)
+        self._old_mean = np.empty(n_points)
+
+    @property
+    def full(self):
+        return self.count >= self.window
+
+    def update(self, row):
+        pos = self.count % self.window
+        if pos == 0 and self.count:
+            # block finished, its suffix min/max cover the part of it still in the window
+            np.minimum.accumulate(self.buffer[::-1], axis=0, out=self._suffix_min[-2::-1])
+            np.maximum.accumulate(self.buffer[::-1], axis=0, out=self._suffix_max[-2::-1])
+            self._prefix_min.fill(np.inf)
+            self._prefix_max.fill(-np.inf)
+
+        delta = self._delta
+        if self.count < self.window:
+            # still filling, plain Welford
+            n = self.count + 1
+            np.subtract(row, self.mean, out=delta)
+            self.mean += delta / n
+            self._m2 += delta * (row - self.mean)
+        else:
+            # sliding Welford: replace the oldest sample (same slot) with row
+            old = self.buffer[pos]
+            np.subtract(row, old, out=delta)
+            np.copyto(self._old_mean, self.mean)
+            self.mean += delta / self.window
+            self._m2 += delta * (row - self.mean + old - self._old_mean)
+        self.buffer[pos] = row
+        np.minimum(self._prefix_min, row, out=self._prefix_min)
+        np.maximum(self._prefix_max, row, out=self._prefix_max)
+        self.count += 1
+
+    def reset_points(self, idx, values):
+        '''
+        Start points idx over as if every sample so far had been values,
+        O(window) per point. For a point's first good reading, so the
+        placeholders it was fed before don't stay in its window.
+        '''
+        self.buffer[:, idx] = values
+        self.mean[idx] = values
+        self._m2[idx] = 0.0
+        self._suffix_min[:self.window, idx] = values
+        self._suffix_max[:self.window, idx] = values
+        self._prefix_min[idx] = values
+        self._prefix_max[idx] = values
+
+    def variance(self):
+        n = min(self.count, self.window)
+        if n < 2:
+            return np.zeros(self.n_points)
+        # sliding updates can leave a tiny negative from rounding
+        return np.maximum(self._m2 / (n - 1), 0.0)
+
+    def std(self):
+        return np.sqrt(self.variance())
+
+    def minimum(self):
+        # rows still in the window from the previous block start right after the newest row's slot
+        pos = (self.count - 1) % self.window
+        return np.minimum(self._prefix_min, self._suffix_min[pos + 1])
+
+    def maximum(self):
+        pos = (self.count - 1) % self.window
+        return np.maximum(self._prefix_max, self._suffix_max[pos + 1])
+
+
+class SensorFaults:
+    '''
+    Fault detection + gating for a fixed list of points. low / high /
+    stuck_band / noise_std are scalars or one value per point. pairs is
+    [(point_a, point_b, min_delta_t), ...].
+    '''
+    def __init__(self, names, low=-np.inf, high=np.inf, window=60, stuck_band=0.0, noise_std=np.inf,
+                 pairs=()):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        n = len(self.names)
+        self.low = np.array(np.broadcast_to(np.asarray(low, dtype=np.float64), (n,)))
+        self.high = np.array(np.broadcast_to(np.asarray(high, dtype=np.float64), (n,)))
+        self.stuck_band = np.array(np.broadcast_to(np.asarray(stuck_band, dtype=np.float64), (n,)))
+        self.noise_std = np.array(np.broadcast_to(np.asarray(noise_std, dtype=np.float64), (n,)))
+        self.pair_a = np.array([self.index[a] for a, _, _ in pairs], dtype=np.intp)
+        self.pair_b = np.array([self.index[b] for _, b, _ in pairs], dtype=np.intp)
+        self.pair_min_delta = np.array([d for _, _, d in pairs], dtype=np.float64)
+        self.pair_ok = np.ones(len(pairs), dtype=bool)
+
+        self.stats = RollingStats(n, window)
+        self.last_good = np.full(n, np.nan)
+        # samples since each point's first good reading, the window only
+        # means something for STUCK / NOISY once it is made of those
+        self.samples = np.zeros(n, dtype=np.int64)
+        self.flags = np.zeros(n, dtype=np.uint8)
+        # samples each point spent flagged, by fault bit
+        self.fault_counts = {bit: np.zeros(n, dtype=np.int64) for bit in FAULT_NAMES}
+
+    def gate(self, readings):
+        '''
+        One row of readings (None / NaN for missing) in names order.
+        Returns (gated values, flags), both arrays in names order.
+        '''
+        raw = np.array(readings, dtype=np.float64)
+        flags = self.flags
+        flags.fill(0)
+        missing = np.isnan(raw)
+        flags[missing] |= MISSING
+        flags[~missing & ((raw < self.low) | (raw > self.high))] |= OUT_OF_RANGE
+
+        # bad readings don't go into the stats, the last good one stands in
+        bad = flags != 0
+        sample = np.where(bad, self.last_good, raw)
+        unseen = np.isnan(sample)
+        if not unseen.any():
+            self.stats.update(sample)
+        else:
+            # no good reading yet on some points, a 0 placeholder keeps the
+            # window numeric and is wiped when the first good one comes in
+            self.stats.update(np.where(unseen, 0.0, sample))
+        first = np.flatnonzero(~bad & np.isnan(self.last_good))
+        if len(first):
+            self.stats.reset_points(first, raw[first])
+        self.samples[~unseen] += 1
+
+        flags[(self.samples >= self.stats.window)
+              & ((self.stats.maximum() - self.stats.minimum()) <= self.stuck_band)] |= STUCK
+        flags[(self.samples >= 2) & (self.stats.std() > self.noise_std)] |= NOISY
+        if len(self.pair_a):
+            self.pair_ok = np.abs(self.stats.mean[self.pair_a] - self.stats.mean[self.pair_b]) >= self.pair_min_delta
+            flags[self.pair_a[~self.pair_ok]] |= LOW_DELTA_T
+            flags[self.pair_b[~self.pair_ok]] |= LOW_DELTA_T
+
+        hold = (flags & HOLD_FAULTS) != 0
+        gated = np.where(hold, self.last_good, raw)
+        noisy = ~hold & ((flags & NOISY) != 0)
+        gated[noisy] = self.stats.mean[noisy]
+        good = ~hold
+        self.last_good[good] = raw[good]
+        for bit, counts in self.fault_counts.items():
+            counts += (flags & bit) != 0
+        return gated, flags.copy()
+
+    def pair_delta_ok(self, a, b):
+        '''Whether pair (a, b) currently has enough delta T.'''
+        i, j = self.index[a], self.index[b]
+        match = np.flatnonzero((self.pair_a == i) & (self.pair_b == j))
+        if not len(match):
+            raise KeyError(f"({a}, {b}) is not a configured pair")
+        return bool(self.pair_ok[match[0]])
+
+    def report(self):
+        '''{point: {fault name: samples flagged}} for points that were ever flagged.'''
+        out = {}
+        for bit, counts in self.fault_counts.items():
+            for i in np.flatnonzero(counts):
+                out.setdefault(self.names[i], {})[FAULT_NAMES[bit]] = int(counts[i])
+        return out
+
+
+def check_against_rescan(n_points=7, window=13, rows=200, seed=0):
+    '''Incremental stats must match a full rescan of the window every row.'''
+    rng = np.random.default_rng(seed)
+    data = rng.normal(70.0, 3.0, (rows, n_points))
+    stats = RollingStats(n_points, window)
+    for t, row in enumerate(data):
+        stats.update(row)
+        win = data[max(0, t - window + 1):t + 1]
+        assert np.allclose(stats.mean, win.mean(axis=0))
+        if len(win) > 1:
+            assert np.allclose(stats.variance(), win.var(axis=0, ddof=1))
+        assert np.array_equal(stats.minimum(), win.min(axis=0))
+        assert np.array_equal(stats.maximum(), win.max(axis=0))
+    # a reset point behaves as if its whole history had been the reset value
+    stats.reset_points([2], 60.0)
+    data[:, 2] = 60.0
+    for t in range(rows, rows + window + 5):
+        row = rng.normal(70.0, 3.0, n_points)
+        data = np.vstack([data, row])
+        stats.update(row)
+        win = data[t - window + 1:t + 1]
+        assert np.allclose(stats.mean, win.mean(axis=0)) and np.allclose(stats.variance(), win.var(axis=0, ddof=1))
+        assert np.array_equal(stats.minimum(), win.min(axis=0)) and np.array_equal(stats.maximum(), win.max(axis=0))
+    print(f"Py Info - rolling stats match a window rescan over {rows} rows (+ a point reset)")
+
+
+def benchmark(sizes=(1, 100, 10000), seconds=1.0, window=300):
+    for n_points in sizes:
+        faults = SensorFaults([f"p{i}" for i in range(n_points)], low=40, high=100, window=window,
+                              stuck_band=0.01, noise_std=2.0)
+        rows = np.random.default_rng(1).normal(70.0, 0.5, (64, n_points))
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            faults.gate(rows[count % 64])
+            count += 1
+        secs = time.perf_counter() - start
+        print(f"{n_points:>6,} points per row: {count / secs:>9,.0f} rows/sec, {count * n_points / secs:>13,.0f} points/sec")
+
+
+if __name__ == "__main__":
+    check_against_rescan()
+    benchmark()
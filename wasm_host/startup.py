@@ -0,0 +1,74 @@
+'''
+Startup timing and deferred imports for the sim scripts.
+
+On the edge boxes a script that imports wasmtime, numpy and matplotlib
+at the top pays for all three before it does anything, even when it
+only runs headless or only re-renders a trend file. timed_import() pulls
+a module in the first time it is actually needed and records how long
+that took, and timed() does the same for any other startup step (module
+load, instantiate). startup_report() prints the lot.
+
+    wasmtime = timed_import("wasmtime")
+    with timed("instantiate"):
+        sim = bind(engine, module)
+    startup_report()
+'''
+
+import importlib
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# interpreter start, close enough for "how long until the sim ran"
+PROCESS_START = time.perf_counter()
+# label -> seconds, in the order they happened
+TIMINGS = {}
+
+
+def timed_import(name):
+    '''import_module(name), recording the time of the first import only.'''
+    if name in sys.modules:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    TIMINGS[f"import {name}"] = time.perf_counter() - start
+    return module
+
+
+@contextmanager
+def timed(label):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        TIMINGS[label] = TIMINGS.get(label, 0.0) + time.perf_counter() - start
+
+
+def headless():
+    '''No display to draw on (edge box, ssh session, CI).'''
+    if sys.platform in ("win32", "darwin"):
+        return False
+    return not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def import_pyplot():
+    '''
+    matplotlib.pyplot on the Agg backend when headless, so it never
+    probes for a GUI toolkit. None if matplotlib is not installed.
+    '''
+    try:
+        matplotlib = timed_import("matplotlib")
+    except ImportError:
+        return None
+    if headless():
+        matplotlib.use("Agg")
+    return timed_import("matplotlib.pyplot")
+
+
+def startup_report(file=None):
+    file = file or sys.stdout
+    print("Py Info - startup timing:", file=file)
+    for label, secs in TIMINGS.items():
+        print(f"  {label:<28} {secs * 1000:>9.1f} ms", file=file)
+    print(f"  {'total since start':<28} {(time.perf_counter() - PROCESS_START) * 1000:>9.1f} ms", file=file)
@@ -0,0 +1,279 @@
+'''
+Ring buffer trend recorder for controller points.
+
+The sims used to print a few f-string lines per step, and under load the
+formatting and stdout writes cost more than the control math. A
+TrendRecorder is a preallocated (capacity x points) float64 array with
+one column per point. record() drops one row into the next slot, with no
+allocation and no formatting.
+
+Sinks get whatever was recorded since their last flush, either from a
+background thread every flush_interval seconds (start()/stop()) or from
+flush() on the caller's thread:
+
+    BinarySink  - appends raw float64 rows to a file that
+                  open_binary_trend() maps back with np.memmap
+    ParquetSink - row groups into a Parquet file (pip install pyarrow)
+    ConsoleSink - prints rows, opt in for debugging
+
+If the writer laps the flusher the oldest rows are lost, and the count
+goes in recorder.dropped. last(n) gives the latest n samples without
+touching the sinks.
+
+    rec = TrendRecorder(["zone_temp", "dat_setpoint"], capacity=4096)
+    rec.add_sink(BinarySink("zone1.trend"))
+    with rec:
+        for step in range(steps):
+            rec.record(step, temp, dat)
+    open_binary_trend("zone1.trend")["dat_setpoint"]
+'''
+
+import json
+import threading
+import time
+
+import numpy as np
+
+TIME_COLUMN = "t"
+
+
+class TrendRecorder:
+    '''
+    columns: point names, a TIME_COLUMN ("t") column always comes first
+    so record(t, *values) takes the sample time and then one value per
+    point.
+    '''
+    def __init__(self, columns, capacity=65536, flush_interval=1.0):
+        self.columns = (TIME_COLUMN,) + tuple(c for c in columns if c != TIME_COLUMN)
+        self.index = {name: i for i, name in enumerate(self.columns)}
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.data = np.full((capacity, len(self.columns)), np.nan)
+        # total rows ever recorded, slot is count % capacity
+        self.count = 0
+        # rows record() has started on, one ahead of count while it writes
+        self.claimed = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.sinks = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, *values):
+        '''One row, t first then every point in column order.'''
+        self.claimed = self.count + 1
+        self.data[self.count % self.capacity] = values
+        self.count += 1
+
+    def record_row(self, t, values):
+        '''One row from a {point: value} dict, missing points or None are nan.'''
+        self.claimed = self.count + 1
+        row = self.data[self.count % self.capacity]
+        row.fill(np.nan)
+        row[0] = t
+        for name, value in values.items():
+            if value is not None:
+                row[self.index[name]] = value
+        self.count += 1
+
+    def last(self, n=None):
+        '''Latest n rows (all still in the buffer if None) as {column: array}, oldest first.'''
+        count = self.count
+        n = min(count, self.capacity) if n is None else min(n, count, self.capacity)
+        rows = self._rows(count - n, count)
+        return {name: rows[:, i] for i, name in enumerate(self.columns)}
+
+    def _rows(self, begin, end):
+        '''Copy of rows [begin, end) in record order.'''
+        start, stop = begin % self.capacity, end % self.capacity
+        if end - begin == 0:
+            return self.data[:0].copy()
+        if start < stop:
+            return self.data[start:stop].copy()
+        return np.concatenate((self.data[start:], self.data[:stop]))
+
+    def add_sink(self, sink):
+        sink.open(self.columns)
+        self.sinks.append(sink)
+        return sink
+
+    def flush(self):
+        '''Hand every row recorded since the last flush to the sinks.'''
+        with self._lock:
+            end = self.count
+            begin = max(self.flushed, end - self.capacity)
+            block = self._rows(begin, end)
+            # the writer may have lapped us while copying, a row it has
+            # started on (claimed) already overwrites the slot of
+            # row claimed - capacity
+            lapped = self.claimed - self.capacity
+            if lapped > begin:
+                block = block[lapped - begin:]
+                begin = lapped
+            self.dropped += begin - self.flushed
+            self.flushed = end
+            if len(block):
+                for sink in self.sinks:
+                    sink.write(block)
+            return len(block)
+
+    def start(self):
+        '''Flush from a background thread every flush_interval seconds.'''
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="trend-flush", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def close(self):
+        self.stop()
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BinarySink:
+    '''
+    Raw little endian float64 rows appended to path, column names in a
+    path + ".json" header next to it.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.rows = 0
+
+    def open(self, columns):
+        with open(self.path + ".json", "w") as f:
+            json.dump({"columns": list(columns), "dtype": "<f8"}, f)
+        self.file = open(self.path, "wb")
+
+    def write(self, block):
+        self.file.write(np.ascontiguousarray(block, dtype="<f8").tobytes())
+        self.file.flush()
+        self.rows += len(block)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def open_binary_trend(path):
+    '''Memory map a BinarySink file, {column: array view} without reading it in.'''
+    with open(path + ".json") as f:
+        header = json.load(f)
+    columns = header["columns"]
+    data = np.memmap(path, dtype=header["dtype"], mode="r")
+    data = data[:len(data) - len(data) % len(columns)].reshape(-1, len(columns))
+    return {name: data[:, i] for i, name in enumerate(columns)}
+
+
+class ParquetSink:
+    '''Each flush becomes a row group of a Parquet file.'''
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("ParquetSink needs pyarrow: pip install pyarrow")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.writer = None
+        self.rows = 0
+
+    def open(self, columns):
+        self.columns = list(columns)
+        schema = self.pa.schema([(name, self.pa.float64()) for name in self.columns])
+        self.writer = self.pq.ParquetWriter(self.path, schema)
+
+    def write(self, block):
+        table = self.pa.table({name: block[:, i] for i, name in enumerate(self.columns)})
+        self.writer.write_table(table)
+        self.rows += len(block)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class ConsoleSink:
+    '''
+    Debug printing. fmt gets {column: value} for each row and returns
+    the text, default is name=value pairs.
+    '''
+    def __init__(self, fmt=None, file=None):
+        self.fmt = fmt
+        self.file = file
+
+    def open(self, columns):
+        self.columns = columns
+
+    def write(self, block):
+        for row in block.tolist():
+            values = dict(zip(self.columns, row))
+            if self.fmt is not None:
+                text = self.fmt(values)
+            else:
+                text = ", ".join(f"{name}={value:.2f}" for name, value in values.items())
+            print(text, file=self.file)
+
+    def close(self):
+        pass
+
+
+def benchmark(steps=200_000):
+    '''print per step vs record() per step for the same numbers.'''
+    import contextlib
+    import io
+    import os
+    import tempfile
+
+    values = (68.0, 72.0, 90.0, 850.0, 100.0, 0.0)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for step in range(steps):
+            print(f"************* STEP: {step+1} *************")
+            print(f"Zone Temp = {values[0]:.2f}F, Zone Setpoint = {values[1]}F")
+            print(f"Mode = Heating, DAT Setpoint = {values[2]:.2f}F, Airflow Setpoint = {values[3]}")
+            print(f"Heating PID = {values[4]:.2f}%, Cooling PID = {values[5]:.2f}%")
+    print_secs = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.trend")
+        rec = TrendRecorder(["zone_temp", "setpoint", "dat", "airflow", "heating", "cooling"],
+                            flush_interval=0.05)
+        rec.add_sink(BinarySink(path))
+        start = time.perf_counter()
+        with rec:
+            for step in range(steps):
+                rec.record(step, *values)
+        rec_secs = time.perf_counter() - start
+        on_disk = len(open_binary_trend(path)["t"])
+
+    print(f"{steps} steps")
+    print(f"  print per step:   {print_secs:.2f} s")
+    print(f"  record per step:  {rec_secs:.2f} s ({print_secs / rec_secs:.1f}x), "
+          f"{on_disk} rows on disk, {rec.dropped} dropped")
+
+
+if __name__ == "__main__":
+    benchmark()